@@ -0,0 +1,61 @@
+"""
+Batch engine backends over 10, 1k and 100k small programs: in-process
+serial parsing, the process pool and Spark (when pyspark and Java are
+available). Files are written to a temporary folder first.
+
+Usage: python -m benchmarks.bench_batch [files ...] [--lines N] [--workers N]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas  # noqa: F401  (imported up front so it is not billed to the first backend)
+
+from benchmarks.bench_parser import synthetic_source
+from src.batch_engine import BACKENDS, BatchEngine
+
+# A few distinct programs, written round-robin
+VARIANTS = 16
+
+
+def write_portfolio(folder, n_files, n_lines):
+    sources = [synthetic_source(n_lines, seed=i) for i in range(VARIANTS)]
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(folder, f"prog{i:06d}.cbl")
+        with open(path, "w") as f:
+            f.write(sources[i % VARIANTS])
+        paths.append(path)
+    return paths
+
+
+def run(sizes=(10, 1_000, 100_000), n_lines=60, workers=None):
+    print(f"{'files':>8} " + " ".join(f"{b + ' s':>10}" for b in BACKENDS))
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as folder:
+            paths = write_portfolio(folder, n, n_lines)
+            timings = []
+            for backend in BACKENDS:
+                engine = BatchEngine(backend=backend, workers=workers, use_cache=False)
+                start = time.perf_counter()
+                try:
+                    table = engine.run(paths)
+                except Exception as e:  # pyspark or a JVM missing
+                    print(f"  ({backend} skipped: {type(e).__name__})", file=sys.stderr)
+                    timings.append(float('nan'))
+                    continue
+                timings.append(time.perf_counter() - start)
+                assert len(table) == n
+        print(f"{n:>8} " + " ".join(f"{t:>10.3f}" for t in timings))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {}
+    for flag, key in (("--lines", "n_lines"), ("--workers", "workers")):
+        if flag in args:
+            i = args.index(flag)
+            options[key] = int(args[i + 1])
+            del args[i:i + 2]
+    run(tuple(int(a) for a in args) or (10, 1_000, 100_000), **options)
@@ -0,0 +1,67 @@
+"""
+Throughput benchmark for risk inference at 1, 100 and 100k rows:
+per-row vs. batched scoring, NumPy forward pass vs. Keras (when installed).
+
+Usage: python -m benchmarks.bench_risk [rows ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from src.risk_inference import NumpyRiskModel
+
+# Per-row Keras calls cost milliseconds each; time a sample and extrapolate
+PER_ROW_SAMPLE = 200
+
+
+def random_model(seed=0):
+    rng = np.random.default_rng(seed)
+    shapes = [(5, 16), (16, 8), (8, 3)]
+    return NumpyRiskModel([(rng.normal(size=s), rng.normal(size=s[1])) for s in shapes])
+
+
+def portfolio(n, seed=1):
+    rng = np.random.default_rng(seed)
+    # [Lines, Variables, SQL, Calls, LogicPoints]
+    return np.column_stack([
+        rng.integers(10, 20000, n), rng.integers(0, 2000, n), rng.integers(0, 50, n),
+        rng.integers(0, 30, n), rng.integers(0, 3000, n),
+    ]).astype(np.float32)
+
+
+def _rate(fn, rows, sample=None):
+    n = len(rows) if sample is None else min(sample, len(rows))
+    start = time.perf_counter()
+    fn(rows[:n])
+    elapsed = time.perf_counter() - start
+    return n / elapsed if elapsed else float('inf')
+
+
+def run(sizes=(1, 100, 100_000)):
+    numpy_model = random_model()
+    keras = None
+    try:
+        from src.dl_risk_model import DeepRiskModel
+        keras = DeepRiskModel()
+        keras.model.set_weights([a for layer in numpy_model.layers for a in layer])
+    except ImportError:
+        print("(TensorFlow not installed: Keras columns skipped)")
+
+    print(f"{'rows':>8} {'numpy row/s':>14} {'numpy batch/s':>14} {'keras row/s':>12} {'keras batch/s':>14}")
+    for n in sizes:
+        X = portfolio(n)
+        np_row = _rate(lambda xs: [numpy_model.predict([x]) for x in xs], X, PER_ROW_SAMPLE * 50)
+        np_batch = _rate(numpy_model.predict_batch, X)
+        k_row = k_batch = float('nan')
+        if keras is not None:
+            mismatches = sum(a != b for a, b in zip(keras.predict_batch(X), numpy_model.predict_batch(X)))
+            if mismatches:
+                print(f"  ! {mismatches} of {n} rows classified differently from Keras")
+            k_row = _rate(lambda xs: [keras.predict([x]) for x in xs], X, PER_ROW_SAMPLE)
+            k_batch = _rate(keras.predict_batch, X)
+        print(f"{n:>8} {np_row:>14,.0f} {np_batch:>14,.0f} {k_row:>12,.0f} {k_batch:>14,.0f}")
+
+
+if __name__ == "__main__":
+    run(tuple(int(a) for a in sys.argv[1:]) or (1, 100, 100_000))
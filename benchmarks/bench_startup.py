@@ -0,0 +1,78 @@
+"""
+Cold-start benchmark for the FastAPI service: `import src.api` time, which
+heavy modules that import pulls in, time to the first /health/live answer,
+time until /health/ready and latency of the first /modernize call.
+Each measurement runs in a fresh interpreter.
+
+Usage: python -m benchmarks.bench_startup [runs] [--max-import-ms N]
+Exits non-zero when the median import time exceeds --max-import-ms.
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ("tensorflow", "openai", "dotenv", "numpy", "pandas", "uvicorn")
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import src.api
+elapsed = time.perf_counter() - start
+print(json.dumps({"import_ms": elapsed * 1000,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+REQUEST_PROBE = """
+import json, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from src.api import app
+with TestClient(app) as client:
+    client.get("/health/live")
+    live = time.perf_counter()
+    while (resp := client.get("/health/ready")).status_code != 200:
+        if resp.json()["status"] == "failed":
+            raise SystemExit("engines failed to load: " + resp.json()["error"])
+        time.sleep(0.005)
+    ready = time.perf_counter()
+    with open("data/sample_cobol/customer_handler.cbl", "rb") as f:
+        client.post("/modernize", files={"file": ("customer_handler.cbl", f.read())})
+    first = time.perf_counter()
+print(json.dumps({"live_ms": (live - start) * 1000, "ready_ms": (ready - start) * 1000,
+                  "first_modernize_ms": (first - ready) * 1000}))
+"""
+
+
+def _probe(code):
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if out.returncode:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def run(runs=5, max_import_ms=None):
+    imports = [_probe(IMPORT_PROBE) for _ in range(runs)]
+    import_ms = statistics.median(r["import_ms"] for r in imports)
+    print(f"import src.api        {import_ms:8.1f} ms (median of {runs})")
+    print(f"heavy modules loaded  {', '.join(imports[0]['loaded']) or 'none'}")
+
+    requests = [_probe(REQUEST_PROBE) for _ in range(runs)]
+    for key, label in (("live_ms", "first /health/live"), ("ready_ms", "/health/ready"),
+                       ("first_modernize_ms", "first /modernize")):
+        print(f"{label:<21} {statistics.median(r[key] for r in requests):8.1f} ms")
+
+    if max_import_ms is not None and import_ms > max_import_ms:
+        print(f"FAIL: import time {import_ms:.1f} ms exceeds {max_import_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    limit = None
+    if "--max-import-ms" in args:
+        i = args.index("--max-import-ms")
+        limit = float(args[i + 1])
+        del args[i:i + 2]
+    sys.exit(run(int(args[0]) if args else 5, limit))
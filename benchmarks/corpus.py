@@ -0,0 +1,154 @@
+"""
+Seeded generator of synthetic COBOL portfolios for benchmarks.
+
+Programs are fixed-format (code from column 8, '*' comments in column 7)
+with a WORKING-STORAGE section of PIC fields and 01 groups, COPY statements
+against a generated copybook library, and a PROCEDURE DIVISION of
+paragraphs mixing IF/ELSE and PERFORM [UNTIL] logic, EXEC SQL blocks and CALLs to
+other programs of the portfolio. The same seed always yields the same files.
+
+Usage: python -m benchmarks.corpus <folder> [programs] [--lines N] [--seed N]
+"""
+import os
+import random
+import sys
+from dataclasses import dataclass, replace
+from typing import List
+
+AREA_A = " " * 7
+AREA_B = " " * 11
+
+
+@dataclass
+class CorpusSpec:
+    lines: int = 400             # Mean program length
+    size_jitter: float = 0.5     # Lengths vary uniformly by +-50%
+    pic_fields: float = 0.35     # Share of the program in WORKING-STORAGE PIC fields
+    sql_density: float = 0.03    # Per procedure statement
+    call_density: float = 0.03
+    if_density: float = 0.10
+    perform_density: float = 0.08
+    comment_density: float = 0.05
+    copy_statements: int = 2     # COPY members per program
+    copybooks: int = 8           # Size of the shared copybook library
+    paragraph_length: int = 25   # Statements per paragraph
+    sequence_numbers: bool = False  # Fill columns 1-6 with sequence numbers
+
+
+def _program_name(i: int) -> str:
+    return f"PROG{i:05d}"
+
+
+def _copybook_name(i: int) -> str:
+    return f"BOOK{i:03d}"
+
+
+def _card(text: str, seq: int, spec: CorpusSpec) -> str:
+    """One source line; text already carries its column 7 indicator and area."""
+    return (f"{seq * 100:06d}" + text[6:]) if spec.sequence_numbers else text
+
+
+def generate_copybook(index: int, spec: CorpusSpec, seed: int = 0) -> str:
+    rng = random.Random(f"{seed}:copybook:{index}")
+    name = _copybook_name(index)
+    lines = [f"{AREA_A}01 {name}-REC."]
+    for j in range(rng.randint(4, 12)):
+        lines.append(f"{AREA_A}    05 {name}-F{j:02d}  PIC X({rng.randint(1, 40)}).")
+    return "\n".join(_card(line, n, spec) for n, line in enumerate(lines, 1)) + "\n"
+
+
+def generate_program(index: int, spec: CorpusSpec = CorpusSpec(), seed: int = 0,
+                     portfolio_size: int = 1) -> str:
+    """Program index of a portfolio; CALL targets are other programs of the same portfolio."""
+    rng = random.Random(f"{seed}:program:{index}")
+    n_lines = max(20, int(spec.lines * (1 + rng.uniform(-spec.size_jitter, spec.size_jitter))))
+    name = _program_name(index)
+    out = [f"{AREA_A}IDENTIFICATION DIVISION.", f"{AREA_A}PROGRAM-ID. {name}.",
+           f"{AREA_A}DATA DIVISION.", f"{AREA_A}WORKING-STORAGE SECTION."]
+    fields: List[str] = []
+
+    def comment():
+        if rng.random() < spec.comment_density:
+            out.append(f"      * {rng.choice(['TODO REVIEW', 'CHANGED 1998', 'Y2K FIX', 'SEE SPEC'])}"
+                       f" {rng.randint(1, 9999):04d}")
+
+    n_fields = max(1, int(n_lines * spec.pic_fields))
+    group = 0
+    while len(fields) < n_fields:
+        group += 1
+        out.append(f"{AREA_A}01 WS-GROUP-{group:03d}.")
+        for _ in range(rng.randint(3, 10)):
+            field_name = f"WS-{rng.choice(['CUST', 'ACCT', 'AMT', 'DATE', 'CODE', 'FLAG'])}-{len(fields):04d}"
+            fields.append(field_name)
+            pic = rng.choice(["X(10)", "X(30)", "9(5)", "9(8)", "S9(7)V99 COMP-3", "S9(4) COMP"])
+            out.append(f"{AREA_A}    05 {field_name}  PIC {pic}.")
+            comment()
+    for c in rng.sample(range(spec.copybooks), min(spec.copy_statements, spec.copybooks)):
+        out.append(f"{AREA_A}COPY {_copybook_name(c)}.")
+
+    out.append(f"{AREA_A}PROCEDURE DIVISION.")
+    # Cumulative thresholds for the statement mix
+    t_if = spec.if_density
+    t_perform = t_if + spec.perform_density
+    t_sql = t_perform + spec.sql_density
+    t_call = t_sql + spec.call_density
+    paragraph = 0
+    while len(out) < n_lines:
+        paragraph += 1
+        out.append(f"{AREA_A}PARA-{paragraph:04d}.")
+        for _ in range(spec.paragraph_length):
+            field_name = rng.choice(fields)
+            r = rng.random()
+            if r < t_if:
+                out += [f"{AREA_B}IF {field_name} = SPACES",
+                        f"{AREA_B}    MOVE ZEROS TO {rng.choice(fields)}",
+                        f"{AREA_B}ELSE",
+                        f"{AREA_B}    ADD 1 TO {rng.choice(fields)}",
+                        f"{AREA_B}END-IF"]
+            elif r < t_perform:
+                out.append(f"{AREA_B}PERFORM PARA-{rng.randint(1, paragraph):04d}"
+                           + (f" UNTIL {field_name} > 0" if rng.random() < 0.3 else ""))
+            elif r < t_sql:
+                out += [f"{AREA_B}EXEC SQL",
+                        f"{AREA_B}    SELECT COL_{rng.randint(1, 9)} INTO :{field_name}",
+                        f"{AREA_B}    FROM TABLE_{rng.randint(1, 20)} WHERE ID = :{rng.choice(fields)}",
+                        f"{AREA_B}END-EXEC."]
+            elif r < t_call:
+                target = _program_name(rng.randrange(portfolio_size)) if portfolio_size > 1 else "EXTUTIL"
+                out.append(f"{AREA_B}CALL '{target}' USING {field_name}.")
+            else:
+                out.append(f"{AREA_B}MOVE {field_name} TO {rng.choice(fields)}.")
+            comment()
+    out.append(f"{AREA_B}STOP RUN.")
+    return "\n".join(_card(line, n, spec) for n, line in enumerate(out, 1)) + "\n"
+
+
+def write_corpus(folder: str, n_programs: int, spec: CorpusSpec = CorpusSpec(), seed: int = 0) -> List[str]:
+    """Writes n_programs .cbl files plus folder/copybooks; returns the program paths."""
+    library = os.path.join(folder, "copybooks")
+    os.makedirs(library, exist_ok=True)
+    for c in range(spec.copybooks):
+        with open(os.path.join(library, _copybook_name(c) + ".cpy"), "w") as f:
+            f.write(generate_copybook(c, spec, seed))
+    paths = []
+    for i in range(n_programs):
+        path = os.path.join(folder, f"{_program_name(i)}.cbl")
+        with open(path, "w") as f:
+            f.write(generate_program(i, spec, seed, n_programs))
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    options = {}
+    for flag, key in (("--lines", "lines"), ("--seed", "seed")):
+        if flag in args:
+            i = args.index(flag)
+            options[key] = int(args[i + 1])
+            del args[i:i + 2]
+    seed = options.pop("seed", 0)
+    spec = replace(CorpusSpec(), **options)
+    folder = args[0] if args else "data/synthetic_cobol"
+    paths = write_corpus(folder, int(args[1]) if len(args) > 1 else 100, spec, seed)
+    print(f"{len(paths)} programs written to {folder}")
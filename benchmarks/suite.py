@@ -0,0 +1,159 @@
+"""
+Regression benchmarks (pytest-benchmark) over the seeded synthetic corpus:
+cleaning, parsing, risk inference, validation and the end-to-end batch
+(the shipped src.pipeline.Pipeline: clean, parse with COPY expansion, risk,
+conversion against the fake LLM server, validation, writes) at 1 and 2
+worker processes, with the caches off so every round does the work.
+
+Results are compared with the baseline stored in benchmarks/baselines and
+the run fails when a median is more than --tolerance percent slower.
+Timings only compare on the same machine: pytest-benchmark files baselines
+by platform and interpreter, and a machine without one of its own has
+nothing to compare against. Record one with --save on the machine (CI
+runner image, Python version) that runs the comparison, and again when
+that machine changes.
+
+Usage: python -m benchmarks.suite [--save] [--tolerance PCT] [pytest args ...]
+"""
+import os
+import sys
+
+import pytest
+import yaml
+
+from benchmarks.corpus import CorpusSpec, generate_program, write_corpus
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+BASELINE_NAME = "baseline"
+TOLERANCE = 25  # Percent slower (median) than the baseline that fails the run
+PROGRAM_LINES = 5_000
+PORTFOLIO_SIZE = 40
+RISK_ROWS = 10_000
+# Fixed, so the benchmark ids (and their baselines) are the same on every machine
+BATCH_WORKERS = (1, 2)
+
+
+def run_batch(paths, workers: int, config_path: str, output_dir: str) -> int:
+    """One fresh (non-resumed) Pipeline run over the portfolio; returns the programs converted."""
+    from src.pipeline import Pipeline
+    counts = Pipeline(config_path, output_dir=output_dir, workers=workers).run(paths)
+    return counts.get('converted', 0)
+
+
+def synthetic_java(meta) -> str:
+    """A converted class for meta: one camelCase field per variable, one method per paragraph."""
+    def camel(name, first_upper=False):
+        words = name.replace("WS-", "", 1).lower().split("-")
+        return "".join(w.capitalize() if i or first_upper else w for i, w in enumerate(words))
+    fields = "\n".join(f"    private String {camel(v)};" for v in meta["variables"])
+    methods = "\n".join(f"    public void {camel(p)}() {{ repository.findAll(); }}" for p in meta["paragraphs"])
+    return f"public class {camel(meta['name'], True)} {{\n{fields}\n{methods}\n}}\n"
+
+
+@pytest.fixture(scope="module")
+def program():
+    return generate_program(0, CorpusSpec(lines=PROGRAM_LINES, size_jitter=0), seed=1)
+
+
+@pytest.fixture(scope="module")
+def analysis(program):
+    from src.cobol_parser import COBOLParser
+    from src.data_cleaner import DataCleaner
+    return COBOLParser().parse(DataCleaner().clean(program))
+
+
+@pytest.fixture(scope="module")
+def corpus(tmp_path_factory):
+    return write_corpus(str(tmp_path_factory.mktemp("corpus")), PORTFOLIO_SIZE, CorpusSpec(lines=300), seed=1)
+
+
+@pytest.fixture(scope="module")
+def llm():
+    from tests.fake_llm_server import FakeLLMServer
+    with FakeLLMServer(latency=0) as server:
+        yield server
+
+
+@pytest.fixture(scope="module")
+def pipeline_config(tmp_path_factory, corpus, llm):
+    """config.yaml pointed at the fake LLM server and the corpus copybooks, caches and profiling off."""
+    from benchmarks.bench_risk import random_model
+    folder = tmp_path_factory.mktemp("pipeline")
+    with open("config.yaml", "r") as f:
+        cfg = yaml.safe_load(f)
+    cfg["risk_model"]["weights_path"] = str(folder / "risk.npz")
+    cfg["cache"]["enabled"] = False
+    cfg["llm_cache"]["enabled"] = False
+    cfg["llm"]["base_url"] = llm.url
+    cfg["copybooks"]["paths"] = [os.path.join(os.path.dirname(corpus[0]), "copybooks")]
+    cfg["profiling"]["enabled"] = False
+    random_model().save(cfg["risk_model"]["weights_path"])
+    config_path = folder / "config.yaml"
+    config_path.write_text(yaml.safe_dump(cfg))
+    key = os.environ.get("OPENAI_API_KEY")
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    yield str(config_path)
+    if key is None:
+        del os.environ["OPENAI_API_KEY"]
+    else:
+        os.environ["OPENAI_API_KEY"] = key
+
+
+def test_clean(benchmark, program):
+    from src.data_cleaner import DataCleaner
+    benchmark(DataCleaner().clean, program)
+
+
+def test_parse(benchmark, program):
+    from src.cobol_parser import COBOLParser
+    from src.data_cleaner import DataCleaner
+    benchmark(COBOLParser().parse, DataCleaner().clean(program))
+
+
+def test_risk_batch(benchmark):
+    from benchmarks.bench_risk import portfolio, random_model
+    benchmark(random_model().predict_batch, portfolio(RISK_ROWS))
+
+
+def test_risk_single_row(benchmark):
+    from benchmarks.bench_risk import portfolio, random_model
+    benchmark(random_model().predict, portfolio(1))
+
+
+def test_validate(benchmark, analysis):
+    from src.validator import ModernizationValidator
+    meta = vars(analysis)
+    benchmark(ModernizationValidator().validate, synthetic_java(meta), meta)
+
+
+@pytest.mark.parametrize("workers", BATCH_WORKERS)
+def test_end_to_end_batch(benchmark, corpus, pipeline_config, tmp_path, workers):
+    done = benchmark.pedantic(run_batch, args=(corpus, workers, pipeline_config, str(tmp_path)),
+                              rounds=3, iterations=1)
+    assert done == len(corpus)
+
+
+def main(argv):
+    save = "--save" in argv
+    tolerance = TOLERANCE
+    if "--tolerance" in argv:
+        i = argv.index("--tolerance")
+        tolerance = int(argv[i + 1])
+        del argv[i:i + 2]
+    argv = [a for a in argv if a != "--save"]
+    args = [os.path.abspath(__file__), "-q", "-p", "no:cacheprovider",
+            f"--benchmark-storage=file://{BASELINE_DIR}", "--benchmark-columns=min,median,max,rounds"]
+    if save:
+        args.append(f"--benchmark-save={BASELINE_NAME}")
+    else:
+        args += ["--benchmark-compare", f"--benchmark-compare-fail=median:{tolerance}%"]
+    from pytest_benchmark.session import PerformanceRegression
+    try:
+        return pytest.main(args + argv)
+    except PerformanceRegression as e:  # Raised from the terminal summary, after the table
+        print(f"[BENCH] {e} (tolerance {tolerance}% on the median)", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import asdict
+from typing import Any, Callable, Optional
+
+import yaml
+
+from src.cobol_parser import PARSER_VERSION, COBOLProgram
+from src.profiler import count
+
+MISSING = object()
+TOUCH_BATCH = 256  # Cache hits whose last_access updates are written in one transaction
+
+
+class AnalysisCache:
+    """
+    Persistent, content-addressed store for pipeline stage outputs
+    (cleaned source, parse results, risk predictions, Java conversions).
+
+    Keys are SHA-256 hashes of the stage name, the input and everything that
+    can change the output (parser weights, model version), so an unchanged
+    program is never recomputed. Entries live in a single SQLite file and
+    the least recently used ones are evicted once max_size_mb is exceeded;
+    the size is summed from the file inside each write transaction, so
+    processes sharing the file evict against the same total. A hit is a
+    read only: its access time is queued and written with the next put (or
+    every TOUCH_BATCH hits, best-effort), so reruns that mostly hit do not
+    turn every lookup into a write.
+    """
+    def __init__(self, config_path="config.yaml", path: Optional[str] = None,
+                 max_size_mb: Optional[float] = None, enabled: Optional[bool] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f)
+        cache_cfg = cfg.get('cache', {})
+        self.enabled = cache_cfg.get('enabled', True) if enabled is None else enabled
+        self.path = path or cache_cfg.get('path', '.cache/analysis.db')
+        self.max_bytes = int((max_size_mb or cache_cfg.get('max_size_mb', 256)) * 1024 * 1024)
+        self.model_version = str(cache_cfg.get('model_version', 'v1'))
+        # Anything that changes parser/model output is folded into every key
+        self.fingerprint = json.dumps(
+            {"weights": cfg['parser']['weights'], "model_version": self.model_version},
+            sort_keys=True
+        )
+
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+        self._db = None
+        self._size = 0
+        self._touched = {}  # key -> last access not yet written
+        if self.enabled:
+            self._open()
+
+    def _open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, stage TEXT, value TEXT,"
+            " size INTEGER, last_access REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def key(self, stage: str, *parts: Any) -> str:
+        h = hashlib.sha256()
+        h.update(stage.encode())
+        h.update(self.fingerprint.encode())
+        for part in parts:
+            data = part if isinstance(part, str) else json.dumps(part, sort_keys=True, default=str)
+            h.update(b"\x00")
+            h.update(data.encode("utf-8", "surrogatepass"))
+        return h.hexdigest()
+
+    def get(self, stage: str, key: str, default=None):
+        if not self.enabled:
+            return default
+        with self._lock:
+            row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses[stage] += 1
+                count("cache_misses")
+                return default
+            self._touched[key] = time.time()
+            if len(self._touched) >= TOUCH_BATCH:
+                self._write_touches()
+        self.hits[stage] += 1
+        count("cache_hits")
+        return json.loads(row[0])
+
+    def put(self, stage: str, key: str, value: Any):
+        if not self.enabled:
+            return
+        data = json.dumps(value)
+        size = len(data)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")  # takes the write lock, so the sum below stays exact
+            try:
+                self._flush_touches()  # recency first, so eviction sees this process's hits
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, stage, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, stage, data, size, time.time())
+                )
+                self._evict()
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def _flush_touches(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET last_access = ? WHERE key = ?",
+                                 [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def _write_touches(self):
+        """Queued access times in their own transaction. LRU order is advisory, so a locked database drops them."""
+        try:
+            self._flush_touches()
+            self._db.commit()
+        except sqlite3.OperationalError:
+            self._db.rollback()
+            self._touched.clear()
+
+    def _evict(self):
+        # Other processes write to the same file: size it from the table, not from this instance's puts
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        # Drop least recently used entries until the store fits again
+        while self._size > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            for key, size in rows:
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    break
+
+    def cached(self, stage: str, parts, compute: Callable[[], Any],
+               encode: Callable[[Any], Any] = None, decode: Callable[[Any], Any] = None,
+               cacheable: Callable[[Any], bool] = None):
+        """
+        Returns the cached result for (stage, *parts) or computes and stores it.
+        encode/decode convert the result to and from JSON-friendly data;
+        cacheable can veto storing a result (e.g. failed LLM calls).
+        """
+        key = self.key(stage, *parts)
+        stored = self.get(stage, key, MISSING)
+        if stored is not MISSING:
+            return decode(stored) if decode else stored
+        value = compute()
+        if cacheable is None or cacheable(value):
+            self.put(stage, key, encode(value) if encode else value)
+        return value
+
+    def stats(self) -> dict:
+        stages = sorted(set(self.hits) | set(self.misses))
+        if self.enabled:
+            with self._lock:
+                self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        return {
+            "enabled": self.enabled,
+            "size_bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "stages": {s: {"hits": self.hits[s], "misses": self.misses[s]} for s in stages},
+        }
+
+    def clear(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._db.commit()
+            self._size = 0
+
+    def close(self):
+        if self._db is not None:
+            with self._lock:
+                self._write_touches()
+            self._db.close()
+            self._db = None
+            self.enabled = False
+
+    # --- Stage helpers used by the demo, API and Spark jobs ---
+
+    def clean(self, cleaner, raw_code: str) -> str:
+        settings = [type(cleaner).__name__, getattr(cleaner, 'version', 1), getattr(cleaner, 'source_format', None)]
+        return self.cached("clean", [settings, raw_code], lambda: cleaner.clean(raw_code))
+
+    def parse(self, parser, code: str) -> COBOLProgram:
+        return self.cached(
+            "parse", [PARSER_VERSION, parser.cfg, code], lambda: parser.parse(code),
+            encode=asdict, decode=lambda d: COBOLProgram(**d)
+        )
+
+    def risk(self, model, features) -> str:
+        version = getattr(model, 'version', type(model).__name__)
+        return self.cached("risk", [version, features], lambda: model.predict(features))
+
+    def risk_many(self, model, rows) -> list:
+        """Batch variant of risk(): cache misses are scored in one predict_batch call."""
+        version = getattr(model, 'version', type(model).__name__)
+        keys = [self.key("risk", version, [row]) for row in rows]
+        results = [self.get("risk", k, MISSING) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is MISSING]
+        if todo:
+            for i, label in zip(todo, model.predict_batch([rows[i] for i in todo])):
+                results[i] = label
+                self.put("risk", keys[i], label)
+        return results
+
+    def convert(self, converter, code: str, meta: dict) -> str:
+        return self.cached(
+            "convert", [converter.model, converter.temperature, code, meta],
+            lambda: converter.convert_to_java(code, meta),
+            cacheable=lambda java: not converter.is_failure(java)
+        )
+
+    def convert_stream(self, converter, code: str, meta: dict):
+        """Streaming variant of convert(): yields the cached output or the live LLM stream."""
+        key = self.key("convert", converter.model, converter.temperature, code, meta)
+        stored = self.get("convert", key, MISSING)
+        if stored is not MISSING:
+            yield stored
+            return
+        pieces = []
+        for piece in converter.stream_java(code, meta):
+            pieces.append(piece)
+            yield piece
+        java = "".join(pieces)
+        if not converter.is_failure(java):
+            self.put("convert", key, java)
+
+    def convert_many(self, converter, jobs) -> list:
+        """Batch variant of convert(): only cache misses are sent to the LLM, concurrently."""
+        keys = [self.key("convert", converter.model, converter.temperature, code, meta) for code, meta in jobs]
+        results = [self.get("convert", k, MISSING) for k in keys]
+        todo = [i for i, r in enumerate(results) if r is MISSING]
+        if todo:
+            fresh = converter.convert_many([jobs[i] for i in todo])
+            for i, java in zip(todo, fresh):
+                results[i] = java
+                if not converter.is_failure(java):
+                    self.put("convert", keys[i], java)
+        return results
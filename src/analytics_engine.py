@@ -2,15 +2,33 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from src.result_store import ResultStore
+
 class ModernizationAnalytics:
-    def generate_dashboard(self, data):
-        df = pd.DataFrame(data)
+    def generate_dashboard(self, store: ResultStore, max_programs: int = 50):
+        # One bar per program: only the most complex ones stay readable at portfolio scale
+        df = store.top('complexity_score', max_programs, ['name', 'complexity_score', 'risk_level'])
+        df['risk_level'] = df['risk_level'].astype(str)
         plt.figure(figsize=(12, 6))
         sns.set_theme(style="whitegrid")
         
         # Plot Complexity vs Name
         sns.barplot(x='name', y='complexity_score', hue='risk_level', data=df)
-        plt.title("Modernization Portfolio Analysis (IBM POC)")
+        title = "Modernization Portfolio Analysis (IBM POC)"
+        if store.rows > max_programs:
+            title += f" - Top {max_programs} of {store.rows} by Complexity"
+        plt.title(title)
         plt.ylabel("Complexity Score (Weighted)")
         plt.savefig("docs/modernization_dashboard.png")
-        plt.close()
\ No newline at end of file
+        plt.close()
+
+    def summarize(self, store: ResultStore) -> dict:
+        """Portfolio figures for the executive summary, aggregated chunk by chunk."""
+        risk_counts = store.value_counts('risk_level')
+        return {
+            "total": store.rows,
+            "avg_complexity": store.mean('complexity_score'),
+            "avg_validation": store.mean('validation_score'),
+            "risk_counts": pd.Series(risk_counts, name='count').sort_values(ascending=False),
+            "high_risk": risk_counts.get('HIGH', 0),
+        }
@@ -1,47 +1,305 @@
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse
-from src.cobol_parser import COBOLParser
-from src.genai_converter import GenAIConverter
-from src.dl_risk_model import DeepRiskModel
-import uvicorn
+import asyncio
+import codecs
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import List, Tuple
 
-app = FastAPI(title="IBM COBOL Modernization API")
+from fastapi import FastAPI, UploadFile, File, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-# Initialize engines
-parser = COBOLParser()
-converter = GenAIConverter()
-risk_model = DeepRiskModel()
+from src.job_queue import JobQueue, QueueFullError
+from src.profiler import StageRecord
+
+class Engines:
+    """
+    Cleaner, parser, converter, risk model, cache and job queue, built once per
+    process. Their imports (NumPy, the OpenAI SDK) and the config read are
+    deferred to load() so the app imports and answers liveness probes
+    immediately, even with a broken config.
+    """
+    def __init__(self, config_path="config.yaml"):
+        self.config_path = config_path
+        self.cleaner = None
+        self.parser = None
+        self.converter = None
+        self.risk_model = None
+        self.cache = None
+        self.copybooks = None
+        self.profiler = None
+        self.jobs = None
+        self.ready = False
+        self.error = None
+        self._lock = threading.Lock()
+        self._graph = None
+        self._graph_path = None
+        self._graph_mtime = None
+
+    def load(self) -> "Engines":
+        with self._lock:
+            if self.ready:
+                return self
+            try:
+                from src.cobol_parser import COBOLParser
+                from src.data_cleaner import DataCleaner
+                from src.genai_converter import GenAIConverter
+                from src.risk_inference import load_risk_model
+                from src.analysis_cache import AnalysisCache
+                from src.copybooks import CopybookLibrary
+                from src.llm_cache import LLMResponseCache
+                from src.profiler import Profiler
+
+                self.cleaner = DataCleaner()
+                self.parser = COBOLParser(self.config_path)
+                self.cache = AnalysisCache(self.config_path)
+                # Identical prompts from concurrent requests share one LLM call
+                self.converter = GenAIConverter(
+                    self.config_path, response_cache=LLMResponseCache(self.config_path, store=self.cache))
+                self.risk_model = load_risk_model(self.config_path)  # Saved weights, NumPy forward pass
+                self.copybooks = CopybookLibrary(self.config_path)  # Shared by all requests
+                self.profiler = Profiler(self.config_path, keep_records=False)  # Histograms for /metrics
+                self.jobs = JobQueue(self.config_path)
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.error = None
+            self.ready = True
+            return self
+
+    def call_graph(self):
+        """The portfolio CALL index written by the pipeline, reloaded when it changes."""
+        import yaml
+        from src.call_graph import CallGraph
+
+        if self._graph_path is None:
+            with open(self.config_path, 'r') as f:
+                self._graph_path = yaml.safe_load(f).get('call_graph', {}).get('path', '.cache/call_graph.json')
+        path = self._graph_path
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            if mtime != self._graph_mtime:
+                self._graph, self._graph_mtime = CallGraph.load(path), mtime
+            return self._graph
+
+    def warm_up(self):
+        """Background load; a failure is kept in self.error for /health/ready."""
+        try:
+            self.load()
+        except Exception:
+            pass
+
+    def close(self):
+        if self.jobs is not None:
+            self.jobs.shutdown()
+        if self.cache is not None:
+            self.cache.close()
+
+engines = Engines()
+
+def modernize_files(eng: Engines, files: List[Tuple[str, str]]) -> List[dict]:
+    """
+    Blocking pipeline for a batch of (filename, source) pairs: clean, parse,
+    batched risk scoring and concurrent conversion. Runs on the JobQueue
+    worker pool.
+    """
+    cache, profiler = eng.cache, eng.profiler
+    # Cleaned first, as in the batch pipeline, so commented-out COPY lines are not expanded
+    with profiler.stage("clean", nbytes=sum(len(content) for _, content in files)) as clean_stage:
+        sources = [cache.clean(eng.cleaner, content) for _, content in files]
+    with profiler.stage("parse", nbytes=sum(map(len, sources))) as stage:
+        analyses = [eng.copybooks.analyze(code, lambda expanded: cache.parse(eng.parser, expanded))
+                    for code in sources]
+        clean_stage.programs = stage.programs = names = [a.name for a in analyses]
+    features = [[a.code_lines, len(a.variables), len(a.sql_statements), len(a.calls), a.logic_points]
+                for a in analyses]
+    with profiler.stage("risk", names):
+        risks = cache.risk_many(eng.risk_model, features)
+    jobs = [(code, {**vars(a), 'risk_level': r}) for code, a, r in zip(sources, analyses, risks)]
+    with profiler.stage("convert", names, stage.bytes):
+        java = cache.convert_many(eng.converter, jobs) if len(jobs) > 1 else \
+            [cache.convert(eng.converter, *jobs[0])]
+    return [
+        {"file": filename, "program_name": a.name, "risk_assessment": r,
+         "complexity": a.complexity_score, "java_output": code}
+        for (filename, _), a, r, code in zip(files, analyses, risks, java)
+    ]
+
+def analyze_stream(eng: Engines, scan, content: str):
+    """
+    Blocking tail of a streamed upload: the scanned analysis (re-parsed from
+    the cleaned source with COPY members expanded when it has any) and its
+    risk level. Run off the event loop.
+    """
+    analysis = eng.parser.build(scan.finish())
+    if analysis.copybooks:
+        # COPY members change the analysis; expand them (memoized) and parse again,
+        # cleaned first so COPY statements in comment lines stay unexpanded
+        with eng.profiler.stage("parse", analysis.name, len(content)):
+            analysis = eng.copybooks.analyze(eng.cleaner.clean(content), eng.parser.parse)
+    features = [[analysis.code_lines, len(analysis.variables), len(analysis.sql_statements),
+                 len(analysis.calls), analysis.logic_points]]
+    with eng.profiler.stage("risk", analysis.name):
+        risk = eng.cache.risk(eng.risk_model, features)
+    return analysis, risk
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_events(eng: Engines, content: str, analysis, risk: str):
+    """Server-sent events: the analysis first, then the Java output as it is generated."""
+    yield _sse("analysis", {"program_name": analysis.name, "risk_assessment": risk,
+                            "complexity": analysis.complexity_score})
+    meta = {**vars(analysis), 'risk_level': risk}
+    # Timed by hand from the first to the last piece, client pauses included:
+    # each next() may run in a fresh context, so profiler.stage() cannot span the yields
+    record = StageRecord("convert", [analysis.name], bytes=len(content))
+    started = time.perf_counter()
+    try:
+        for piece in eng.cache.convert_stream(eng.converter, content, meta):
+            yield _sse("java", piece)
+    except Exception as e:
+        yield _sse("error", {"error": str(e)})
+    record.wall = time.perf_counter() - started
+    eng.profiler.record(record)
+    yield _sse("done", {})
+
+async def _ready_engines() -> Engines:
+    # Waits for the warm-up if it is still running (or loads on first use)
+    return engines if engines.ready else await asyncio.to_thread(engines.load)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background: the server accepts connections right away
+    # and /health/ready flips once the engines are loaded.
+    warmup = asyncio.create_task(asyncio.to_thread(engines.warm_up))
+    yield
+    if not warmup.done():
+        warmup.cancel()
+    engines.close()
+
+app = FastAPI(title="IBM COBOL Modernization API", lifespan=lifespan)
 
 @app.get("/health")
 def health():
-    return {"status": "healthy", "engine": "TensorFlow 2.x"}
+    status = {"status": "healthy", "ready": engines.ready, "engine": "NumPy risk model"}
+    if engines.ready:
+        status["cache"] = engines.cache.stats()
+        status["llm_cache"] = engines.converter.response_cache.stats()
+    return status
+
+@app.get("/health/live")
+def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness():
+    if not engines.ready:
+        body = {"status": "loading"} if engines.error is None else {"status": "failed", "error": engines.error}
+        return JSONResponse(status_code=503, content=body)
+    return {"status": "ready"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape target: per-stage wall/CPU histograms and byte, token and cache counters."""
+    body = engines.profiler.render_prometheus() if engines.profiler is not None else ""
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
 
 @app.post("/modernize")
 async def modernize_code(file: UploadFile = File(...)):
     try:
+        eng = await _ready_engines()
         content = (await file.read()).decode("utf-8")
-        
-        # 1. Parse
-        analysis = parser.parse(content)
-        
-        # 2. Risk (Deep Learning)
-        features = [[analysis.code_lines, len(analysis.variables), 
-                    len(analysis.sql_statements), len(analysis.calls), analysis.logic_points]]
-        risk = risk_model.predict(features)
-        
-        # 3. Convert (GenAI)
-        meta = vars(analysis)
-        meta['risk_level'] = risk
-        java_code = converter.convert_to_java(content, meta)
-        
-        return {
-            "program_name": analysis.name,
-            "risk_assessment": risk,
-            "complexity": analysis.complexity_score,
-            "java_output": java_code[:500] + "..." # Preview
-        }
+
+        # Parse, risk and conversion block, so they run on the worker pool
+        result = (await eng.jobs.run(modernize_files, eng, [(file.filename, content)]))[0]
+        del result["file"]
+        result["java_output"] = result["java_output"][:500] + "..." # Preview
+        return result
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/modernize/stream")
+async def modernize_stream(request: Request):
+    """
+    Takes the COBOL source as the raw request body and parses it chunk by
+    chunk as it arrives; the response streams the full Java output as SSE.
+    """
+    from src.cobol_parser import ProgramScanner
+
+    eng = await _ready_engines()
+    limit = eng.jobs.max_upload_bytes
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    scan = ProgramScanner()
+    parts, size = [], 0
+    try:
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                return JSONResponse(status_code=413, content={
+                    "error": f"Upload exceeds max_upload_bytes={limit}"})
+            text = decoder.decode(chunk)
+            # Scanning is CPU work: off the event loop, one chunk at a time
+            await asyncio.to_thread(scan.feed_text, text)
+            parts.append(text)
+        text = decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        return JSONResponse(status_code=400, content={"error": f"Not UTF-8 text: {e}"})
+    await asyncio.to_thread(scan.feed_text, text)
+    parts.append(text)
+    content = "".join(parts)
+    del parts
+
+    analysis, risk = await asyncio.to_thread(analyze_stream, eng, scan, content)
+    return StreamingResponse(stream_events(eng, content, analysis, risk), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/programs/{name}/dependents")
+def program_dependents(name: str):
+    """What depends on a program: direct callers and the transitive impact set."""
+    graph = engines.call_graph()
+    if graph is None:
+        return JSONResponse(status_code=503, content={"error": "No call graph yet; run the pipeline first"})
+    if name not in graph:
+        name = name.upper()
+    if name not in graph:
+        return JSONResponse(status_code=404, content={"error": f"Unknown program {name}"})
+    return {"program": name, "callers": graph.callers(name), "callees": graph.callees(name),
+            "impact": graph.impact(name)}
+
+@app.post("/jobs", status_code=202)
+async def submit_job(files: List[UploadFile] = File(...)):
+    try:
+        eng = await _ready_engines()
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"error": str(e)})
+    queue = eng.jobs
+    if len(files) > queue.max_files_per_job:
+        return JSONResponse(status_code=413, content={
+            "error": f"{len(files)} files uploaded (max_files_per_job={queue.max_files_per_job})"})
+    try:
+        sources = [(f.filename, (await f.read()).decode("utf-8")) for f in files]
+    except UnicodeDecodeError as e:
+        return JSONResponse(status_code=400, content={"error": f"Not UTF-8 text: {e}"})
+    try:
+        job = queue.submit([name for name, _ in sources], modernize_files, eng, sources)
+    except QueueFullError as e:
+        return JSONResponse(status_code=429, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+    return {"id": job.id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = engines.jobs.get(job_id) if engines.jobs is not None else None
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": f"Unknown job {job_id}"})
+    return job.to_dict()
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,247 @@
+import json
+import os
+import re
+from array import array
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+PUBLIC_CLASS_RE = re.compile(r"\bpublic\s+(?:final\s+)?(?:class|record|interface)\s+(\w+)")
+PUBLIC_METHOD_RE = re.compile(
+    r"^\s*public\s+(?:static\s+)?(?:final\s+)?(?!class\b|record\b|interface\b)"
+    r"([\w<>\[\],.? ]+?\s+\w+\s*\([^)]*\))", re.MULTILINE)
+
+class CallGraph:
+    """
+    Portfolio-wide CALL dependency index. Program names are interned to
+    integer ids and edges (caller -> callee) are kept in CSR form: one
+    offsets array and one targets array, plus the same for reverse edges.
+    Callees without source in the portfolio are kept as external nodes.
+    """
+    def __init__(self, programs: Dict[str, Iterable[str]]):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.defined = set()
+        for name in programs:
+            self.defined.add(self._intern(name))
+        edges = [(self._ids[name], self._intern(callee))
+                 for name, calls in programs.items() for callee in dict.fromkeys(calls)]
+        n = len(self.names)
+        self._out_offsets, self._out = self._csr(n, edges)
+        self._in_offsets, self._in = self._csr(n, [(b, a) for a, b in edges])
+
+    @classmethod
+    def from_programs(cls, programs) -> "CallGraph":
+        """From COBOLProgram objects or dicts with 'name' and 'calls'."""
+        edges = {}
+        for p in programs:
+            name, calls = (p['name'], p.get('calls', [])) if isinstance(p, dict) else (p.name, p.calls)
+            edges.setdefault(name, []).extend(calls)
+        return cls(edges)
+
+    def _intern(self, name: str) -> int:
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(name)
+        return self._ids[name]
+
+    @staticmethod
+    def _csr(n: int, edges: List[Tuple[int, int]]):
+        counts = [0] * (n + 1)
+        for a, _ in edges:
+            counts[a + 1] += 1
+        for i in range(n):
+            counts[i + 1] += counts[i]
+        offsets = array('i', counts)
+        targets = array('i', bytes(4 * len(edges)))
+        fill = list(counts[:n])
+        for a, b in edges:
+            targets[fill[a]] = b
+            fill[a] += 1
+        return offsets, targets
+
+    def _succ(self, v: int) -> array:
+        return self._out[self._out_offsets[v]:self._out_offsets[v + 1]]
+
+    def _pred(self, v: int) -> array:
+        return self._in[self._in_offsets[v]:self._in_offsets[v + 1]]
+
+    def _id(self, name: str) -> int:
+        if name not in self._ids:
+            raise KeyError(f"Unknown program {name}")
+        return self._ids[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # --- Queries ---
+
+    def callees(self, name: str) -> List[str]:
+        return sorted(self.names[w] for w in self._succ(self._id(name)))
+
+    def callers(self, name: str) -> List[str]:
+        return sorted(self.names[w] for w in self._pred(self._id(name)))
+
+    def _reach(self, start: int, step) -> Set[int]:
+        seen, queue = {start}, deque([start])
+        while queue:
+            for w in step(queue.popleft()):
+                if w not in seen:
+                    seen.add(w)
+                    queue.append(w)
+        seen.discard(start)
+        return seen
+
+    def impact(self, name: str) -> List[str]:
+        """Every program that calls name directly or transitively (what depends on it)."""
+        return sorted(self.names[w] for w in self._reach(self._id(name), self._pred))
+
+    def dependencies(self, name: str) -> List[str]:
+        """Every program name calls directly or transitively."""
+        return sorted(self.names[w] for w in self._reach(self._id(name), self._succ))
+
+    def orphans(self) -> List[str]:
+        """Programs in the portfolio that neither call nor are called by anything."""
+        return sorted(self.names[v] for v in self.defined if not self._succ(v) and not self._pred(v))
+
+    def external(self) -> List[str]:
+        """Called programs with no source in the portfolio."""
+        return sorted(self.names[v] for v in range(len(self.names)) if v not in self.defined)
+
+    def sccs(self) -> List[List[str]]:
+        """Strongly connected components (Tarjan), callees before callers."""
+        return [sorted(self.names[v] for v in comp) for comp in self._tarjan()]
+
+    def _tarjan(self) -> List[List[int]]:
+        # Iterative, so long call chains cannot hit the recursion limit
+        n = len(self.names)
+        index, low, on_stack = [-1] * n, [0] * n, [False] * n
+        stack, components, counter = [], [], 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, 0)]
+            while work:
+                v, i = work[-1]
+                succ = self._succ(v)
+                if i < len(succ):
+                    work[-1] = (v, i + 1)
+                    w = succ[i]
+                    if index[w] == -1:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack[w] = True
+                        work.append((w, 0))
+                    elif on_stack[w]:
+                        low[v] = min(low[v], index[w])
+                    continue
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    low[u] = min(low[u], low[v])
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        component.append(w)
+                        if w == v:
+                            break
+                    components.append(component)
+        return components
+
+    def waves(self, names: Optional[Iterable[str]] = None) -> List[List[str]]:
+        """
+        Topological conversion waves over the portfolio programs, callees first.
+        A program's wave is one past the deepest wave among its callees; a call
+        cycle lands in a single wave. names restricts the output to a subset.
+        """
+        level = [-1] * len(self.names)
+        for component in self._tarjan():
+            members = set(component)
+            depth = max((level[w] for v in component for w in self._succ(v)
+                         if w not in members and w in self.defined), default=-1) + 1
+            for v in component:
+                if v in self.defined:
+                    level[v] = depth
+        wanted = self.defined if names is None else {self._ids[n] for n in names if n in self._ids}
+        grouped: Dict[int, List[str]] = {}
+        for v in wanted:
+            grouped.setdefault(level[v], []).append(self.names[v])
+        return [sorted(grouped[k]) for k in sorted(grouped)]
+
+    # --- Persistence ---
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        return {self.names[v]: [self.names[w] for w in self._succ(v)] for v in sorted(self.defined)}
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CallGraph":
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+def java_interface(java_code: str) -> str:
+    """Public class name and method signatures of a converted program, for callers' prompts."""
+    match = PUBLIC_CLASS_RE.search(java_code or "")
+    if not match:
+        return ""
+    methods = [" ".join(m.split()) + ";" for m in PUBLIC_METHOD_RE.findall(java_code)]
+    return f"public class {match.group(1)} {{ {' '.join(methods)} }}" if methods else f"public class {match.group(1)}"
+
+def saved_interfaces(names: Iterable[str], java_dir: str) -> Dict[str, str]:
+    """Java interfaces of programs converted by earlier runs, read from java_dir/<name>.java."""
+    interfaces = {}
+    for name in names:
+        path = os.path.join(java_dir, f"{name}.java")
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                interfaces[name] = java_interface(f.read())
+    return interfaces
+
+def convert_in_waves(graph: CallGraph, jobs: Sequence[Tuple[str, dict]],
+                     convert_many: Callable[[List[Tuple[str, dict]]], List[str]],
+                     interfaces: Optional[Dict[str, str]] = None) -> List[str]:
+    """
+    Converts (code, meta) jobs wave by wave so callees are done before their
+    callers; each wave is one convert_many batch (full parallelism). A caller's
+    meta gets 'callee_interfaces' with the Java interface of converted callees,
+    those outside jobs taken from interfaces (e.g. saved_interfaces).
+    Results are returned in input order.
+    """
+    positions: Dict[str, List[int]] = {}
+    for i, (_, meta) in enumerate(jobs):
+        positions.setdefault(meta.get('name'), []).append(i)
+    waves = graph.waves(positions)
+    scheduled = {name for wave in waves for name in wave}
+    leftover = [name for name in positions if name not in scheduled]
+    if leftover:
+        waves.append(leftover)
+
+    results: List[Optional[str]] = [None] * len(jobs)
+    interfaces = dict(interfaces or {})
+    for wave in waves:
+        indices = [i for name in wave for i in positions[name]]
+        batch = []
+        for i in indices:
+            code, meta = jobs[i]
+            callees = {c: interfaces[c] for c in meta.get('calls', []) if interfaces.get(c)}
+            batch.append((code, {**meta, 'callee_interfaces': callees} if callees else meta))
+        for i, java in zip(indices, convert_many(batch)):
+            results[i] = java
+            interfaces[jobs[i][1].get('name')] = java_interface(java)
+    return results
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+@dataclass
+class FileState:
+    path: str
+    mtime: float
+    size: int
+    sha256: str = ""
+
+@dataclass
+class ChangeSet:
+    added: List[FileState] = field(default_factory=list)
+    changed: List[FileState] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    @property
+    def to_process(self) -> List[FileState]:
+        return self.added + self.changed
+
+def settings_fingerprint(**settings) -> str:
+    """Digest of everything besides the source that shapes a result (parser weights, model versions, ...)."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def dependency_stamps(stamps: Dict[str, tuple]) -> Dict[str, list]:
+    """
+    [mtime, size, sha256] of every member a result was built from, given the
+    (mtime, size) each was read at (Expansion.stamps). A member that changed
+    since it was read gets no digest, so the result is redone next time.
+    """
+    deps = {}
+    for path, (mtime, size) in stamps.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            deps[path] = [mtime, size, ""]
+            continue
+        same = (st.st_mtime, st.st_size) == (mtime, size)
+        deps[path] = [mtime, size, file_digest(path) if same else ""]
+    return deps
+
+def dependencies_changed(deps: Dict[str, list], digests: Optional[Dict[str, str]] = None) -> bool:
+    """True when any recorded member is gone or its content differs; digests memoizes hashes across calls."""
+    digests = {} if digests is None else digests
+    for path, (mtime, size, sha256) in deps.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        if (st.st_mtime, st.st_size) == (mtime, size) and sha256:
+            continue
+        if path not in digests:
+            digests[path] = file_digest(path)
+        if digests[path] != sha256:
+            return True
+    return False
+
+class ChangeManifest:
+    """
+    Remembers path, mtime, size and content hash of every source member
+    together with a small result for it (the last analysis row, or just the
+    program name when the rows live in a ResultStore), so a rerun only has
+    to process added or changed files.
+
+    mtime+size is trusted as a fast path (like make/rsync); when either
+    differs the content hash decides, so a touched-but-identical file is
+    not reprocessed. A member recorded with deps (dependency_stamps of the
+    copybooks it includes) also counts as changed when one of those did.
+    Results are only reused under the settings they were
+    produced with: when the fingerprint (settings_fingerprint) differs from
+    the saved one, every existing member counts as changed.
+    """
+    def __init__(self, path: str = ".cache/manifest.json", fingerprint: str = ""):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries: Dict[str, dict] = {}
+        self.stale = False  # entries were recorded under other settings
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if isinstance(data.get("entries"), dict) and "fingerprint" in data:
+                self.entries = data["entries"]
+                self.stale = data["fingerprint"] != fingerprint
+            else:  # written before fingerprints: settings unknown
+                self.entries = data
+                self.stale = True
+
+    def scan(self, input_dir: str, suffix: str = ".cbl") -> ChangeSet:
+        changes = ChangeSet()
+        seen = set()
+        digests: Dict[str, str] = {}  # copybooks shared by many programs are hashed once
+        with os.scandir(input_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(suffix) or not entry.is_file():
+                    continue
+                st = entry.stat()
+                state = FileState(entry.path, st.st_mtime, st.st_size)
+                seen.add(state.path)
+                old = self.entries.get(state.path)
+                if old is None:
+                    state.sha256 = file_digest(state.path)
+                    changes.added.append(state)
+                elif self.stale:
+                    state.sha256 = file_digest(state.path)
+                    del self.entries[state.path]
+                    changes.changed.append(state)
+                else:
+                    if old['mtime'] == state.mtime and old['size'] == state.size:
+                        state.sha256 = old['sha256']
+                    else:
+                        state.sha256 = file_digest(state.path)
+                    same = state.sha256 == old['sha256']
+                    if same and dependencies_changed(old.get('deps', {}), digests):
+                        same = False
+                    if same:
+                        old['mtime'] = state.mtime
+                        changes.unchanged.append(state.path)
+                    else:
+                        # Stale result is dropped now and re-recorded once reprocessed
+                        del self.entries[state.path]
+                        changes.changed.append(state)
+
+        changes.deleted = [p for p in self.entries if p not in seen]
+        for path in changes.deleted:
+            del self.entries[path]
+        return changes
+
+    def record(self, state: FileState, result: Optional[dict] = None, deps: Optional[Dict[str, list]] = None):
+        self.entries[state.path] = {
+            "mtime": state.mtime,
+            "size": state.size,
+            "sha256": state.sha256,
+            "result": result or {},
+        }
+        if deps:
+            self.entries[state.path]["deps"] = deps
+
+    def results(self) -> List[dict]:
+        return [e['result'] for _, e in sorted(self.entries.items())]
+
+    def save(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"fingerprint": self.fingerprint, "entries": self.entries}, f)
+        os.replace(tmp, self.path)
+        self.stale = False
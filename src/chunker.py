@@ -0,0 +1,116 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+from src.cobol_parser import DIVISION_RE, NOT_PARAGRAPHS
+
+SECTION_RE = re.compile(r"^\s*([\w-]+)\s+SECTION\s*\.", re.IGNORECASE)
+RECORD_RE = re.compile(r"^\s*01\s+([\w-]+)", re.IGNORECASE)
+PARAGRAPH_RE = re.compile(r"^\s*([\w-]+)\s*\.\s*$")
+
+@dataclass
+class Chunk:
+    kind: str        # DIVISION, SECTION, RECORD or PARAGRAPH of the first unit in the chunk
+    name: str
+    text: str
+    start_line: int  # 1-based line of the chunk in the (cleaned) source
+    procedural: bool
+
+def _boundary(line: str, procedural: bool):
+    """(kind, name) if the line starts a new structural unit."""
+    m = DIVISION_RE.match(line)
+    if m:
+        return "DIVISION", m.group(1).upper()
+    m = SECTION_RE.match(line)
+    if m:
+        return "SECTION", m.group(1).upper()
+    if procedural:
+        m = PARAGRAPH_RE.match(line)
+        if m and m.group(1).upper() not in NOT_PARAGRAPHS:
+            return "PARAGRAPH", m.group(1).upper()
+    else:
+        m = RECORD_RE.match(line)
+        if m:
+            return "RECORD", m.group(1).upper()
+    return None
+
+def _units(code: str):
+    """Yields (kind, name, start_line, lines, procedural) split at structural boundaries."""
+    unit = None
+    procedural = False
+    for number, line in enumerate(code.splitlines(keepends=True), 1):
+        boundary = _boundary(line, procedural)
+        if boundary and boundary[0] == "DIVISION":
+            procedural = boundary[1] == "PROCEDURE"
+        if boundary or unit is None:
+            if unit:
+                yield unit
+            kind, name = boundary or ("DIVISION", "PROGRAM")
+            unit = (kind, name, number, [], procedural)
+        unit[3].append(line)
+    if unit:
+        yield unit
+
+def _split_lines(lines: List[str], max_chars: int):
+    """Hard split for a single unit that is larger than max_chars on its own."""
+    piece, size, offset = [], 0, 0
+    for i, line in enumerate(lines):
+        if piece and size + len(line) > max_chars:
+            yield offset, piece
+            piece, size, offset = [], 0, i
+        piece.append(line)
+        size += len(line)
+    if piece:
+        yield offset, piece
+
+def split_program(code: str, max_chars: int = 12000) -> List[Chunk]:
+    """
+    Splits a program along DIVISION, SECTION, 01-record and paragraph
+    boundaries and packs consecutive units into chunks of at most max_chars.
+    Data and procedure code never share a chunk. A program that fits in
+    max_chars comes back as a single chunk.
+    """
+    if len(code) <= max_chars:
+        return [Chunk("DIVISION", "PROGRAM", code, 1, False)]
+
+    chunks: List[Chunk] = []
+    current = None
+    for kind, name, start, lines, procedural in _units(code):
+        text = "".join(lines)
+        if len(text) > max_chars:
+            for part, (offset, piece) in enumerate(_split_lines(lines, max_chars), 1):
+                chunks.append(Chunk(kind, f"{name} (part {part})", "".join(piece), start + offset, procedural))
+            current = None
+            continue
+        if current and current.procedural == procedural and len(current.text) + len(text) <= max_chars:
+            current.text += text
+            continue
+        current = Chunk(kind, name, text, start, procedural)
+        chunks.append(current)
+    return chunks
+
+def java_class_name(program_name: str) -> str:
+    parts = re.split(r"[^0-9A-Za-z]+", program_name or "")
+    name = "".join(p[:1].upper() + p[1:].lower() for p in parts if p)
+    return name if name[:1].isalpha() else f"Program{name}"
+
+def _strip_fences(java: str) -> str:
+    return "\n".join(line for line in java.strip().splitlines() if not line.strip().startswith("```"))
+
+def stitch_java(program_name: str, parts: List[str]) -> str:
+    """Joins per-chunk member lists into one class; imports are deduplicated and hoisted."""
+    imports, members = [], []
+    for part in parts:
+        body = []
+        for line in _strip_fences(part).splitlines():
+            stripped = line.strip()
+            if stripped.startswith("import ") or stripped.startswith("package "):
+                if stripped.startswith("import ") and stripped not in imports:
+                    imports.append(stripped)
+            else:
+                body.append(line)
+        members.append("\n".join(body).strip("\n"))
+    header = "\n".join(imports)
+    body = "\n\n".join("    " + m.replace("\n", "\n    ") for m in members if m.strip())
+    class_decl = f"public class {java_class_name(program_name)} {{\n{body}\n}}\n"
+    return f"{header}\n\n{class_decl}" if header else class_decl
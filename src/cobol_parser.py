@@ -1,7 +1,10 @@
 import re
 import yaml
 from dataclasses import dataclass, field
-from typing import List
+from typing import Iterable, List, Optional
+
+# Bumped whenever the extracted fields change, so cached parse results are recomputed
+PARSER_VERSION = 3
 
 @dataclass
 class COBOLProgram:
@@ -12,43 +15,238 @@ class COBOLProgram:
     sql_statements: List[str] = field(default_factory=list)
     logic_points: int = 0  # NEW: Counts IF, PERFORM, EVALUATE
     complexity_score: float = 0.0
+    copybooks: List[str] = field(default_factory=list)  # COPY members, nested ones too once expanded
+    paragraphs: List[str] = field(default_factory=list)  # PROCEDURE DIVISION paragraph and section names
+
+# Precompiled once at import; the scanner below only ever runs them on a few lines at a time
+NAME_RE = re.compile(r"PROGRAM-ID\.\s+([\w-]+)\.", re.IGNORECASE)
+VAR_RE = re.compile(r"\d{2}\s+([\w-]+)\s+PIC", re.IGNORECASE)
+CALL_RE = re.compile(r"CALL\s+['\"]([\w-]+)['\"]", re.IGNORECASE)
+SQL_START_RE = re.compile(r"EXEC\s+SQL", re.IGNORECASE)
+SQL_END_RE = re.compile(r"END-EXEC", re.IGNORECASE)
+
+# Cyclomatic Complexity (Logic Branching): IF, ELSE, PERFORM, EVALUATE, WHEN, UNTIL.
+# The captured group flags lines that can start one of the patterns above.
+TOKEN_RE = re.compile(
+    r"\b(?:IF|ELSE|PERFORM|EVALUATE|WHEN|UNTIL)\b|(PIC|CALL|PROGRAM-ID|EXEC)", re.IGNORECASE
+)
+# Same pattern for lines already upper-cased; ASCII lines skip the slower IGNORECASE engine
+UPPER_TOKEN_RE = re.compile(r"\b(?:IF|ELSE|PERFORM|EVALUATE|WHEN|UNTIL)\b|(PIC|CALL|PROGRAM-ID|EXEC)")
+
+# Structural lines; the chunker splits programs along the same boundaries
+DIVISION_RE = re.compile(r"^\s*([\w-]+)\s+DIVISION\b", re.IGNORECASE)
+# Single-word sentences that look like paragraph labels but are statements
+NOT_PARAGRAPHS = {"EXIT", "GOBACK", "CONTINUE", "END-IF", "END-PERFORM", "END-EVALUATE",
+                  "END-EXEC", "END-READ", "END-CALL", "ELSE", "RUN"}
+
+NAME_TAIL_RE = re.compile(r"PROGRAM-ID\.\s*\Z", re.IGNORECASE)
+SQL_TAIL_RE = re.compile(r"EXEC\s*\Z", re.IGNORECASE)
+WORD_RE = re.compile(r"[\w-]+")
+LABEL_RE = re.compile(r"^\s*([\w-]+)(\s+SECTION)?\s*\.\s*$", re.IGNORECASE)
+COPY_RE = re.compile(r"\bCOPY\s+([\w-]+|\"[^\"]+\"|'[^']+')", re.IGNORECASE)
+# Everything str.splitlines() treats as a line boundary
+LINE_BREAKS = ("\n", "\r", "\v", "\f", "\x1c", "\x1d", "\x1e", "\x85", "\u2028", "\u2029")
+
+
+class ProgramScanner:
+    """
+    Single-pass, line-oriented scanner that fills every COBOLProgram field.
+
+    Lines are fed one at a time (with their line endings). Statements that
+    continue over several lines (e.g. a level number and its PIC clause, or
+    an EXEC SQL block) are held back until they are complete, so results are
+    identical to running each pattern over the whole source.
+    """
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.lines = 0
+        self.variables: List[str] = []
+        self.calls: List[str] = []
+        self.sql_statements: List[str] = []
+        self.logic_points = 0
+        self.copybooks: List[str] = []
+        self.paragraphs: List[str] = []
+
+        self._procedural = False         # inside the PROCEDURE DIVISION
+        self._pending: List[str] = []   # lines of an unfinished statement
+        self._pending_hit = False        # pending lines contain a PIC/CALL/PROGRAM-ID literal
+        self._prev_digits = False        # last non-blank line ended in two digits
+        self._sql_body: Optional[List[str]] = None  # inside EXEC SQL ... END-EXEC
+        self._sql_head = ""              # trailing 'EXEC' waiting for 'SQL'
+        self._partial = ""               # unterminated last line of feed_text()
+
+    def feed(self, line: str):
+        self.lines += 1
+        triggered = False
+        if line.isascii():
+            # Plain substring checks reject most lines before any regex runs
+            upper = line.upper()
+            if ('IF' in upper or 'PERFORM' in upper or 'WHEN' in upper or 'ELSE' in upper
+                    or 'UNTIL' in upper or 'EVALUATE' in upper):
+                hits = UPPER_TOKEN_RE.findall(upper)
+            else:
+                hits = ()
+                triggered = 'PIC' in upper or 'CALL' in upper or 'PROGRAM-ID' in upper
+            sql_hint = 'EXEC' in upper
+            copy_hint = 'COPY' in upper
+        else:
+            upper = line.upper()
+            hits = TOKEN_RE.findall(line)
+            sql_hint = copy_hint = True
+        if 'DIVISION' in upper:
+            division = DIVISION_RE.match(line)
+            if division:
+                self._procedural = division.group(1).upper() == 'PROCEDURE'
+        elif self._procedural and upper.rstrip().endswith('.'):
+            label = LABEL_RE.match(line)
+            if label and label.group(1).upper() not in NOT_PARAGRAPHS:
+                self.paragraphs.append(label.group(1).upper())
+        if copy_hint:
+            for token in COPY_RE.findall(line):
+                name = token.strip("'\"").upper()
+                if name not in self.copybooks:
+                    self.copybooks.append(name)
+        if hits:
+            keyword_hits = hits.count('')
+            self.logic_points += keyword_hits
+            triggered = keyword_hits != len(hits)
+
+        if sql_hint or self._sql_body is not None or self._sql_head:
+            self._scan_sql(line)
+
+        open_statement = self._is_open(line)
+        if triggered or self._pending or open_statement:
+            self._pending.append(line)
+            self._pending_hit = self._pending_hit or triggered
+            if not open_statement:
+                self._flush()
+
+    def feed_many(self, lines: Iterable[str]):
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def feed_text(self, text: str):
+        """
+        Feeds an arbitrary slice of the source, e.g. one chunk of an upload.
+        Lines are split exactly as str.splitlines(keepends=True) would split
+        the whole text; an unterminated tail waits for the next slice.
+        """
+        lines = (self._partial + text).splitlines(keepends=True)
+        self._partial = ""
+        # A trailing '\r' may be the first half of a '\r\n' split across slices
+        if lines and (not lines[-1].endswith(LINE_BREAKS) or lines[-1].endswith("\r")):
+            self._partial = lines.pop()
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def finish(self):
+        if self._partial:
+            self.feed(self._partial)
+            self._partial = ""
+        self._flush()
+        return self
+
+    def _is_open(self, line: str) -> bool:
+        s = line.rstrip()
+        if not s:
+            # Blank lines neither open nor close a statement
+            return bool(self._pending)
+        prev_digits = self._prev_digits
+        ends_in_digits = self._prev_digits = len(s) >= 2 and s[-2:].isdecimal()
+        last = s[-1]
+        if last == '.':
+            if self.name is not None:
+                return False
+            return s[-11:].upper() == 'PROGRAM-ID.' or (not s.isascii() and NAME_TAIL_RE.search(s) is not None)
+        if not (last.isalnum() or last in '_-'):
+            return False
+        # Level number (with or without its data name) or CALL waiting for its operands
+        if ends_in_digits or s[-4:].upper() == 'CALL':
+            return True
+        words = s.rsplit(None, 1)
+        if len(words) == 1:
+            # Level number at the end of the previous line, data name alone on this one
+            return prev_digits and WORD_RE.fullmatch(words[0]) is not None
+        head = words[0]
+        return len(head) >= 2 and head[-2:].isdecimal() and WORD_RE.fullmatch(words[1]) is not None
+
+    def _flush(self):
+        if self._pending_hit:
+            text = self._pending[0] if len(self._pending) == 1 else "".join(self._pending)
+            if self.name is None:
+                m = NAME_RE.search(text)
+                if m:
+                    self.name = m.group(1)
+            self.variables.extend(VAR_RE.findall(text))
+            self.calls.extend(CALL_RE.findall(text))
+        self._pending = []
+        self._pending_hit = False
+
+    def _scan_sql(self, line: str):
+        pos = 0
+        if self._sql_body is not None:
+            end = SQL_END_RE.search(line)
+            if not end:
+                self._sql_body.append(line)
+                return
+            self._sql_body.append(line[:end.start()])
+            self.sql_statements.append("".join(self._sql_body))
+            self._sql_body = None
+            pos = end.end()
+        text = self._sql_head + line if self._sql_head else line
+        self._sql_head = ""
+        while True:
+            start = SQL_START_RE.search(text, pos)
+            if not start:
+                break
+            end = SQL_END_RE.search(text, start.end())
+            if not end:
+                self._sql_body = [text[start.end():]]
+                return
+            self.sql_statements.append(text[start.end():end.start()])
+            pos = end.end()
+        tail = SQL_TAIL_RE.search(text, pos)
+        if tail:
+            self._sql_head = text[tail.start():]
+
 
 class COBOLParser:
-    def __init__(self, config_path="config.yaml"):
-        with open(config_path, 'r') as f:
-            self.cfg = yaml.safe_load(f)['parser']
+    def __init__(self, config_path="config.yaml", cfg: Optional[dict] = None):
+        # cfg (the 'parser' section) lets Spark executors build a parser from broadcast weights
+        if cfg is None:
+            with open(config_path, 'r') as f:
+                cfg = yaml.safe_load(f)['parser']
+        self.cfg = cfg
 
     def parse(self, code: str) -> COBOLProgram:
-        # Existing parsing logic...
-        name_match = re.search(r"PROGRAM-ID\.\s+([\w-]+)\.", code, re.IGNORECASE)
-        name = name_match.group(1) if name_match else "UNKNOWN"
-        variables = re.findall(r"\d{2}\s+([\w-]+)\s+PIC", code, re.IGNORECASE)
-        calls = re.findall(r"CALL\s+['\"]([\w-]+)['\"]", code, re.IGNORECASE)
-        sql_blocks = re.findall(r"EXEC\s+SQL(.*?)END-EXEC", code, re.DOTALL | re.IGNORECASE)
-
-        # NEW: Cyclomatic Complexity (Logic Branching)
-        # We count IF, ELSE, PERFORM, EVALUATE, WHEN
-        logic_keywords = ['IF', 'ELSE', 'PERFORM', 'EVALUATE', 'WHEN', 'UNTIL']
-        logic_count = 0
-        for word in logic_keywords:
-            logic_count += len(re.findall(fr"\b{word}\b", code, re.IGNORECASE))
+        return self.parse_lines(code.splitlines(keepends=True))
 
+    def parse_lines(self, lines: Iterable[str]) -> COBOLProgram:
+        """Parses a stream of source lines (line endings kept) in one traversal."""
+        scan = ProgramScanner().feed_many(lines).finish()
+        return self.build(scan)
+
+    def build(self, scan: ProgramScanner) -> COBOLProgram:
         # Advanced Scoring using Config weights
         w = self.cfg['weights']
         score = (
-            (len(code.splitlines()) * w['line_weight']) +
-            (len(variables) * w['var_weight']) +
-            (len(sql_blocks) * w['sql_weight']) +
-            (len(calls) * w['call_weight']) +
-            (logic_count * w['logic_weight'])
+            (scan.lines * w['line_weight']) +
+            (len(scan.variables) * w['var_weight']) +
+            (len(scan.sql_statements) * w['sql_weight']) +
+            (len(scan.calls) * w['call_weight']) +
+            (scan.logic_points * w['logic_weight'])
         )
 
         return COBOLProgram(
-            name=name,
-            code_lines=len(code.splitlines()),
-            variables=variables,
-            calls=calls,
-            sql_statements=sql_blocks,
-            logic_points=logic_count,
-            complexity_score=round(score, 2)
-        )
\ No newline at end of file
+            name=scan.name or "UNKNOWN",
+            code_lines=scan.lines,
+            variables=scan.variables,
+            calls=scan.calls,
+            sql_statements=scan.sql_statements,
+            logic_points=scan.logic_points,
+            complexity_score=round(score, 2),
+            copybooks=scan.copybooks,
+            paragraphs=scan.paragraphs
+        )
@@ -0,0 +1,219 @@
+import json
+import os
+import re
+import threading
+import yaml
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.cobol_parser import COBOLProgram
+from src.data_cleaner import DataCleaner
+
+# COPY name [OF|IN library] [SUPPRESS] [REPLACING ...] terminated by a separator period
+COPY_STMT_RE = re.compile(
+    r"\bCOPY\s+(?P<name>[\w-]+|\"[^\"]+\"|'[^']+')"
+    r"(?:\s+(?:OF|IN)\s+(?P<lib>[\w-]+))?"
+    r"(?:\s+SUPPRESS)?"
+    r"(?:\s+REPLACING\s+(?P<rep>(?:==.*?==|[^.=]|=(?!=)|\.(?=\S))*?))?"
+    r"\s*\.(?=\s|$)",
+    re.IGNORECASE | re.DOTALL)
+OPERAND = r"==(?:.*?)==|\"[^\"]*\"|'[^']*'|[\w-]+"
+REPLACING_PAIR_RE = re.compile(rf"(?:\b(LEADING|TRAILING)\s+)?({OPERAND})\s+BY\s+({OPERAND})",
+                               re.IGNORECASE | re.DOTALL)
+
+@dataclass
+class Expansion:
+    text: str
+    copybooks: List[str] = field(default_factory=list)  # every member included, nested ones too
+    missing: List[str] = field(default_factory=list)    # COPY targets not found in the library
+    stamps: Dict[str, tuple] = field(default_factory=dict)  # member path -> (mtime, size) it was read at
+
+def _member_name(token: str) -> str:
+    return token.strip("'\"").upper()
+
+def _stamp(path: str) -> tuple:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return (None, None)
+    return (stat.st_mtime, stat.st_size)
+
+def _operand_pattern(operand: str, mode: str = "") -> str:
+    """
+    Matches whole text words only: an operand edge that is a word character
+    or hyphen must sit next to a separator. A colon-delimited tag (:P:) is
+    its own separator, so it still matches inside :P:-STREET. LEADING and
+    TRAILING match the start or the end of a word.
+    """
+    if operand.startswith("=="):
+        # Pseudo-text matches token by token, whatever the spacing
+        words = operand[2:-2].split()
+        if not words:
+            return r"(?!)"
+        body = r"\s+".join(re.escape(w) for w in words)
+        first, last = words[0][0], words[-1][-1]
+    else:
+        body, first, last = re.escape(operand), operand[0], operand[-1]
+    word = lambda ch: ch.isalnum() or ch in "_-"
+    left = r"(?<![\w-])" if word(first) and mode != "TRAILING" else ""
+    right = r"(?![\w-])" if word(last) and mode != "LEADING" else ""
+    return f"{left}{body}{right}"
+
+def _operand_text(operand: str) -> str:
+    return operand[2:-2].strip() if operand.startswith("==") else operand
+
+class CopybookLibrary:
+    """
+    Resolves COPY statements (with OF/IN and REPLACING) against the
+    configured copybook library paths. Every member is read, cleaned and
+    nested-expanded once and memoized, so a batch of programs sharing the
+    same copybooks pays for each of them a single time. The include index
+    records which programs use which copybook.
+    """
+    def __init__(self, config_path="config.yaml", paths: Optional[List[str]] = None, cfg: Optional[dict] = None):
+        # cfg (the 'copybooks' section) lets Spark executors build a library from broadcast settings
+        if cfg is None:
+            with open(config_path, 'r') as f:
+                cfg = yaml.safe_load(f).get('copybooks', {})
+        self.cfg = cfg
+        self.paths = paths or cfg.get('paths', ['data/copybooks'])
+        self.extensions = cfg.get('extensions', ['.cpy', '.CPY', '.cbl', ''])
+        self.max_depth = cfg.get('max_depth', 16)
+        self.index_path = cfg.get('index_path', '.cache/copybook_index.json')
+        self.cleaner = DataCleaner()
+
+        self._resolved: Dict[Tuple[str, Optional[str]], Optional[str]] = {}
+        self._members: Dict[str, Expansion] = {}        # path -> nested-expanded member
+        self._replaced: Dict[tuple, str] = {}           # (path, member stamps, replacing pairs) -> text
+        self.includes: Dict[str, Set[str]] = {}         # copybook -> programs
+        self.dependencies: Dict[str, Dict[str, tuple]] = {}  # program -> stamps of the members it includes
+        self.loads = 0
+        self._lock = threading.Lock()  # API worker threads share one library
+
+    def resolve(self, name: str, library: Optional[str] = None) -> Optional[str]:
+        key = (name, library)
+        if key not in self._resolved:
+            found = None
+            dirs = [os.path.join(p, library) for p in self.paths] + self.paths if library else self.paths
+            for folder in dirs:
+                for candidate in (name, name.lower()):
+                    for ext in self.extensions:
+                        path = os.path.join(folder, candidate + ext)
+                        if os.path.isfile(path):
+                            found = path
+                            break
+                    if found:
+                        break
+                if found:
+                    break
+            self._resolved[key] = found
+        return self._resolved[key]
+
+    def _member(self, path: str, stack: Tuple[str, ...]) -> Expansion:
+        member = self._members.get(path)
+        # Re-read when the member or a member it includes changed on disk (long-running API)
+        if member is None or any(_stamp(p) != s for p, s in member.stamps.items()):
+            if path in stack or len(stack) >= self.max_depth:
+                raise ValueError(f"Recursive COPY of {path} via {' -> '.join(stack)}")
+            stamp = _stamp(path)
+            text = "\n".join(line.text for line in self.cleaner.stream(path))
+            self.loads += 1
+            member = self._expand(text, stack + (path,))
+            member.stamps[path] = stamp
+            self._members[path] = member
+        return member
+
+    def _replace(self, path: str, member: Expansion, rep: str) -> str:
+        pairs = tuple(tuple(p) for p in REPLACING_PAIR_RE.findall(rep))
+        key = (path, tuple(sorted(member.stamps.items())), pairs)
+        if key not in self._replaced:
+            text = member.text
+            if pairs:
+                pattern = re.compile("|".join(f"({_operand_pattern(a, mode.upper())})" for mode, a, _ in pairs),
+                                     re.IGNORECASE)
+                targets = [_operand_text(b) for _, _, b in pairs]
+                # One pass, so a replacement is never replaced again
+                text = pattern.sub(lambda m: targets[m.lastindex - 1], text)
+            self._replaced[key] = text
+        return self._replaced[key]
+
+    def _expand(self, code: str, stack: Tuple[str, ...] = ()) -> Expansion:
+        copybooks, missing, out, pos, stamps = [], [], [], 0, {}
+        for m in COPY_STMT_RE.finditer(code):
+            name = _member_name(m.group('name'))
+            library = m.group('lib').upper() if m.group('lib') else None
+            path = self.resolve(name, library)
+            if path is None:
+                if name not in missing:
+                    missing.append(name)
+                continue
+            member = self._member(path, stack)
+            text = self._replace(path, member, m.group('rep')) if m.group('rep') else member.text
+            out.append(code[pos:m.start()])
+            out.append(text)
+            pos = m.end()
+            for n in [name] + member.copybooks:
+                if n not in copybooks:
+                    copybooks.append(n)
+            missing.extend(n for n in member.missing if n not in missing)
+            stamps.update(member.stamps)
+        out.append(code[pos:])
+        return Expansion("".join(out), copybooks, missing, stamps)
+
+    def expand(self, code: str) -> Expansion:
+        """Source with every resolvable COPY replaced by the member text."""
+        if 'COPY' not in code.upper():
+            return Expansion(code)
+        with self._lock:
+            return self._expand(code)
+
+    def analyze(self, code: str, parse: Callable[[str], COBOLProgram]) -> COBOLProgram:
+        """
+        parse() run on the expanded source. copybooks lists the included
+        members, then any COPY target that could not be resolved; the
+        program is added to the include index and its members' stamps to
+        dependencies.
+        """
+        expansion = self.expand(code)
+        program = parse(expansion.text)
+        program.copybooks = expansion.copybooks + [n for n in program.copybooks if n not in expansion.copybooks]
+        self.record(program.name, program.copybooks, expansion.stamps)
+        return program
+
+    def record(self, program: str, copybooks: List[str], stamps: Optional[Dict[str, tuple]] = None):
+        with self._lock:
+            self.dependencies[program] = dict(stamps or {})
+            for name in copybooks:
+                self.includes.setdefault(name, set()).add(program)
+
+    def programs_using(self, copybook: str) -> List[str]:
+        return sorted(self.includes.get(copybook.upper(), ()))
+
+    def stats(self) -> dict:
+        return {"members_loaded": self.loads, "expansions_cached": len(self._replaced),
+                "copybooks_indexed": len(self.includes)}
+
+    def save_index(self, path: Optional[str] = None, keep: Iterable[str] = ()):
+        """
+        Writes the include index. Programs in keep (unchanged ones an
+        incremental run did not analyze) carry over their entries from the
+        saved index; every other saved entry is replaced by this run's.
+        """
+        path = path or self.index_path
+        keep = set(keep)
+        index: Dict[str, Set[str]] = {}
+        if keep and os.path.exists(path):
+            with open(path, 'r') as f:
+                for name, progs in json.load(f).items():
+                    kept = keep.intersection(progs)
+                    if kept:
+                        index[name] = kept
+        with self._lock:
+            for name, progs in self.includes.items():
+                index.setdefault(name, set()).update(progs)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({name: sorted(progs) for name, progs in sorted(index.items())}, f, indent=1)
+        os.replace(tmp, path)
@@ -1,22 +1,171 @@
-import re
-from typing import List
+import io
+import itertools
+import mmap
+import os
+from array import array
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+# Fixed-format reference layout: columns 1-6 sequence area, 7 indicator,
+# 8-72 areas A and B, 73-80 program identification area
+SEQUENCE_END = 6
+CODE_END = 72
+COMMENT_INDICATORS = "*/"   # comment, comment with page eject
+DEBUG_INDICATORS = "Dd"     # debugging lines, dropped like comments
+FIXED_INDICATORS = " -" + COMMENT_INDICATORS + DEBUG_INDICATORS
+FORMAT_SAMPLE = 50  # non-blank lines inspected to tell fixed from free format
+_DROPPED = frozenset(COMMENT_INDICATORS + DEBUG_INDICATORS)
+
+class CleanLine(NamedTuple):
+    number: int  # 1-based line in the original source (first line of a continued statement)
+    text: str
+
+class LineMap:
+    """Cleaned line number -> original source line number, both 1-based."""
+    def __init__(self):
+        self.lines = array('i')
+
+    def append(self, original: int):
+        self.lines.append(original)
+
+    def original(self, cleaned_line: int) -> int:
+        return self.lines[cleaned_line - 1]
+
+    def __len__(self):
+        return len(self.lines)
+
+def _is_fixed_line(line: str) -> bool:
+    sequence = line[:SEQUENCE_END]
+    return (sequence.isspace() or sequence.isdecimal() or not sequence) and \
+        (len(line) <= SEQUENCE_END or line[SEQUENCE_END] in FIXED_INDICATORS)
+
+def _open_quote(text: str):
+    """The quote character of an alphanumeric literal left open at the end of text, else None."""
+    quote = None
+    for ch in text:
+        if quote is None:
+            if ch in "'\"":
+                quote = ch
+        elif ch == quote:
+            quote = None  # a doubled quote closes and reopens, which nets out
+    return quote
+
 class DataCleaner:
+    """
+    Normalizes COBOL source for the parser: comment and debugging lines are
+    dropped, fixed-format members lose the sequence (1-6) and identification
+    (73-80) areas, continuation lines ('-' in column 7) are joined to the line
+    they continue, and every line is trimmed. Works as a generator over lines
+    (clean_lines) or a memory-mapped file (stream), with the original line
+    number of each cleaned line.
+    """
+    version = 2  # Bumped when the cleaned output changes, for cache keys
+
+    def __init__(self, source_format: str = "auto"):
+        if source_format not in ("auto", "fixed", "free"):
+            raise ValueError(f"Unknown source_format {source_format!r}")
+        self.source_format = source_format
+
     def clean(self, raw_code: str) -> str:
-        lines = raw_code.splitlines()
-        cleaned_lines = []
-        
+        """
+        Same output as clean_lines, for a whole string in one plain loop over
+        split() lines; the first continuation line hands the member to the
+        look-ahead walk instead.
+        """
+        lines = raw_code.split("\n")
+        if "\r" in raw_code:
+            lines = [line.rstrip("\r") for line in lines]
+        fixed = self.source_format == "fixed"
+        if self.source_format == "auto":
+            head = itertools.islice((line for line in lines if line.strip()), FORMAT_SAMPLE)
+            fixed = all(_is_fixed_line(h) for h in head)
+        if not fixed:
+            return "\n".join(line.text for line in self._free(lines))
+        cleaned = []
         for line in lines:
+            if len(line) > SEQUENCE_END:
+                indicator = line[SEQUENCE_END]
+                if indicator != " ":
+                    if indicator in _DROPPED:
+                        continue
+                    if indicator == "-":
+                        return "\n".join(line.text for line in self._fixed(lines))
+            code = line[SEQUENCE_END + 1:CODE_END].strip()
+            if code:
+                cleaned.append(code)
+        return "\n".join(cleaned)
+
+    def clean_with_map(self, raw_code: str) -> Tuple[str, LineMap]:
+        """clean() plus the original line number of every cleaned line."""
+        line_map, texts = LineMap(), []
+        for line in self.clean_lines(io.StringIO(raw_code)):
+            line_map.append(line.number)
+            texts.append(line.text)
+        return "\n".join(texts), line_map
+
+    def stream(self, path: str, encoding: str = "utf-8") -> Iterator[CleanLine]:
+        """Cleaned lines of a source file, read through mmap one line at a time."""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                raw = (line.decode(encoding, errors="replace") for line in iter(mapped.readline, b""))
+                yield from self.clean_lines(raw)
+
+    def clean_lines(self, lines: Iterable[str]) -> Iterator[CleanLine]:
+        """Generator over source lines (line endings optional); one line of look-ahead for continuations."""
+        lines = (line.rstrip("\r\n") for line in lines)
+        fixed = self.source_format == "fixed"
+        if self.source_format == "auto":
+            # Decide on the first non-blank lines, then replay them
+            head: List[str] = []
+            seen = 0
+            for line in lines:
+                head.append(line)
+                seen += bool(line.strip())
+                if seen >= FORMAT_SAMPLE:
+                    break
+            fixed = all(_is_fixed_line(h) for h in head if h.strip())
+            lines = itertools.chain(head, lines)
+        yield from (self._fixed(lines) if fixed else self._free(lines))
+
+    @staticmethod
+    def _free(lines: Iterable[str]) -> Iterator[CleanLine]:
+        for number, line in enumerate(lines, 1):
             # 1. Remove COBOL comments (Column 7 '*')
             if len(line) >= 7 and line[6] == '*':
                 continue
-                
             # 2. Trim whitespace
             clean_line = line.strip()
-            
             if clean_line:
-                cleaned_lines.append(clean_line)
-                
-        return "\n".join(cleaned_lines)
+                yield CleanLine(number, clean_line)
+
+    @staticmethod
+    def _fixed(lines: Iterable[str]) -> Iterator[CleanLine]:
+        width = CODE_END - SEQUENCE_END - 1
+        pending_number, pending = 0, None  # statement held back until the next line is seen
+        last = 0  # length of pending's last physical line, for literal continuations
+        for number, line in enumerate(lines, 1):
+            indicator = line[SEQUENCE_END] if len(line) > SEQUENCE_END else " "
+            if indicator in COMMENT_INDICATORS or indicator in DEBUG_INDICATORS:
+                continue
+            code = line[SEQUENCE_END + 1:CODE_END]
+            if indicator == "-" and pending is not None:
+                body = code.lstrip()
+                quote = _open_quote(pending)
+                if quote and body.startswith(quote):
+                    # Literal continued: the continued line counts up to column 72, spaces included
+                    pending += " " * (width - last) + body[1:]
+                else:
+                    pending = pending.rstrip() + body
+                last = len(code)
+                continue
+            if not code.strip():
+                continue
+            if pending is not None:
+                yield CleanLine(pending_number, pending.strip())
+            pending_number, pending, last = number, code, len(code)
+        if pending is not None:
+            yield CleanLine(pending_number, pending.strip())
 
     def identify_risks(self, code: str) -> List[str]:
         issues = []
@@ -24,4 +173,4 @@ class DataCleaner:
             issues.append("Contains 'GO TO' statements (Anti-pattern)")
         if code.count("PERFORM") > 10:
             issues.append("High nesting/loop complexity detected")
-        return issues
\ No newline at end of file
+        return issues
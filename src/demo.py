@@ -1,19 +1,26 @@
 import os
-import pandas as pd
+import sys
+import yaml
 import matplotlib.pyplot as plt
 import seaborn as sns
-import numpy as np
 from datetime import datetime
 
 # Import our specialized modules
-from src.cobol_parser import COBOLParser
+from src.cobol_parser import PARSER_VERSION, COBOLParser
 from src.data_cleaner import DataCleaner
-from src.dl_risk_model import DeepRiskModel  # TensorFlow/Keras version
+from src.risk_inference import load_risk_model  # NumPy serving of the TensorFlow/Keras network
 from src.genai_converter import GenAIConverter
+from src.llm_cache import LLMResponseCache
 from src.validator import ModernizationValidator
 from src.analytics_engine import ModernizationAnalytics
-
-def run_ultimate_pipeline():
+from src.analysis_cache import AnalysisCache
+from src.change_manifest import ChangeManifest, FileState, dependency_stamps, settings_fingerprint
+from src.call_graph import CallGraph, convert_in_waves, saved_interfaces
+from src.copybooks import CopybookLibrary
+from src.result_store import ResultStore
+from src.profiler import Profiler
+
+def run_ultimate_pipeline(incremental=True):
     print("="*80)
     print("   IBM ENTERPRISE POC: AI-DRIVEN MAINFRAME MODERNIZATION (v2.0)")
     print("="*80)
@@ -21,22 +28,21 @@ def run_ultimate_pipeline():
     # 1. INITIALIZATION (Frameworks: TensorFlow, Pandas, OpenAI)
     cleaner = DataCleaner()
     parser = COBOLParser()
-    converter = GenAIConverter()
+    cache = AnalysisCache()  # Unchanged programs are served from the content-addressed cache
+    profiler = Profiler()  # Wall/CPU time, bytes, tokens and cache hits per stage and program
+    # Template clones that differ only in comments or layout share one LLM completion;
+    # every program conversion is timed as its own stage
+    converter = GenAIConverter(response_cache=LLMResponseCache(store=cache), profiler=profiler)
     validator = ModernizationValidator()
     analytics = ModernizationAnalytics()
+    copybooks = CopybookLibrary()  # Each copybook is read and expanded once for the whole batch
+    with open("config.yaml", 'r') as f:
+        graph_path = yaml.safe_load(f).get('call_graph', {}).get('path', '.cache/call_graph.json')
     
-    # Initialize Deep Learning Model (TensorFlow/Keras)
-    print("[AI] Initializing TensorFlow/Keras Neural Network...")
-    dl_model = DeepRiskModel()
-    
-    # Mock Training: Demonstrate DL training loop logic
-    # In production, this would load from a saved model or DB
-    X_train = np.random.rand(10, 5) # 10 samples, 5 features
-    y_train = np.random.randint(0, 3, 10) # 3 risk classes
-    dl_model.train(X_train, y_train)
-
-    # Data Store for Pandas EDA
-    results_data = []
+    # Load the Deep Learning Model (TensorFlow/Keras weights, served with NumPy)
+    # A fresh checkout gets seeded NumPy weights; python -m src.dl_risk_model retrains them with Keras
+    print("[AI] Loading TensorFlow/Keras Neural Network weights...")
+    dl_model = load_risk_model()
 
     # Define Paths
     input_dir = "data/sample_cobol"
@@ -45,43 +51,106 @@ def run_ultimate_pipeline():
     os.makedirs("docs", exist_ok=True)
 
     # 2. BATCH PROCESSING LOOP
-    files = [f for f in os.listdir(input_dir) if f.endswith(".cbl")]
-    
-    for filename in files:
+    # The manifest holds digests and program names only; only added or changed
+    # members are reprocessed and deleted ones drop out of the report. Result
+    # rows stream into the columnar store as programs finish, unchanged ones
+    # copied from the previous run's file, so no run holds the whole portfolio.
+    # New parser weights, cleaner or model versions invalidate every stored row.
+    manifest = ChangeManifest(fingerprint=settings_fingerprint(
+        analysis=cache.fingerprint, parser=PARSER_VERSION, cleaner=cleaner.version, risk=dl_model.version))
+    if not incremental:
+        manifest.entries.clear()
+    changes = manifest.scan(input_dir)
+    store = ResultStore()
+    previous = ResultStore.read(store.path)
+    previous_calls = CallGraph.load(graph_path).to_dict() if os.path.exists(graph_path) else {}
+    stored = {name for batch in previous.iter_batches(['name']) for name in batch.column(0).to_pylist()}
+    # An unchanged program whose row or call list was lost is reprocessed
+    names = {path: manifest.entries[path]['result'].get('name') for path in changes.unchanged}
+    lost = {path for path, name in names.items() if name not in stored or name not in previous_calls}
+    for path in lost:
+        entry = manifest.entries.pop(path)
+        changes.changed.append(FileState(path, entry['mtime'], entry['size'], entry['sha256']))
+    changes.unchanged = [path for path in changes.unchanged if path not in lost]
+    kept = {names[path] for path in changes.unchanged}
+    for batch in previous.iter_batches():
+        store.extend(row for row in batch.to_pylist() if row['name'] in kept)
+    print(f"[INCREMENTAL] {len(changes.added)} added, {len(changes.changed)} changed, "
+          f"{len(changes.unchanged)} unchanged, {len(changes.deleted)} deleted")
+
+    analyzed = []
+    for state in changes.to_process:
+        file_path = state.path
+        filename = os.path.basename(file_path)
         print(f"\n[PROCESS] Analyzing {filename}...")
-        file_path = os.path.join(input_dir, filename)
 
         # PHASE A: CLEANING & NORMALIZATION
         with open(file_path, 'r') as f:
             raw_code = f.read()
-        clean_code = cleaner.clean(raw_code)
-
-        # PHASE B: ADVANCED STATIC ANALYSIS (Custom Parser)
-        analysis = parser.parse(clean_code)
-
-        # PHASE C: DEEP LEARNING RISK PREDICTION (TensorFlow)
-        # Features: [Lines, Variables, SQL, Calls, LogicPoints]
-        features = [[
-            analysis.code_lines, 
-            len(analysis.variables), 
-            len(analysis.sql_statements), 
-            len(analysis.calls),
-            analysis.logic_points
-        ]]
-        risk_category = dl_model.predict(features)
-
-        # PHASE D: GEN-AI CONVERSION (GPT-4)
-        metadata = vars(analysis)
-        metadata['risk_level'] = risk_category
-        
-        print(f"    - Executing GenAI Refactoring...")
-        java_output = converter.convert_to_java(clean_code, metadata)
-
-        # PHASE E: AUTOMATED AUDIT & VALIDATION
-        audit = validator.validate(java_output, metadata)
+        with profiler.stage("clean", nbytes=len(raw_code)) as clean_stage:
+            clean_code = cache.clean(cleaner, raw_code)
+
+        # PHASE B: ADVANCED STATIC ANALYSIS (Custom Parser, COPY members expanded)
+        with profiler.stage("parse", nbytes=len(clean_code)) as parse_stage:
+            analysis = copybooks.analyze(clean_code, lambda code: cache.parse(parser, code))
+        clean_stage.programs = parse_stage.programs = [analysis.name]
+
+        analyzed.append((state, analysis, clean_code))
+
+    # PHASE C: DEEP LEARNING RISK PREDICTION (TensorFlow)
+    # Features: [Lines, Variables, SQL, Calls, LogicPoints], scored as one batch
+    features = [[
+        analysis.code_lines,
+        len(analysis.variables),
+        len(analysis.sql_statements),
+        len(analysis.calls),
+        analysis.logic_points
+    ] for _, analysis, _ in analyzed]
+    with profiler.stage("risk", [analysis.name for _, analysis, _ in analyzed]):
+        risk_categories = cache.risk_many(dl_model, features)
+
+    # The fields the converter and validator read; the analysis itself stays untouched
+    jobs = [(clean_code, {
+        "name": analysis.name,
+        "complexity_score": analysis.complexity_score,
+        "risk_level": risk_category,
+        "variables": analysis.variables,
+        "sql_statements": analysis.sql_statements,
+        "calls": analysis.calls,
+        "copybooks": analysis.copybooks,
+        "paragraphs": analysis.paragraphs,
+    }) for (_, analysis, clean_code), risk_category in zip(analyzed, risk_categories)]
+
+    # Portfolio CALL graph: unchanged programs from the last saved graph plus this run
+    programs = {name: previous_calls[name] for name in kept}
+    programs.update({analysis.name: analysis.calls for _, analysis, _ in analyzed})
+    graph = CallGraph(programs)
+    graph.save(graph_path)
+
+    # PHASE D: GEN-AI CONVERSION (GPT-4)
+    # Converted in topological waves (callees first); each wave is one
+    # concurrent, rate-limited batch and callers see their callees' Java API
+    waves = graph.waves(analysis.name for _, analysis, _ in analyzed)
+    # Callees left unchanged by an incremental run offer the Java written last time
+    earlier = saved_interfaces({c for _, meta in jobs for c in meta['calls']} - {m['name'] for _, m in jobs},
+                               output_dir)
+    print(f"\n[GENAI] Executing GenAI Refactoring for {len(analyzed)} programs in {len(waves)} waves...")
+    java_outputs = convert_in_waves(graph, jobs, lambda batch: cache.convert_many(converter, batch), earlier)
+
+    # PHASE E: AUTOMATED AUDIT & VALIDATION (one pass over the batch, each Java output indexed once)
+    with profiler.stage("validate", [meta['name'] for _, meta in jobs], sum(map(len, java_outputs))):
+        audits = validator.validate_many((java_output, meta) for java_output, (_, meta) in zip(java_outputs, jobs))
+
+    for i, java_output in enumerate(java_outputs):
+        state, analysis, _ = analyzed[i]
+        metadata = jobs[i][1]
+        risk_category = metadata['risk_level']
+        audit = audits[i]
 
         # PHASE F: LOGGING DATA FOR PANDAS EDA
-        results_data.append({
+        # Digests of the expanded copybooks too, so editing one redoes its programs
+        manifest.record(state, {"name": analysis.name}, dependency_stamps(copybooks.dependencies[analysis.name]))
+        store.append({
             "name": analysis.name,
             "complexity_score": analysis.complexity_score,
             "logic_points": analysis.logic_points,
@@ -92,20 +161,27 @@ def run_ultimate_pipeline():
         })
 
         # Save Java Output
-        with open(os.path.join(output_dir, f"{analysis.name}.java"), "w") as f:
-            f.write(java_output)
+        with profiler.stage("write", analysis.name, len(java_output)):
+            with open(os.path.join(output_dir, f"{analysis.name}.java"), "w") as f:
+                f.write(java_output)
         
-        print(f"    - Analysis Complete. Risk: {risk_category} | Audit Score: {audit['validation_score']}")
+        print(f"    - {analysis.name}: Risk: {risk_category} | Audit Score: {audit['validation_score']}")
+
+        # The row is recorded: release this program's source, metadata and Java
+        analyzed[i] = jobs[i] = java_outputs[i] = audits[i] = None
+
+    store.close()
+    manifest.save()
+    copybooks.save_index(keep=kept)  # unchanged programs keep their saved include entries
 
     # 3. PANDAS DATA ANALYSIS & VISUALIZATION (Matplotlib/Seaborn)
     print("\n" + "="*40)
     print("PHASE 3: ANALYTICS & STAKEHOLDER REPORTING")
     print("="*40)
     
-    df = pd.DataFrame(results_data)
-    
     # Generate Visualizations (Communicating to Non-Technical Audiences)
-    analytics.generate_dashboard(results_data)
+    analytics.generate_dashboard(store)
+    stats = analytics.summarize(store)
 
     # 4. EXECUTIVE SUMMARY GENERATION (Stakeholder Communication)
     summary = f"""
@@ -114,26 +190,45 @@ def run_ultimate_pipeline():
 **Frameworks Used:** TensorFlow (DL), Scikit-Learn (ML), Pandas (EDA), OpenAI (GenAI)
 
 ## 1. Portfolio Overview
-- **Total Programs Analyzed:** {len(df)}
-- **Average Complexity Score:** {df['complexity_score'].mean():.2f}
-- **Conversion Success Rate:** {df['validation_score'].mean():.1f}%
+- **Total Programs Analyzed:** {stats['total']}
+- **Average Complexity Score:** {stats['avg_complexity']:.2f}
+- **Conversion Success Rate:** {stats['avg_validation']:.1f}%
 
 ## 2. Risk Distribution (Deep Learning Classification)
-{df['risk_level'].value_counts().to_string()}
+{stats['risk_counts'].rename_axis('risk_level').to_string()}
 
 ## 3. Technical Recommendations
-- High-risk programs identified: {len(df[df['risk_level'] == 'HIGH'])}.
-- Automated Refactoring Confidence is **{df['validation_score'].mean()}%**.
+- High-risk programs identified: {stats['high_risk']}.
+- Automated Refactoring Confidence is **{stats['avg_validation']}%**.
 - Deployment Target: Containerized Environment (Docker/OpenShift).
     """
     
     with open("docs/EXECUTIVE_SUMMARY.md", "w") as f:
         f.write(summary)
 
+    cache_stats = cache.stats()
+    print(f"\n[CACHE] {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+          f"({cache_stats['size_bytes'] / 1024:.1f} KB stored)")
+    llm_stats = converter.response_cache.stats()
+    print(f"[LLM CACHE] {llm_stats['hits']} hits, {llm_stats['near_hits']} near-duplicate, "
+          f"{llm_stats['deduplicated']} deduplicated, {llm_stats['misses']} misses "
+          f"(hit rate {llm_stats['hit_rate']:.0%})")
+    cache.close()
+    cb_stats = copybooks.stats()
+    print(f"[COPYBOOKS] {cb_stats['members_loaded']} members loaded once, "
+          f"{cb_stats['copybooks_indexed']} indexed -> {copybooks.index_path}")
+
+    print("\n[PROFILE] Stage timings for this run:")
+    for line in profiler.summary_lines():
+        print(f"    {line}")
+    report_path = profiler.write_report()
+
     print("\n[SUCCESS] Modernization Complete.")
     print(">> Dashboard: docs/modernization_dashboard.png")
     print(">> Summary: docs/EXECUTIVE_SUMMARY.md")
+    print(f">> Results: {store.path}")
+    print(f">> Profile: {report_path}")
     print("="*80)
 
 if __name__ == "__main__":
-    run_ultimate_pipeline()
\ No newline at end of file
+    run_ultimate_pipeline(incremental="--full" not in sys.argv)
\ No newline at end of file
@@ -1,6 +1,9 @@
 import tensorflow as tf
 from tensorflow.keras import layers
 import numpy as np
+from typing import List
+
+from src.risk_inference import RISK_LABELS, NumpyRiskModel
 
 class DeepRiskModel:
     def __init__(self):
@@ -14,6 +17,41 @@ class DeepRiskModel:
     def train(self, X, y):
         self.model.fit(X, y, epochs=5, verbose=0)
 
+    def train_mock_model(self, seed=42):
+        """
+        Mock Training: Demonstrate DL training loop logic on synthetic data.
+        Seeded so the exported demo model is reproducible.
+        """
+        rng = np.random.default_rng(seed)
+        tf.random.set_seed(seed)
+        X_train = rng.random((10, 5))  # 10 samples, 5 features
+        y_train = rng.integers(0, 3, 10)  # 3 risk classes
+        self.train(X_train, y_train)
+
     def predict(self, features):
         pred = self.model.predict(np.array(features), verbose=0)
-        return {0: "LOW", 1: "MEDIUM", 2: "HIGH"}[np.argmax(pred)]
\ No newline at end of file
+        return {0: "LOW", 1: "MEDIUM", 2: "HIGH"}[np.argmax(pred)]
+
+    def predict_batch(self, features) -> List[str]:
+        pred = self.model.predict(np.asarray(features, dtype=np.float32), batch_size=4096, verbose=0)
+        return [RISK_LABELS[i] for i in pred.argmax(axis=1)]
+
+    def to_numpy(self) -> NumpyRiskModel:
+        return NumpyRiskModel.from_keras(self.model)
+
+    def export(self, path: str = "models/risk_dnn.npz"):
+        """Saves the weights for NumpyRiskModel, which serves them without TensorFlow."""
+        self.to_numpy().save(path)
+
+
+if __name__ == "__main__":
+    # Explicit retrain: trains the seeded mock network and replaces the served weights
+    import sys
+    import yaml
+    with open("config.yaml", 'r') as f:
+        weights_path = yaml.safe_load(f).get('risk_model', {}).get('weights_path', 'models/risk_dnn.npz')
+    weights_path = sys.argv[1] if len(sys.argv) > 1 else weights_path
+    dl_model = DeepRiskModel()
+    dl_model.train_mock_model()
+    dl_model.export(weights_path)
+    print(f"Risk network weights exported to {weights_path}")
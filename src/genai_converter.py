@@ -1,23 +1,102 @@
+import asyncio
+import contextvars
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from typing import Dict, Any
+import re
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
-load_dotenv()
+from src.chunker import Chunk, java_class_name, split_program, stitch_java
+from src.llm_cache import LLMResponseCache
+from src.profiler import count
+from src.rate_limiter import TokenBucket, backoff_delay, is_retryable, retry_after
+
+MOCK_OUTPUT = "// [MOCK] OpenAI Key not found. Please add to .env to see real conversion."
+ERROR_PREFIX = "// Error during conversion:"
+SYSTEM_PROMPT = "You are an expert in COBOL and Java 17 refactoring."
+# A chunk prompt lists at most this many of the variables / SQL statements it uses
+CHUNK_META_LIMIT = 50
+NAME_RE = re.compile(r"[\w-]+")
+
+def run_sync(coro):
+    """asyncio.run, or on a helper thread when called from inside a running loop (e.g. FastAPI)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(1) as pool:
+        # Context copied so profiler counts still reach the caller's stage
+        return pool.submit(contextvars.copy_context().run, asyncio.run, coro).result()
 
 class GenAIConverter:
-    def __init__(self):
-        # Loads key from .env file
-        self.api_key = os.getenv("OPENAI_API_KEY")
-        self.client = OpenAI(api_key=self.api_key) if self.api_key else None
+    def __init__(self, config_path="config.yaml", api_key: Optional[str] = None,
+                 base_url: Optional[str] = None, response_cache: Optional[LLMResponseCache] = None,
+                 profiler=None):
+        with open(config_path, 'r') as f:
+            self.cfg = yaml.safe_load(f).get('llm', {})
+        # Normalized-prompt cache with in-flight deduplication, shared by every conversion path
+        self.response_cache = response_cache or LLMResponseCache(config_path)
+        self.model = self.cfg.get('model', "gpt-4o-mini")
+        self.temperature = self.cfg.get('temperature', 0.2)  # Lower temperature for more deterministic/stable code
+        self.base_url = base_url or self.cfg.get('base_url')
+        # When set, each program of an async batch is its own "convert" stage with its own tokens
+        self.profiler = profiler
+        # One RPM/TPM budget for the converter's lifetime, shared by every session
+        self.rpm = TokenBucket(self.cfg.get('requests_per_minute'))
+        self.tpm = TokenBucket(self.cfg.get('tokens_per_minute'))
 
-    def convert_to_java(self, cobol_code: str, meta: Dict[str, Any]) -> str:
-        """
-        Converts COBOL to Java 17 using parsed metadata to guide the AI.
-        """
-        if not self.client:
-            return "// [MOCK] OpenAI Key not found. Please add to .env to see real conversion."
+        # Loads key from .env file. The SDK imports are deferred so importing
+        # this module (API start-up, Spark workers) stays cheap.
+        from dotenv import load_dotenv
+        load_dotenv()
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.client = None
+        if self.api_key:
+            from openai import OpenAI
+            self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+            self.client.chat  # The SDK imports its resource modules lazily; pay for that here, not per first request
+
+    @staticmethod
+    def _content(response) -> str:
+        """The completion text; None (content filter, tool call) becomes an error placeholder."""
+        choice = response.choices[0]
+        if choice.message.content is None:
+            return f"{ERROR_PREFIX} no content (finish_reason={choice.finish_reason})"
+        return choice.message.content
+
+    @staticmethod
+    def is_failure(java_code: str) -> bool:
+        """True for mock/error placeholders that must not be cached or trusted."""
+        return java_code == MOCK_OUTPUT or java_code.startswith(ERROR_PREFIX)
 
+    @staticmethod
+    def _callee_section(meta: Dict[str, Any]) -> str:
+        """Java interfaces of already converted CALL targets, so calls use their real API."""
+        callees = meta.get('callee_interfaces')
+        if not callees:
+            return ""
+        lines = "\n".join(f"        {name}: {iface}" for name, iface in sorted(callees.items()))
+        return f"\n        --- CONVERTED CALLEES (inject and call these) ---\n{lines}\n"
+
+    @staticmethod
+    def _listing(used: List[str], total: int) -> str:
+        """used (capped at CHUNK_META_LIMIT) and how many of the program's total it is."""
+        more = f" +{len(used) - CHUNK_META_LIMIT} more" if len(used) > CHUNK_META_LIMIT else ""
+        return f"{used[:CHUNK_META_LIMIT]}{more} ({len(used)} of {total} in the program)"
+
+    def _chunk_metadata(self, chunk: Chunk, meta: Dict[str, Any]) -> Tuple[str, str]:
+        """Variables and SQL statements that appear in this chunk, instead of the whole program's."""
+        variables = meta.get('variables') or []
+        statements = meta.get('sql_statements') or []
+        names = set(NAME_RE.findall(chunk.text.upper()))  # one pass over the chunk
+        used_vars = [v for v in variables if v.upper() in names]
+        # Whitespace-free, since statement lines are joined with or without their line breaks
+        flat = "".join(chunk.text.split()) if statements else ""
+        used_sql = [" ".join(s.split()) for s in statements if "".join(s.split()) in flat]
+        return self._listing(used_vars, len(variables)), self._listing(used_sql, len(statements))
+
+    def build_prompt(self, cobol_code: str, meta: Dict[str, Any]) -> str:
         # Building a sophisticated Prompt for IBM-level quality
         prompt = f"""
         You are an IBM Senior Architect specializing in Mainframe Modernization.
@@ -30,7 +109,7 @@ class GenAIConverter:
         SQL Detected: {meta.get('sql_statements')}
         External Calls: {meta.get('calls')}
         Includes (Copybooks): {meta.get('copybooks')}
-
+        {self._callee_section(meta)}
         --- ARCHITECTURAL REQUIREMENTS ---
         1. Use Spring Boot 3.x patterns.
         2. SQL Handling: Convert 'EXEC SQL' blocks into Spring Data JPA Repository methods or clean JDBC Template code.
@@ -40,21 +119,251 @@ class GenAIConverter:
         6. Clean Code: Use meaningful camelCase names instead of HYPHENATED-COBOL-NAMES.
 
         --- COBOL SOURCE CODE ---
-        {cobol_code}
+{cobol_code}
 
         --- OUTPUT ---
         Generate only the Java class code. Include helpful comments explaining the logic mapping.
         """
+        return prompt
+
+    def build_chunk_prompt(self, chunk: Chunk, index: int, total: int, meta: Dict[str, Any]) -> str:
+        variables, sql = self._chunk_metadata(chunk, meta)
+        prompt = f"""
+        You are an IBM Senior Architect specializing in Mainframe Modernization.
+        You are converting part {index} of {total} of a large COBOL program into Java 17.
+        The other parts are converted separately and merged into one class named {java_class_name(meta.get('name'))}.
+
+        --- SHARED PROGRAM METADATA ---
+        Program Name: {meta.get('name')}
+        Complexity: {meta.get('complexity_score')} (Risk: {meta.get('risk_level', 'UNKNOWN')})
+        Variables Used In This Part: {variables}
+        SQL In This Part: {sql}
+        External Calls: {meta.get('calls')}
+        Includes (Copybooks): {meta.get('copybooks')}
+        {self._callee_section(meta)}
+        --- ARCHITECTURAL REQUIREMENTS ---
+        1. Use Spring Boot 3.x patterns.
+        2. SQL Handling: Convert 'EXEC SQL' blocks into Spring Data JPA Repository methods or clean JDBC Template code.
+        3. Dependency Injection: Convert 'CALL' statements into @Autowired Service calls.
+        4. Data Structures: Use Java Records or Lombok @Data classes for Working-Storage variables.
+        5. Method Names: Each COBOL paragraph or section becomes a method named in camelCase after it.
+        6. Clean Code: Use meaningful camelCase names instead of HYPHENATED-COBOL-NAMES.
+
+        --- COBOL SOURCE: {chunk.kind} {chunk.name} (from line {chunk.start_line}) ---
+        {chunk.text}
+
+        --- OUTPUT ---
+        Generate only the Java class members (fields, nested records, methods) for this part,
+        without a class declaration. Put any import statements first.
+        """
+        return prompt
+
+    def plan(self, cobol_code: str, meta: Dict[str, Any]) -> List[str]:
+        """Prompts for one program: the full prompt, or one per chunk for large sources."""
+        chunks = split_program(cobol_code, self.cfg.get('chunk_max_chars', 12000))
+        if len(chunks) == 1:
+            return [self.build_prompt(cobol_code, meta)]
+        return [self.build_chunk_prompt(c, i, len(chunks), meta) for i, c in enumerate(chunks, 1)]
+
+    @staticmethod
+    def _count_usage(response) -> int:
+        """Total tokens of a response (0 when not reported), counted for the profiler stage."""
+        usage = getattr(response, 'usage', None)
+        tokens = getattr(usage, 'total_tokens', None) or 0
+        if tokens:
+            count("llm_tokens", tokens)
+        return tokens
+
+    def _messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+
+    def convert_to_java(self, cobol_code: str, meta: Dict[str, Any]) -> str:
+        """
+        Converts COBOL to Java 17 using parsed metadata to guide the AI.
+        """
+        if not self.client:
+            return MOCK_OUTPUT
+        if len(cobol_code) > self.cfg.get('chunk_max_chars', 12000):
+            # Too large for one prompt: converted chunk by chunk in parallel
+            return self.convert_many([(cobol_code, meta)])[0]
+
+        prompt = self.build_prompt(cobol_code, meta)
+        return self.response_cache.complete(self.model, self.temperature, prompt,
+                                            lambda: self._request(prompt), self._cacheable, SYSTEM_PROMPT)
 
+    def _request(self, prompt: str) -> str:
         try:
             response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert in COBOL and Java 17 refactoring."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2 # Lower temperature for more deterministic/stable code
+                model=self.model,
+                messages=self._messages(prompt),
+                temperature=self.temperature
+            )
+            self._count_usage(response)
+            return self._content(response)
+        except Exception as e:
+            return f"{ERROR_PREFIX} {str(e)}"
+
+    def _cacheable(self, java_code: str) -> bool:
+        return not self.is_failure(java_code)
+
+    def stream_java(self, cobol_code: str, meta: Dict[str, Any]) -> Iterator[str]:
+        """
+        convert_to_java, yielded piece by piece as the model produces it.
+        Chunked programs are converted in parallel and yielded once stitched.
+        A failure before the first piece yields the usual error placeholder;
+        a failure mid-stream is raised, since part of the output is already out.
+        A completion already in the response cache is yielded at once.
+        """
+        if not self.client:
+            yield MOCK_OUTPUT
+            return
+        if len(cobol_code) > self.cfg.get('chunk_max_chars', 12000):
+            yield self.convert_many([(cobol_code, meta)])[0]
+            return
+
+        prompt = self.build_prompt(cobol_code, meta)
+        cache = self.response_cache
+        key, cached = cache.lookup(self.model, self.temperature, prompt, SYSTEM_PROMPT) if cache.enabled \
+            else (None, None)
+        if cached is not None:
+            yield cached
+            return
+
+        started, pieces = False, []
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(prompt),
+                temperature=self.temperature,
+                stream=True
             )
-            return response.choices[0].message.content
+            for event in stream:
+                self._count_usage(event)
+                piece = event.choices[0].delta.content if event.choices else None
+                if piece:
+                    started = True
+                    pieces.append(piece)
+                    yield piece
         except Exception as e:
-            return f"// Error during conversion: {str(e)}"
\ No newline at end of file
+            if started:
+                raise
+            yield f"{ERROR_PREFIX} {str(e)}"
+            return
+        if key is not None and pieces:
+            cache.store_result(key, self.model, self.temperature, prompt, "".join(pieces), SYSTEM_PROMPT)
+
+    def convert_many(self, jobs: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """
+        Converts a batch of (cobol_code, meta) pairs concurrently.
+        Results are returned in input order; failures become error placeholders.
+        """
+        return run_sync(self.convert_many_async(jobs))
+
+    async def convert_many_async(self, jobs: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        async with self.session() as session:
+            return await session.convert_many(jobs)
+
+    @asynccontextmanager
+    async def session(self, max_concurrency: Optional[int] = None):
+        """
+        One async client and concurrency limit for every conversion run
+        inside the block, e.g. by several pipeline workers. The rate limiters
+        are the converter's own, so consecutive batches (call-graph waves,
+        API jobs) draw on one budget instead of each starting with a full one.
+        """
+        cfg = self.cfg
+        semaphore = asyncio.Semaphore(max_concurrency or cfg.get('max_concurrency', 8))
+        rpm, tpm = self.rpm, self.tpm
+        if not self.api_key:
+            yield ConversionSession(self, None, semaphore, rpm, tpm)
+            return
+        from openai import AsyncOpenAI
+        # SDK retries are disabled so 429/5xx handling and pacing stay in one place
+        client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                             max_retries=0, timeout=cfg.get('timeout', 120))
+        try:
+            yield ConversionSession(self, client, semaphore, rpm, tpm)
+        finally:
+            await client.close()
+
+    async def _complete(self, client, semaphore, rpm, tpm, prompt: str) -> str:
+        return await self.response_cache.complete_async(
+            self.model, self.temperature, prompt,
+            lambda: self._request_async(client, semaphore, rpm, tpm, prompt), self._cacheable, SYSTEM_PROMPT)
+
+    async def _request_async(self, client, semaphore, rpm, tpm, prompt: str) -> str:
+        # ~4 characters per token for the prompt, plus the expected completion size
+        estimate = len(prompt) // 4 + self.cfg.get('completion_token_estimate', 1024)
+        max_retries = self.cfg.get('max_retries', 5)
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                await rpm.acquire()
+                await tpm.acquire(estimate)
+                try:
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=self._messages(prompt),
+                        temperature=self.temperature
+                    )
+                except Exception as e:
+                    if attempt == max_retries or not is_retryable(e):
+                        return f"{ERROR_PREFIX} {str(e)}"
+                    backoff_max = self.cfg.get('backoff_max', 30.0)
+                    # A server hint is honoured up to backoff_max, so Retry-After: 3600 cannot park a worker
+                    delay = min(retry_after(e) or backoff_delay(attempt, self.cfg.get('backoff_base', 0.5),
+                                                                backoff_max), backoff_max)
+                    await asyncio.sleep(delay)
+                    continue
+                tokens = self._count_usage(response)
+                if tokens:
+                    tpm.adjust(tokens - estimate)
+                return self._content(response)
+
+class ConversionSession:
+    """Conversions sharing one client and the limits of GenAIConverter.session()."""
+    def __init__(self, converter: GenAIConverter, client, semaphore, rpm, tpm):
+        self.converter = converter
+        self.client = client
+        self.limits = (semaphore, rpm, tpm)
+
+    def _complete(self, prompt: str):
+        return self.converter._complete(self.client, *self.limits, prompt)
+
+    async def convert(self, cobol_code: str, meta: Dict[str, Any]) -> str:
+        return (await self.convert_many([(cobol_code, meta)]))[0]
+
+    async def convert_many(self, jobs: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        # One task per program; the prompts of all of them (several for a
+        # chunked program) share the same concurrency and rate limits.
+        return list(await asyncio.gather(*(self._profiled(code, meta) for code, meta in jobs)))
+
+    async def _profiled(self, cobol_code: str, meta: Dict[str, Any]) -> str:
+        profiler = self.converter.profiler
+        if profiler is None:
+            return await self._convert(cobol_code, meta)
+        # The stage lives in this task's context, so count() charges tokens to this program alone
+        with profiler.stage("convert", meta.get('name'), len(cobol_code)):
+            return await self._convert(cobol_code, meta)
+
+    async def _convert(self, cobol_code: str, meta: Dict[str, Any]) -> str:
+        converter = self.converter
+        if self.client is None:
+            return MOCK_OUTPUT
+        prompts = converter.plan(cobol_code, meta)
+        outputs = await asyncio.gather(*(self._complete(prompt) for prompt in prompts))
+        # A chunk that still failed is retried on its own; finished chunks are kept
+        for _ in range(converter.cfg.get('chunk_retries', 2)):
+            failed = [i for i, out in enumerate(outputs) if converter.is_failure(out)]
+            if not failed:
+                break
+            retried = await asyncio.gather(*(self._complete(prompts[i]) for i in failed))
+            for i, out in zip(failed, retried):
+                outputs[i] = out
+
+        failure = next((p for p in outputs if converter.is_failure(p)), None)
+        if len(outputs) == 1 or failure:
+            return failure or outputs[0]
+        return stitch_java(meta.get('name'), outputs)
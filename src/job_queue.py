@@ -0,0 +1,88 @@
+import asyncio
+import time
+import uuid
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+class QueueFullError(Exception):
+    pass
+
+@dataclass
+class Job:
+    id: str
+    files: List[str]
+    status: str = "queued"  # queued -> running -> done | failed
+    results: Optional[List[Dict[str, Any]]] = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "status": self.status, "files": self.files,
+                "results": self.results, "error": self.error}
+
+class JobQueue:
+    """
+    Runs blocking pipeline work for the API off the event loop.
+    A thread pool (api.max_workers) bounds how many files are processed at
+    once; api.max_queue_depth bounds how many jobs may be queued or running,
+    and finished jobs are kept for api.job_ttl_seconds for polling.
+    """
+    def __init__(self, config_path="config.yaml"):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('api', {})
+        self.max_workers = cfg.get('max_workers', 4)
+        self.max_queue_depth = cfg.get('max_queue_depth', 100)
+        self.max_files_per_job = cfg.get('max_files_per_job', 50)
+        self.ttl_seconds = cfg.get('job_ttl_seconds', 3600)
+        self.max_upload_bytes = cfg.get('max_upload_bytes', 16 * 1024 * 1024)
+        self.jobs: Dict[str, Job] = {}
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="modernize")
+        self._tasks = set()
+
+    async def run(self, fn: Callable, *args):
+        """Runs fn(*args) on the worker pool and awaits the result."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    @property
+    def depth(self) -> int:
+        return sum(job.status in ("queued", "running") for job in self.jobs.values())
+
+    def submit(self, files: List[str], fn: Callable[..., List[Dict[str, Any]]], *args) -> Job:
+        """Registers a job and schedules fn(*args) for it; raises QueueFullError when at capacity."""
+        self._expire()
+        if self.depth >= self.max_queue_depth:
+            raise QueueFullError(f"{self.depth} jobs pending (max_queue_depth={self.max_queue_depth})")
+        job = Job(id=uuid.uuid4().hex, files=files)
+        self.jobs[job.id] = job
+        task = asyncio.create_task(self._execute(job, fn, *args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _execute(self, job: Job, fn: Callable, *args):
+        def work():
+            job.status = "running"  # Picked up by a worker thread
+            return fn(*args)
+        try:
+            job.results = await self.run(work)
+            job.status = "done"
+        except Exception as e:
+            job.status, job.error = "failed", str(e)
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl_seconds
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
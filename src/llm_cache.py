@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import yaml
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Fixed-format layout: columns 1-6 sequence area, column 7 indicator
+SEQUENCE_END = 6
+FIXED_INDICATORS = " -*/Dd"
+COMMENT_INDICATORS = "*/"
+# Alphanumeric literals, possibly left open at the end of a line (continued)
+LITERAL_RE = re.compile(r"'[^']*(?:'|$)|\"[^\"]*(?:\"|$)")
+WHITESPACE_RE = re.compile(r"\s+")
+# Candidate data and program names: hyphenated upper-case words, plus the program name
+IDENTIFIER_RE = re.compile(r"(?<![\w-])[A-Z][A-Z0-9]*(?:-[A-Z0-9]+)+(?![\w-])")
+PROGRAM_NAME_RE = re.compile(r"(?:PROGRAM-ID\.|Program Name:)\s+([\w-]+)")
+# Hyphenated reserved words: structure, never renamed by near-duplicate patching
+RESERVED = {
+    "PROGRAM-ID", "WORKING-STORAGE", "LOCAL-STORAGE", "FILE-CONTROL", "INPUT-OUTPUT", "I-O",
+    "I-O-CONTROL", "SOURCE-COMPUTER", "OBJECT-COMPUTER", "SPECIAL-NAMES", "END-IF", "END-EXEC",
+    "END-PERFORM", "END-EVALUATE", "END-READ", "END-WRITE", "END-CALL", "END-COMPUTE", "END-SEARCH",
+    "END-STRING", "END-ADD", "END-SUBTRACT", "END-MULTIPLY", "END-DIVIDE", "END-START", "END-RETURN",
+    "END-REWRITE", "END-DELETE", "END-ACCEPT", "END-DISPLAY", "END-UNSTRING", "COMP-1", "COMP-2",
+    "COMP-3", "COMP-4", "COMP-5", "NOT-FOUND", "DATE-WRITTEN", "DATE-COMPILED", "LINKAGE-SECTION",
+    "RECORD-KEY", "ACCESS-MODE", "FILE-STATUS", "HIGH-VALUES", "LOW-VALUES", "HIGH-VALUE", "LOW-VALUE",
+    "GO-TO", "SPRING-BOOT", "HYPHENATED-COBOL-NAMES", "TRY-CATCH", "PRODUCTION-GRADE",
+}
+
+def _normalize_line(line: str) -> str:
+    """Whitespace collapsed and a *> comment cut, outside literals only."""
+    out, pos = [], 0
+    for m in LITERAL_RE.finditer(line):
+        code = line[pos:m.start()]
+        if "*>" in code:
+            return "".join(out) + WHITESPACE_RE.sub(" ", code[:code.index("*>")])
+        out += [WHITESPACE_RE.sub(" ", code), m.group(0)]
+        pos = m.end()
+    code = line[pos:]
+    return "".join(out) + WHITESPACE_RE.sub(" ", code.split("*>", 1)[0])
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Prompt with sequence numbers, comment lines, inline comments and
+    whitespace differences removed. Only lines laid out in fixed format
+    (sequence area blank or numeric, indicator in column 7) lose columns
+    1-6 and count as comments by their indicator, so cleaned code starting
+    in column 1 (a '* 1.05' continuation) is kept. Quoted literals are
+    never changed.
+    """
+    lines = []
+    for line in prompt.splitlines():
+        sequence = line[:SEQUENCE_END]
+        if len(line) > SEQUENCE_END and (sequence.isspace() or sequence.isdecimal()) \
+                and line[SEQUENCE_END] in FIXED_INDICATORS:
+            if line[SEQUENCE_END] in COMMENT_INDICATORS:
+                continue
+            line = line[SEQUENCE_END:]
+        line = _normalize_line(line).strip()
+        if line:
+            lines.append(line)
+    return " ".join(lines)
+
+def template_shape(normalized: str) -> Tuple[str, List[str]]:
+    """
+    The prompt with every identifier replaced by a numbered placeholder (by
+    first occurrence) and the identifiers in that order. Two prompts with the
+    same shape differ only by a consistent renaming.
+    """
+    names: Dict[str, int] = {}
+    program = PROGRAM_NAME_RE.search(normalized)
+    if program:
+        names[program.group(1)] = 0
+    pattern = IDENTIFIER_RE if not program else re.compile(
+        rf"{IDENTIFIER_RE.pattern}|(?<![\w-]){re.escape(program.group(1))}(?![\w-])")
+
+    def placeholder(m):
+        name = m.group(0)
+        if name in RESERVED:
+            return name
+        index = names.setdefault(name, len(names))
+        return f"\x00{index}\x00"
+    return pattern.sub(placeholder, normalized), list(names)
+
+def java_forms(cobol_name: str) -> List[str]:
+    """Spellings a converted program may use for a COBOL name: camel, Pascal, UPPER_SNAKE, flat."""
+    forms = [cobol_name]
+    for words in (cobol_name.lower().split("-"), cobol_name.lower().split("-")[1:]):
+        if not words or (len(words) == 1 and len(words[0]) < 3):
+            continue  # the WS- prefix stripped off a one-word name leaves nothing distinctive
+        forms += [words[0] + "".join(w.capitalize() for w in words[1:]),
+                  "".join(w.capitalize() for w in words),
+                  "_".join(w.upper() for w in words),
+                  "".join(words)]
+    return list(dict.fromkeys(forms))
+
+def patch_identifiers(java: str, mapping: Dict[str, str]) -> str:
+    """Renames every Java spelling of each COBOL name in mapping, in one pass."""
+    replacements: Dict[str, Optional[str]] = {}
+    for old, new in mapping.items():
+        for form, target in zip(java_forms(old), java_forms(new)):
+            if replacements.get(form, target) != target:
+                replacements[form] = None  # two names share a spelling: ambiguous, leave it
+            else:
+                replacements.setdefault(form, target)
+    replacements = {k: v for k, v in replacements.items() if v is not None and k != v}
+    if not replacements:
+        return java
+    # Longest first; a camel hump may start right after a lower-case letter (getCustId)
+    alternation = "|".join(re.escape(f) for f in sorted(replacements, key=len, reverse=True))
+    pattern = re.compile(rf"(?<![A-Z0-9_$-])(?:{alternation})(?![a-z0-9_$-])")
+    return pattern.sub(lambda m: replacements[m.group(0)], java)
+
+class LLMResponseCache:
+    """
+    Prompt-level cache for LLM completions. Keys hash the model, temperature,
+    system prompt and the normalized prompt, so programs that differ only in comments,
+    sequence numbers or layout share one completion. Concurrent identical
+    requests (in any thread or event loop) wait for the single call in
+    flight. With near_duplicates on, a prompt that is a consistent renaming
+    of a cached one reuses that completion with the identifiers patched.
+    Entries live in memory (LRU) and, when a store (AnalysisCache) is set,
+    persistently under the 'llm' stage.
+    """
+    def __init__(self, config_path="config.yaml", store=None, near_duplicates: Optional[bool] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('llm_cache', {})
+        self.enabled = cfg.get('enabled', True)
+        self.max_entries = cfg.get('max_entries', 10000)
+        self.near_duplicates = cfg.get('near_duplicates', False) if near_duplicates is None else near_duplicates
+        self.store = store
+        self.counts = Counter()
+        self._memory: "OrderedDict[str, object]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        return hashlib.sha256(json.dumps(parts).encode("utf-8", "surrogatepass")).hexdigest()
+
+    def _get(self, key: str):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.store is not None:
+            value = self.store.get("llm", key)
+            if value is not None:
+                self._remember(key, value)
+            return value
+        return None
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _put(self, key: str, value):
+        self._remember(key, value)
+        if self.store is not None:
+            self.store.put("llm", key, value)
+
+    def lookup(self, model: str, temperature: float, prompt: str, system: str = "") -> Tuple[str, Optional[str]]:
+        """(key, cached completion or None); near-duplicate reuse included when enabled."""
+        normalized = normalize_prompt(prompt)
+        key = self._hash("exact", model, temperature, system, normalized)
+        found = self._get(key)
+        if found is not None:
+            self.counts['hits'] += 1
+            return key, found
+        if self.near_duplicates:
+            shape, names = template_shape(normalized)
+            template = self._get(self._hash("shape", model, temperature, system, shape))
+            if template is not None and len(template["identifiers"]) == len(names):
+                self.counts['near_hits'] += 1
+                java = patch_identifiers(template["java"], dict(zip(template["identifiers"], names)))
+                self._put(key, java)
+                return key, java
+        self.counts['misses'] += 1
+        return key, None
+
+    def store_result(self, key: str, model: str, temperature: float, prompt: str, completion: str,
+                     system: str = ""):
+        self._put(key, completion)
+        if self.near_duplicates:
+            shape, names = template_shape(normalize_prompt(prompt))
+            self._put(self._hash("shape", model, temperature, system, shape),
+                      {"java": completion, "identifiers": names})
+
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.counts['deduplicated'] += 1
+                return future, False
+            future = self._inflight[key] = Future()
+            return future, True
+
+    def _settle(self, key: str, future: Future, result=None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def complete(self, model: str, temperature: float, prompt: str, compute: Callable[[], str],
+                 cacheable: Callable[[str], bool] = lambda _: True, system: str = "") -> str:
+        """Cached completion, or compute() once for all concurrent callers of the same prompt."""
+        if not self.enabled:
+            return compute()
+        key, found = self.lookup(model, temperature, prompt, system)
+        if found is not None:
+            return found
+        future, owner = self._claim(key)
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        if cacheable(result):
+            self.store_result(key, model, temperature, prompt, result, system)
+        self._settle(key, future, result)
+        return result
+
+    async def complete_async(self, model: str, temperature: float, prompt: str,
+                             compute: Callable[[], Awaitable[str]],
+                             cacheable: Callable[[str], bool] = lambda _: True, system: str = "") -> str:
+        """Async complete(): waiters await the call in flight, whichever loop or thread runs it."""
+        if not self.enabled:
+            return await compute()
+        key, found = self.lookup(model, temperature, prompt, system)
+        if found is not None:
+            return found
+        future, owner = self._claim(key)
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await compute()
+        except BaseException as e:
+            self._settle(key, future, error=e)
+            raise
+        if cacheable(result):
+            self.store_result(key, model, temperature, prompt, result, system)
+        self._settle(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        requests = self.counts['hits'] + self.counts['near_hits'] + self.counts['misses']
+        served = self.counts['hits'] + self.counts['near_hits'] + self.counts['deduplicated']
+        return {
+            "hits": self.counts['hits'],
+            "near_hits": self.counts['near_hits'],
+            "misses": self.counts['misses'],
+            "deduplicated": self.counts['deduplicated'],
+            "hit_rate": round(served / requests, 4) if requests else 0.0,
+            "entries": len(self._memory),
+        }
@@ -0,0 +1,141 @@
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import yaml
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from src.change_manifest import file_digest
+
+# sha256 -> loaded object; an artifact is deserialized once per process
+_LOADED: Dict[str, Any] = {}
+_LOAD_LOCK = threading.Lock()
+
+class ChecksumError(Exception):
+    pass
+
+class ModelRegistry:
+    """
+    Versioned model artifacts under one directory. manifest.json records,
+    per model name, every version's file, format and SHA-256 plus the
+    version currently served. Loads verify the checksum and are memoized
+    per process by checksum, so API workers and batch jobs deserialize an
+    artifact once however many engines ask for it. Writers serialize on an
+    flock of manifest.lock, so concurrent processes never lose a version.
+    """
+    def __init__(self, config_path="config.yaml", path: Optional[str] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('model_registry', {})
+        self.path = path or cfg.get('path', 'models/registry')
+        self.manifest_path = os.path.join(self.path, "manifest.json")
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._lock_file = None
+
+    @contextmanager
+    def lock(self):
+        """
+        Exclusive lock on the registry across processes (flock) and threads.
+        Reentrant, so a caller can check-then-publish inside one critical
+        section.
+        """
+        with self._lock:
+            if self._lock_depth == 0:
+                os.makedirs(self.path, exist_ok=True)
+                self._lock_file = open(os.path.join(self.path, "manifest.lock"), 'a')
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {"models": {}}
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _tmp_path(self, path: str) -> str:
+        """A fresh temporary file next to path, so concurrent writers never share one."""
+        fd, tmp = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix=".tmp", dir=self.path)
+        os.close(fd)
+        return tmp
+
+    def _write_manifest(self, manifest: dict):
+        """Atomically replaces manifest.json; call under lock()."""
+        tmp = self._tmp_path(self.manifest_path)
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.manifest_path)
+
+    def versions(self, name: str) -> List[str]:
+        return list(self._manifest()["models"].get(name, {}).get("versions", {}))
+
+    def current(self, name: str) -> Optional[str]:
+        return self._manifest()["models"].get(name, {}).get("current")
+
+    def entry(self, name: str, version: Optional[str] = None) -> Optional[dict]:
+        """Manifest entry (file, format, sha256, created, metadata) of a version, default current."""
+        model = self._manifest()["models"].get(name, {})
+        version = version or model.get("current")
+        entry = model.get("versions", {}).get(version)
+        return dict(entry, version=version) if entry else None
+
+    def publish(self, name: str, obj, version: Optional[str] = None, metadata: Optional[dict] = None,
+                make_current: bool = True) -> str:
+        """Dumps obj with joblib as a new version of name and records its checksum."""
+        import joblib
+        with self.lock():
+            manifest = self._manifest()  # re-read: another process may have published meanwhile
+            model = manifest["models"].setdefault(name, {"current": None, "versions": {}})
+            version = version or f"v{len(model['versions']) + 1}"
+            if version in model["versions"]:
+                raise ValueError(f"{name} {version} is already registered; artifacts are immutable")
+            filename = f"{name}-{version}.joblib"
+            path = os.path.join(self.path, filename)
+            tmp = self._tmp_path(path)
+            joblib.dump(obj, tmp)
+            os.replace(tmp, path)
+            model["versions"][version] = {"file": filename, "format": "joblib", "sha256": file_digest(path),
+                                          "created": time.time(), "metadata": metadata or {}}
+            if make_current:
+                model["current"] = version
+            self._write_manifest(manifest)
+        return version
+
+    def promote(self, name: str, version: str):
+        """Makes an already registered version the one load() serves by default."""
+        with self.lock():
+            manifest = self._manifest()
+            if version not in manifest["models"].get(name, {}).get("versions", {}):
+                raise KeyError(f"{name} {version} is not registered")
+            manifest["models"][name]["current"] = version
+            self._write_manifest(manifest)
+
+    def load(self, name: str, version: Optional[str] = None):
+        """The artifact of a version (default current), checksum-verified and loaded once per process."""
+        entry = self.entry(name, version)
+        if entry is None:
+            raise KeyError(f"{name} {version or '(current)'} is not registered in {self.path}")
+        if entry["sha256"] in _LOADED:
+            return _LOADED[entry["sha256"]]
+        with _LOAD_LOCK:
+            if entry["sha256"] not in _LOADED:
+                path = os.path.join(self.path, entry["file"])
+                digest = file_digest(path)
+                if digest != entry["sha256"]:
+                    raise ChecksumError(f"{path}: sha256 {digest[:12]} does not match the manifest "
+                                        f"({entry['sha256'][:12]})")
+                if entry["format"] != "joblib":
+                    raise ValueError(f"{path}: unsupported artifact format {entry['format']!r}")
+                import joblib
+                _LOADED[entry["sha256"]] = joblib.load(path)
+            return _LOADED[entry["sha256"]]
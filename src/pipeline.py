@@ -0,0 +1,348 @@
+"""
+Parallel, resumable modernization pipeline for a folder of COBOL programs.
+
+Stages run concurrently as producers and consumers:
+  CPU workers (processes)  read, clean, parse with COPY expansion, score risk
+  LLM workers (async)      convert to Java through one shared client and rate limits
+  writer                   validates, writes the Java files and checkpoints in batches
+Bounded queues between the stages give backpressure: when conversion falls
+behind, no more files are parsed; when writes fall behind, conversion waits.
+Every completed program is checkpointed, so a crashed or interrupted run
+continues with --resume and failed conversions are retried.
+
+Usage: python -m src.pipeline [inputs ...] [-o DIR] [--workers N]
+                              [--llm-concurrency N] [--resume]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import yaml
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from src.batch_engine import analyze_source, clean_file, copybook_stamps, init_worker, worker_risk_model
+from src.change_manifest import dependencies_changed, dependency_stamps, file_digest
+from src.profiler import Profiler, StageRecord
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+@dataclass
+class WorkItem:
+    path: str
+    sha256: str = ""
+    mtime: float = 0.0
+    size: int = 0
+    name: str = ""
+    code: str = ""  # Cleaned source, dropped once converted
+    meta: dict = field(default_factory=dict)
+    deps: dict = field(default_factory=dict)  # dependency_stamps of the expanded copybooks
+    timings: List[tuple] = field(default_factory=list)  # (stage, wall, cpu, bytes) measured in the worker
+    java: Optional[str] = None
+    error: Optional[str] = None
+
+def prepare_file(path: str) -> WorkItem:
+    """
+    CPU stage for one file, on the worker state of src.batch_engine; an
+    exception becomes item.error instead of ending the run.
+    """
+    item = WorkItem(path)
+    try:
+        stat = os.stat(path)
+        item.mtime, item.size, item.sha256 = stat.st_mtime, stat.st_size, file_digest(path)
+
+        wall, cpu = time.perf_counter(), time.thread_time()
+        item.code = clean_file(path)
+        item.timings.append(("clean", time.perf_counter() - wall, time.thread_time() - cpu, item.size))
+
+        wall, cpu = time.perf_counter(), time.thread_time()
+        analysis = analyze_source(item.code)
+        item.timings.append(("parse", time.perf_counter() - wall, time.thread_time() - cpu, len(item.code)))
+        item.deps = dependency_stamps(copybook_stamps(analysis.name))
+
+        wall, cpu = time.perf_counter(), time.thread_time()
+        features = [[analysis.code_lines, len(analysis.variables), len(analysis.sql_statements),
+                     len(analysis.calls), analysis.logic_points]]
+        item.meta = {**vars(analysis), 'risk_level': worker_risk_model().predict(features)}
+        item.timings.append(("risk", time.perf_counter() - wall, time.thread_time() - cpu, 0))
+        item.name = analysis.name
+    except Exception as e:
+        item.error = f"{type(e).__name__}: {e}"
+    return item
+
+class Checkpoint:
+    """
+    Append-only JSON-lines log of completed programs: path, mtime, size,
+    content hash, copybook digests, Java file and result row. Each write batch is fsynced,
+    so after a crash at most the batch in progress is redone; a torn last
+    line is ignored.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.done: Dict[str, dict] = {}
+        self._digests: Dict[str, str] = {}  # copybook hashes, shared across is_done calls
+
+    def load(self) -> "Checkpoint":
+        if os.path.exists(self.path):
+            with open(self.path, 'rb+') as f:
+                data = f.read()
+                if data and not data.endswith(b"\n"):
+                    f.truncate(data.rfind(b"\n") + 1)  # Torn write: later appends start on a fresh line
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.done[entry["path"]] = entry
+        return self
+
+    def reset(self):
+        self.done.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def is_done(self, path: str) -> bool:
+        """
+        Completed and unchanged since, copybooks included: mtime+size first,
+        the content hash when they differ.
+        """
+        entry = self.done.get(path)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        if (stat.st_mtime, stat.st_size) != (entry["mtime"], entry["size"]) and \
+                file_digest(path) != entry["sha256"]:
+            return False
+        return not dependencies_changed(entry.get("deps", {}), self._digests)
+
+    def append(self, entries: List[dict]):
+        if not entries:
+            return
+        with open(self.path, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+                self.done[entry["path"]] = entry
+            f.flush()
+            os.fsync(f.fileno())
+
+    def results(self) -> List[dict]:
+        return [entry["result"] for entry in self.done.values()]
+
+class Pipeline:
+    """
+    Producer/consumer modernization run over a list of files: CPU workers
+    (process pool) for cleaning, parsing and risk, llm_concurrency async
+    conversion workers sharing one GenAIConverter session, and a writer
+    that validates, writes and checkpoints write_batch programs at a time.
+    Stages are joined by queues of queue_size items.
+    """
+    def __init__(self, config_path="config.yaml", output_dir: Optional[str] = None,
+                 workers: Optional[int] = None, llm_concurrency: Optional[int] = None,
+                 queue_size: Optional[int] = None, write_batch: Optional[int] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('pipeline', {})
+        self.config_path = config_path
+        self.output_dir = output_dir or cfg.get('output_dir', 'data/expected_output')
+        self.workers = workers or cfg.get('workers') or os.cpu_count() or 1
+        self.llm_concurrency = llm_concurrency or cfg.get('llm_concurrency', 8)
+        self.queue_size = queue_size or cfg.get('queue_size', 64)
+        self.write_batch = write_batch or cfg.get('write_batch', 16)
+        self.checkpoint = Checkpoint(os.path.join(self.output_dir, CHECKPOINT_NAME))
+        self.profiler = Profiler(config_path)
+        self.counts = Counter()
+        self.validator = None
+
+    @staticmethod
+    def list_files(inputs: Iterable[str], suffix: str = ".cbl") -> List[str]:
+        """Files given directly plus the suffix-matching files of every folder given."""
+        paths = []
+        for item in inputs:
+            if os.path.isdir(item):
+                paths += sorted(os.path.join(item, f) for f in os.listdir(item) if f.endswith(suffix))
+            else:
+                paths.append(item)
+        return [os.path.abspath(p) for p in paths]
+
+    def run(self, paths: List[str], resume: bool = False) -> dict:
+        return asyncio.run(self.run_async(paths, resume))
+
+    async def run_async(self, paths: List[str], resume: bool = False) -> dict:
+        from src.analysis_cache import AnalysisCache
+        from src.genai_converter import GenAIConverter
+        from src.llm_cache import LLMResponseCache
+        from src.risk_inference import load_risk_model
+        from src.validator import ModernizationValidator
+
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        paths = [os.path.abspath(p) for p in paths]
+        if resume:
+            self.checkpoint.load()
+        else:
+            self.checkpoint.reset()
+        todo = [p for p in paths if not self.checkpoint.is_done(p)]
+        self.counts = Counter(total=len(paths), skipped=len(paths) - len(todo))
+
+        cache = AnalysisCache(self.config_path)
+        converter = GenAIConverter(self.config_path,
+                                   response_cache=LLMResponseCache(self.config_path, store=cache))
+        self.validator = ModernizationValidator()
+        # Resolved once here (registry lookup, checksum, seeding) and shipped to every worker
+        risk_model = load_risk_model(self.config_path)
+        converts = asyncio.Queue(self.queue_size)
+        writes = asyncio.Queue(self.queue_size)
+        loop = asyncio.get_running_loop()
+        try:
+            with ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                     initargs=(self.config_path, False, risk_model)) as pool:
+                async with converter.session(self.llm_concurrency) as session:
+                    tasks = [asyncio.ensure_future(self._read(loop, pool, todo, converts, writes)),
+                             asyncio.ensure_future(self._write(loop, writes))]
+                    tasks += [asyncio.ensure_future(self._convert(session, converter, converts, writes))
+                              for _ in range(self.llm_concurrency)]
+                    try:
+                        await asyncio.gather(*tasks)
+                    except BaseException:
+                        for task in tasks:
+                            task.cancel()
+                        raise
+        finally:
+            cache.close()
+
+        self.counts['elapsed'] = round(time.perf_counter() - start, 3)
+        return dict(self.counts)
+
+    async def _read(self, loop, pool, paths: List[str], converts: asyncio.Queue, writes: asyncio.Queue):
+        """Keeps about two files per CPU worker in flight; a full convert queue stops submissions."""
+        pending = set()
+
+        async def forward(done):
+            for future in done:
+                item = future.result()
+                for stage, wall, cpu, nbytes in item.timings:
+                    self.profiler.record(StageRecord(stage, [item.name or item.path], wall, cpu, nbytes))
+                await (writes if item.error else converts).put(item)
+
+        for path in paths:
+            if len(pending) >= self.workers * 2:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                await forward(done)
+            pending.add(loop.run_in_executor(pool, prepare_file, path))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            await forward(done)
+        for _ in range(self.llm_concurrency):
+            await converts.put(None)
+
+    async def _convert(self, session, converter, converts: asyncio.Queue, writes: asyncio.Queue):
+        while (item := await converts.get()) is not None:
+            with self.profiler.stage("convert", item.name, len(item.code)):
+                try:
+                    item.java = await session.convert(item.code, item.meta)
+                except Exception as e:
+                    item.error = f"{type(e).__name__}: {e}"
+            if item.java is not None and converter.is_failure(item.java):
+                item.error = item.java
+            item.code = ""
+            await writes.put(item)
+        await writes.put(None)
+
+    async def _write(self, loop, writes: asyncio.Queue):
+        """Flushes at write_batch items, or earlier whenever the queue runs dry."""
+        open_workers, batch = self.llm_concurrency, []
+        while open_workers:
+            item = await writes.get()
+            if item is None:
+                open_workers -= 1
+            else:
+                batch.append(item)
+            if batch and (len(batch) >= self.write_batch or not open_workers or writes.empty()):
+                await loop.run_in_executor(None, self._write_batch, batch)
+                batch = []
+
+    def _write_batch(self, batch: List[WorkItem]):
+        for item in batch:
+            if item.error:
+                self.counts['failed'] += 1
+                print(f"[PIPELINE] {os.path.basename(item.path)} failed: {item.error}", file=sys.stderr)
+        done = [item for item in batch if not item.error]
+        if not done:
+            return
+        names = [item.name for item in done]
+        with self.profiler.stage("validate", names, sum(len(item.java) for item in done)):
+            audits = self.validator.validate_many((item.java, item.meta) for item in done)
+        entries = []
+        with self.profiler.stage("write", names, sum(len(item.java) for item in done)):
+            for item, audit in zip(done, audits):
+                java_path = os.path.join(self.output_dir, f"{item.name}.java")
+                with open(java_path, 'w') as f:
+                    f.write(item.java)
+                entries.append({
+                    "path": item.path, "sha256": item.sha256, "mtime": item.mtime, "size": item.size,
+                    "deps": item.deps, "java": java_path,
+                    "result": {
+                        "name": item.name,
+                        "complexity_score": item.meta['complexity_score'],
+                        "logic_points": item.meta['logic_points'],
+                        "risk_level": item.meta['risk_level'],
+                        "sql_count": len(item.meta['sql_statements']),
+                        "calls": item.meta['calls'],
+                        "validation_score": audit['validation_score'],
+                        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                    },
+                })
+            self.checkpoint.append(entries)
+        self.counts['converted'] += len(entries)
+        print(f"[PIPELINE] {self.counts['converted'] + self.counts['skipped']}/{self.counts['total']} "
+              f"programs done", file=sys.stderr, flush=True)
+
+    def write_results(self, path: Optional[str] = None) -> str:
+        """Columnar results of every checkpointed program, this run's and resumed ones."""
+        from src.result_store import ResultStore
+        store = ResultStore(self.config_path, path=path or os.path.join(self.output_dir, "results.parquet"))
+        store.extend(self.checkpoint.results())
+        store.close()
+        return store.path
+
+def main(argv=None) -> int:
+    cli = argparse.ArgumentParser(description="Modernize COBOL programs with parallel, resumable stages.")
+    cli.add_argument("inputs", nargs="*", default=["data/sample_cobol"], help="Folders or source files")
+    cli.add_argument("-o", "--output", help="Folder for Java files, checkpoint and results")
+    cli.add_argument("--workers", type=int, help="CPU worker processes (clean, parse, risk)")
+    cli.add_argument("--llm-concurrency", type=int, help="Concurrent LLM conversions")
+    cli.add_argument("--queue-size", type=int, help="Capacity of each queue between stages")
+    cli.add_argument("--write-batch", type=int, help="Programs validated, written and checkpointed together")
+    cli.add_argument("--resume", action="store_true", help="Skip programs completed by an earlier run")
+    cli.add_argument("--suffix", default=".cbl")
+    cli.add_argument("--config", default="config.yaml")
+    args = cli.parse_args(argv)
+
+    pipeline = Pipeline(args.config, output_dir=args.output, workers=args.workers,
+                        llm_concurrency=args.llm_concurrency, queue_size=args.queue_size,
+                        write_batch=args.write_batch)
+    counts = pipeline.run(pipeline.list_files(args.inputs, args.suffix), resume=args.resume)
+    results_path = pipeline.write_results()
+    print(f"[PIPELINE] {counts.get('converted', 0)} converted, {counts.get('skipped', 0)} resumed, "
+          f"{counts.get('failed', 0)} failed of {counts.get('total', 0)} in {counts['elapsed']:.2f}s "
+          f"(workers={pipeline.workers}, llm_concurrency={pipeline.llm_concurrency})")
+    for line in pipeline.profiler.summary_lines():
+        print(f"    {line}")
+    print(f">> Java: {pipeline.output_dir}")
+    print(f">> Results: {results_path}")
+    print(f">> Profile: {pipeline.profiler.write_report()}")
+    if counts.get('failed'):
+        print("[PIPELINE] Rerun with --resume to retry the failed programs only.")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
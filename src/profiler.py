@@ -0,0 +1,254 @@
+import cProfile
+import json
+import os
+import threading
+import time
+import yaml
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Dict, Iterable, List, Optional
+
+STAGES = ("clean", "parse", "risk", "convert", "validate", "write")
+COUNTERS = ("bytes", "llm_tokens", "cache_hits", "cache_misses")
+# Seconds; stages range from sub-millisecond parses to multi-minute LLM batches
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+@dataclass
+class StageRecord:
+    stage: str
+    programs: List[str] = field(default_factory=list)  # several for batched stages (risk, convert, validate)
+    wall: float = 0.0
+    cpu: float = 0.0
+    bytes: int = 0
+    llm_tokens: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+
+# The stage running in this thread / task; count() adds to it
+_current: ContextVar[Optional[StageRecord]] = ContextVar("profiler_stage", default=None)
+
+def count(counter: str, n: int = 1):
+    """
+    Adds n to a counter (llm_tokens, cache_hits, ...) of the stage running
+    in the current context. A no-op outside a stage, so the cache and the
+    converter can report unconditionally.
+    """
+    record = _current.get()
+    if record is not None:
+        setattr(record, counter, getattr(record, counter) + n)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[int]:
+        out, total = [], 0
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+class Profiler:
+    """
+    Stage-level instrumentation for the pipeline. Each `with profiler.stage(...)`
+    block records wall time, CPU time (of the calling thread), bytes processed,
+    and the LLM tokens and cache hits/misses reported through count() while it
+    runs. Stages feed Prometheus-style histograms (render_prometheus) and,
+    when records are kept, a per-run, per-program profile report.
+    """
+    def __init__(self, config_path="config.yaml", keep_records: Optional[bool] = None,
+                 cprofile_stages: Optional[Iterable[str]] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('profiling', {})
+        self.enabled = cfg.get('enabled', True)
+        self.buckets = tuple(cfg.get('buckets') or DEFAULT_BUCKETS)
+        self.report_path = cfg.get('report_path', '.cache/profile_report.json')
+        self.cprofile_dir = cfg.get('cprofile_dir', '.cache/profiles')
+        self.cprofile_stages = set((cfg.get('cprofile_stages') or []) if cprofile_stages is None else cprofile_stages)
+        # Long-running services keep only the aggregates; batch runs keep every record for the report
+        self.keep_records = cfg.get('keep_records', True) if keep_records is None else keep_records
+
+        self.started = time.time()
+        self.records: List[StageRecord] = []
+        self.wall: Dict[str, Histogram] = {}
+        self.cpu: Dict[str, Histogram] = {}
+        self.totals: Dict[str, Counter] = {}
+        self._profiles: Dict[str, cProfile.Profile] = {}
+        self._profiling = False  # cProfile allows one active profiler at a time
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, programs=(), nbytes: int = 0):
+        """Times the block as one run of stage name over programs (a name or a list)."""
+        record = StageRecord(name, [programs] if isinstance(programs, str) else list(programs), bytes=nbytes)
+        if not self.enabled:
+            yield record
+            return
+        token = _current.set(record)
+        profile = self._start_cprofile(name)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        finally:
+            record.wall = time.perf_counter() - wall
+            record.cpu = time.thread_time() - cpu
+            if profile is not None:
+                profile.disable()
+                self._profiling = False
+            _current.reset(token)
+            self._observe(record)
+
+    def profiled(self, name: str):
+        """Decorator form of stage(); the first argument's length counts as bytes if it is a str."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                nbytes = len(args[0]) if args and isinstance(args[0], str) else 0
+                with self.stage(name, nbytes=nbytes):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def record(self, record: StageRecord):
+        """Adds a stage run timed elsewhere, e.g. in a worker process."""
+        if self.enabled:
+            self._observe(record)
+
+    def _start_cprofile(self, name: str) -> Optional[cProfile.Profile]:
+        if name not in self.cprofile_stages:
+            return None
+        with self._lock:
+            if self._profiling:
+                return None  # Nested or concurrent stage: only the outer one is profiled
+            self._profiling = True
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+        profile.enable()
+        return profile
+
+    def _observe(self, record: StageRecord):
+        with self._lock:
+            if record.stage not in self.wall:
+                self.wall[record.stage] = Histogram(self.buckets)
+                self.cpu[record.stage] = Histogram(self.buckets)
+                self.totals[record.stage] = Counter()
+            self.wall[record.stage].observe(record.wall)
+            self.cpu[record.stage].observe(record.cpu)
+            totals = self.totals[record.stage]
+            totals['runs'] += 1
+            totals['programs'] += len(record.programs)
+            for name in COUNTERS:
+                totals[name] += getattr(record, name)
+            if self.keep_records:
+                self.records.append(record)
+
+    # --- Prometheus exposition ---
+
+    def render_prometheus(self, prefix: str = "cobol_pipeline") -> str:
+        """Text exposition format (version 0.0.4) for a /metrics endpoint."""
+        lines = []
+        with self._lock:
+            stages = sorted(self.wall)
+            for metric, source, help_text in (
+                    ("stage_wall_seconds", self.wall, "Wall-clock time per stage run"),
+                    ("stage_cpu_seconds", self.cpu, "CPU time of the calling thread per stage run")):
+                name = f"{prefix}_{metric}"
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for stage in stages:
+                    hist = source[stage]
+                    for bound, total in zip(self.buckets + (float('inf'),), hist.cumulative()):
+                        le = "+Inf" if bound == float('inf') else repr(float(bound))
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {total}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+            for counter in ("programs",) + COUNTERS:
+                name = f"{prefix}_{counter}_total"
+                lines += [f"# HELP {name} {counter.replace('_', ' ').capitalize()} per stage",
+                          f"# TYPE {name} counter"]
+                lines += [f'{name}{{stage="{stage}"}} {self.totals[stage][counter]}' for stage in stages]
+        return "\n".join(lines) + "\n"
+
+    # --- Per-run report ---
+
+    def _percentile(self, values: List[float], q: float) -> float:
+        if not values:
+            return 0.0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def report(self) -> dict:
+        """
+        Per-stage totals and percentiles, plus one row per program. A batched
+        stage run is shared evenly among the programs it covered.
+        """
+        with self._lock:
+            records = list(self.records)
+        stages, programs = {}, {}
+        for record in records:
+            summary = stages.setdefault(record.stage, {"runs": 0, "wall": [], "cpu": 0.0,
+                                                       **{c: 0 for c in COUNTERS}})
+            summary["runs"] += 1
+            summary["wall"].append(record.wall)
+            summary["cpu"] += record.cpu
+            for c in COUNTERS:
+                summary[c] += getattr(record, c)
+            share = 1 / len(record.programs) if record.programs else 0
+            for program in record.programs:
+                row = programs.setdefault(program, {})
+                cell = row.setdefault(record.stage, {"wall": 0.0, "cpu": 0.0, **{c: 0 for c in COUNTERS}})
+                cell["wall"] += record.wall * share
+                cell["cpu"] += record.cpu * share
+                for c in COUNTERS:
+                    cell[c] += getattr(record, c) * share
+        for summary in stages.values():
+            walls = summary.pop("wall")
+            summary.update(wall=sum(walls), wall_p50=self._percentile(walls, 0.5),
+                           wall_p95=self._percentile(walls, 0.95), wall_max=max(walls))
+        order = {s: i for i, s in enumerate(STAGES)}
+        return {
+            "started": self.started,
+            "elapsed": time.time() - self.started,
+            "stages": dict(sorted(stages.items(), key=lambda kv: order.get(kv[0], len(order)))),
+            "programs": programs,
+            "cprofile": self.dump_cprofile(),
+        }
+
+    def dump_cprofile(self) -> Dict[str, str]:
+        """Writes one .prof file per profiled stage (open with pstats or snakeviz)."""
+        paths = {}
+        for name, profile in self._profiles.items():
+            os.makedirs(self.cprofile_dir, exist_ok=True)
+            paths[name] = os.path.join(self.cprofile_dir, f"{name}.prof")
+            profile.dump_stats(paths[name])
+        return paths
+
+    def write_report(self, path: Optional[str] = None) -> str:
+        path = path or self.report_path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+        os.replace(tmp, path)
+        return path
+
+    def summary_lines(self) -> List[str]:
+        """One line per stage for console output."""
+        with self._lock:
+            return [f"{stage:<9} runs={t['runs']:<5} wall={self.wall[stage].sum:8.3f}s "
+                    f"cpu={self.cpu[stage].sum:8.3f}s bytes={t['bytes']} tokens={t['llm_tokens']} "
+                    f"cache={t['cache_hits']}/{t['cache_hits'] + t['cache_misses']}"
+                    for stage, t in sorted(self.totals.items(),
+                                           key=lambda kv: STAGES.index(kv[0]) if kv[0] in STAGES else len(STAGES))]
@@ -0,0 +1,74 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute.
+
+    Used for both requests-per-minute (one token per call) and
+    tokens-per-minute (estimated prompt + completion tokens per call).
+    A rate of None/0 disables limiting. Thread-safe, so sessions running
+    on different event loops (JobQueue threads) can draw on one bucket.
+    """
+    def __init__(self, rate_per_minute: Optional[float], capacity: Optional[float] = None,
+                 clock=time.monotonic):
+        self.rate = (rate_per_minute or 0) / 60.0
+        self.capacity = capacity or rate_per_minute or 0
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """Takes amount tokens if available; otherwise returns the seconds to wait."""
+        if not self.rate:
+            return 0.0
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return 0.0
+            return (amount - self.tokens) / self.rate
+
+    async def acquire(self, amount: float = 1):
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def adjust(self, amount: float):
+        """Charges (or refunds, if negative) the difference once real usage is known."""
+        if self.rate:
+            with self._lock:
+                self._refill()
+                self.tokens = min(self.capacity, self.tokens - amount)
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+def is_retryable(exc: Exception) -> bool:
+    """429 and 5xx responses, plus connection errors and timeouts."""
+    status = getattr(exc, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (ConnectionError, asyncio.TimeoutError)) or \
+        type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Server-provided Retry-After seconds, if the error carries a response."""
+    headers = getattr(getattr(exc, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,191 @@
+import os
+import yaml
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# Column name -> type: 'str' (interned per chunk), 'd' (float64) or 'q' (int64)
+RESULT_COLUMNS = {
+    "name": "str",
+    "complexity_score": "d",
+    "logic_points": "q",
+    "risk_level": "str",
+    "sql_count": "q",
+    "validation_score": "d",
+    "timestamp": "str",
+}
+
+class _StringColumn:
+    """Interned strings: one int32 code per row plus the distinct values of the chunk."""
+    def __init__(self):
+        self.codes = array('i')
+        self.values: List[str] = []
+        self._lookup: Dict[str, int] = {}
+
+    def append(self, value):
+        value = "" if value is None else str(value)
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def to_arrow(self):
+        import pyarrow as pa
+        return pa.DictionaryArray.from_arrays(pa.array(self.codes, type=pa.int32()), pa.array(self.values))
+
+class ResultStore:
+    """
+    Append-only columnar store for per-program results. Rows go into typed
+    column buffers (array module, interned strings) and every chunk_rows
+    rows the buffers are written out as one Parquet row group (or Arrow
+    record batch) and cleared, so memory stays flat with portfolio size.
+    The file is written under a temporary name and moved into place on
+    close(), so the previous results stay readable until then.
+    Aggregates are computed batch by batch from the file.
+    """
+    def __init__(self, config_path="config.yaml", path: Optional[str] = None,
+                 chunk_rows: Optional[int] = None, columns: Optional[Dict[str, str]] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('results', {})
+        self.path = path or cfg.get('path', '.cache/results.parquet')
+        self.format = 'arrow' if self.path.endswith(('.arrow', '.feather')) else 'parquet'
+        self.chunk_rows = chunk_rows or cfg.get('chunk_rows', 50000)
+        self.columns = columns or RESULT_COLUMNS
+        self.rows = 0
+        self.closed = False
+        self._writer = None
+        self._schema = None
+        self._reset()
+
+    def _reset(self):
+        self._buffers = {name: _StringColumn() if kind == 'str' else array(kind)
+                         for name, kind in self.columns.items()}
+        self._buffered = 0
+
+    def append(self, row: Dict):
+        """Adds one row; keys outside the schema are ignored, missing numbers count as 0."""
+        if self.closed:
+            raise ValueError(f"ResultStore {self.path} is closed")
+        for name, kind in self.columns.items():
+            value = row.get(name)
+            if kind == 'str':
+                self._buffers[name].append(value)
+            else:
+                self._buffers[name].append(value or 0)
+        self._buffered += 1
+        self.rows += 1
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def extend(self, rows: Iterable[Dict]):
+        for row in rows:
+            self.append(row)
+        return self
+
+    def _batch(self):
+        import pyarrow as pa
+        arrays = [buf.to_arrow() if isinstance(buf, _StringColumn) else pa.array(buf)
+                  for buf in self._buffers.values()]
+        return pa.RecordBatch.from_arrays(arrays, names=list(self.columns))
+
+    @classmethod
+    def read(cls, path: str, config_path="config.yaml") -> "ResultStore":
+        """A closed store over an existing results file, e.g. the previous run's (empty if missing)."""
+        store = cls(config_path, path=path)
+        store.closed = True
+        return store
+
+    def _open_writer(self):
+        import pyarrow as pa
+        # Dictionaries change per chunk, so the file schema is declared up front
+        self._schema = pa.schema([
+            pa.field(name, pa.dictionary(pa.int32(), pa.string()) if kind == 'str'
+                     else pa.float64() if kind == 'd' else pa.int64())
+            for name, kind in self.columns.items()
+        ])
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.format == 'arrow':
+            # Stream format: the file format cannot replace dictionaries between batches
+            self._writer = pa.ipc.new_stream(f"{self.path}.tmp", self._schema)
+        else:
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(f"{self.path}.tmp", self._schema)
+
+    def flush(self):
+        if not self._buffered:
+            return
+        batch = self._batch()
+        if self._writer is None:
+            self._open_writer()
+        if self.format == 'arrow':
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write_batch(batch, row_group_size=self._buffered)
+        self._reset()
+
+    def close(self):
+        """Writes the last chunk and finalizes the file; reading closes implicitly."""
+        if self.closed:
+            return
+        self.flush()
+        if self._writer is None:
+            self._open_writer()  # no rows: an empty file replaces the previous results
+        self._writer.close()
+        self._writer = None
+        os.replace(f"{self.path}.tmp", self.path)
+        self.closed = True
+
+    # --- Reading: one chunk at a time ---
+
+    def iter_batches(self, columns: Optional[List[str]] = None) -> Iterator:
+        """Stored record batches (pyarrow), closing the writer first."""
+        self.close()
+        if not os.path.exists(self.path):
+            return
+        import pyarrow as pa
+        if self.format == 'arrow':
+            with pa.memory_map(self.path) as source:
+                for batch in pa.ipc.open_stream(source):
+                    yield batch.select(columns) if columns else batch
+        else:
+            import pyarrow.parquet as pq
+            yield from pq.ParquetFile(self.path).iter_batches(columns=columns)
+
+    def mean(self, column: str) -> float:
+        import pyarrow.compute as pc
+        total = count = 0
+        for batch in self.iter_batches([column]):
+            total += pc.sum(batch.column(0)).as_py() or 0
+            count += len(batch)
+        return total / count if count else float('nan')
+
+    def value_counts(self, column: str) -> Counter:
+        counts = Counter()
+        for batch in self.iter_batches([column]):
+            col = batch.column(0)
+            if hasattr(col, 'dictionary'):
+                # Count codes, then map the (few) distinct codes to strings
+                codes = Counter(col.indices.to_pylist())
+                values = col.dictionary.to_pylist()
+                counts.update({values[c]: n for c, n in codes.items()})
+            else:
+                counts.update(col.to_pylist())
+        return counts
+
+    def top(self, column: str, n: int, columns: Optional[List[str]] = None):
+        """The n rows with the largest value in column, as a DataFrame."""
+        import pandas as pd
+        best = None
+        for batch in self.iter_batches(columns):
+            df = batch.to_pandas()
+            best = df if best is None else pd.concat([best, df])
+            best = best.nlargest(n, column)
+        return best if best is not None else pd.DataFrame(columns=columns or list(self.columns))
+
+    def to_frame(self, columns: Optional[List[str]] = None):
+        """Whole table as a DataFrame (for small portfolios and tests)."""
+        import pandas as pd
+        frames = [batch.to_pandas() for batch in self.iter_batches(columns)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns or list(self.columns))
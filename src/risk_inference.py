@@ -0,0 +1,223 @@
+import hashlib
+import os
+import yaml
+import numpy as np
+from array import array
+from typing import List, Sequence, Tuple
+
+RISK_LABELS = ("LOW", "MEDIUM", "HIGH")
+# The feature row every backend is served: one program's counts, in this order
+RISK_FEATURES = ("code_lines", "variables", "sql_statements", "calls", "logic_points")
+# Rows from which sklearn's compiled tree walk beats the NumPy one (measured ~250 on 100 deep trees)
+FOREST_NATIVE_ROWS = 256
+
+# One instance per weights file per process (API workers, Spark executors)
+_LOADED = {}
+
+class NumpyRiskModel:
+    """
+    Pure-NumPy forward pass of the DeepRiskModel network (5 -> 16 -> 8 -> 3,
+    ReLU hidden layers). Gives the same argmax as Keras without importing
+    TensorFlow, and scores a whole portfolio as one vectorized batch.
+    """
+    def __init__(self, layers: Sequence[Tuple[np.ndarray, np.ndarray]]):
+        self.layers = [(np.asarray(W, dtype=np.float32), np.asarray(b, dtype=np.float32)) for W, b in layers]
+        self.n_features = self.layers[0][0].shape[0]
+        self._labels = np.array(RISK_LABELS)
+        h = hashlib.sha256()
+        for W, b in self.layers:
+            h.update(W.tobytes())
+            h.update(b.tobytes())
+        self.version = h.hexdigest()[:16]
+
+    @classmethod
+    def seeded(cls, seed: int = 42, sizes: Sequence[int] = (5, 16, 8, 3)) -> "NumpyRiskModel":
+        """
+        Reproducible demo network without TensorFlow: Glorot-uniform kernels
+        and zero biases, the initialization Keras gives the same layers.
+        """
+        rng = np.random.default_rng(seed)
+        layers = []
+        for n_in, n_out in zip(sizes[:-1], sizes[1:]):
+            limit = np.sqrt(6.0 / (n_in + n_out))
+            layers.append((rng.uniform(-limit, limit, (n_in, n_out)), np.zeros(n_out)))
+        return cls(layers)
+
+    @classmethod
+    def from_keras(cls, model) -> "NumpyRiskModel":
+        weights = model.get_weights()  # [kernel, bias] per Dense layer
+        return cls(list(zip(weights[0::2], weights[1::2])))
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyRiskModel":
+        with np.load(path) as data:
+            n_layers = len(data.files) // 2
+            return cls([(data[f"W{i}"], data[f"b{i}"]) for i in range(n_layers)])
+
+    def save(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {}
+        for i, (W, b) in enumerate(self.layers):
+            arrays[f"W{i}"], arrays[f"b{i}"] = W, b
+        np.savez(path, **arrays)
+
+    def logits(self, features) -> np.ndarray:
+        X = np.asarray(features, dtype=np.float32).reshape(-1, self.n_features)
+        last = len(self.layers) - 1
+        for i, (W, b) in enumerate(self.layers):
+            X = X @ W
+            X += b
+            if i < last:
+                np.maximum(X, 0, out=X)
+        return X
+
+    def predict_proba(self, features) -> np.ndarray:
+        z = self.logits(features)
+        z -= z.max(axis=1, keepdims=True)
+        np.exp(z, out=z)
+        z /= z.sum(axis=1, keepdims=True)
+        return z
+
+    def predict_batch(self, features) -> List[str]:
+        # Softmax is monotonic, so the argmax of the logits is the Keras class
+        return self._labels[self.logits(features).argmax(axis=1)].tolist()
+
+    def predict(self, features) -> str:
+        """Drop-in for DeepRiskModel.predict: label of the first row."""
+        return self.predict_batch(features)[0]
+
+class FlatForest:
+    """
+    A fitted scikit-learn tree ensemble (RandomForestClassifier) flattened
+    into contiguous node arrays: all trees share one feature / threshold /
+    child table, leaves point to themselves and hold their normalized class
+    probabilities. Small batches are scored with vectorized NumPy walks
+    that advance only the (row, tree) pairs not yet at a leaf, large ones
+    (FOREST_NATIVE_ROWS and up) by the estimator's own compiled walk; a
+    single row takes a plain-Python walk over the same tables, which skips
+    sklearn's input validation and joblib dispatch entirely. Predictions
+    match the estimator's predict() exactly (same float32 inputs, same
+    summation order).
+    """
+    def __init__(self, feature, threshold, left, right, value, roots, depth: int, classes):
+        self.feature = np.asarray(feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.intp)
+        self.right = np.asarray(right, dtype=np.intp)
+        self.value = np.asarray(value, dtype=np.float64)  # (n_nodes, n_classes), rows sum to 1
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.classes = list(classes)
+        self.is_leaf = self.left == np.arange(len(self.left))
+        self.estimator = None  # set by from_sklearn; serves large batches
+        self.n_features = int(self.feature.max()) + 1 if len(self.feature) else 0
+        self._labels = np.array(self.classes, dtype=object)
+        # Python lists for the single-row walk: indexing them beats NumPy scalars
+        self._rows = list(zip(self.feature.tolist(), self.threshold.tolist(),
+                              self.left.tolist(), self.right.tolist()))
+        self._leaf = [tuple(v) for v in self.value.tolist()]
+        self._roots = self.roots.tolist()
+        h = hashlib.sha256()
+        for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots):
+            h.update(a.tobytes())
+        h.update(repr(self.classes).encode())
+        self.version = h.hexdigest()[:16]
+
+    @classmethod
+    def from_sklearn(cls, forest, labels: Sequence[str] = RISK_LABELS) -> "FlatForest":
+        """labels maps the estimator's integer classes_ to names (LOW/MEDIUM/HIGH)."""
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            leaf = tree.children_left == -1
+            own = np.arange(offset, offset + n)
+            roots.append(offset)
+            feature.append(np.where(leaf, 0, tree.feature))
+            threshold.append(np.where(leaf, 0.0, tree.threshold))
+            left.append(np.where(leaf, own, tree.children_left + offset))
+            right.append(np.where(leaf, own, tree.children_right + offset))
+            proba = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+            offset += n
+            depth = max(depth, tree.max_depth)
+        classes = [labels[c] if isinstance(c, (int, np.integer)) and 0 <= c < len(labels) else c
+                   for c in forest.classes_.tolist()]
+        flat = cls(np.concatenate(feature), np.concatenate(threshold), np.concatenate(left),
+                   np.concatenate(right), np.concatenate(value), roots, depth, classes)
+        flat.n_features = forest.n_features_in_
+        flat.estimator = forest
+        return flat
+
+    def predict_proba(self, features) -> np.ndarray:
+        X = np.asarray(features, dtype=np.float32).reshape(-1, self.n_features)
+        if self.estimator is not None and len(X) >= FOREST_NATIVE_ROWS:
+            return self.estimator.predict_proba(X)
+        n_trees = len(self.roots)
+        nodes = np.tile(self.roots, len(X))  # walk i scores row i // n_trees in tree i % n_trees
+        rows = np.repeat(np.arange(len(X)), n_trees)
+        # Only walks still at an internal node take the next step, so shallow leaves cost nothing
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while len(active):
+            at = nodes[active]
+            go_left = X[rows[active], self.feature[at]] <= self.threshold[at]
+            at = np.where(go_left, self.left[at], self.right[at])
+            nodes[active] = at
+            active = active[~self.is_leaf[at]]
+        nodes = nodes.reshape(len(X), n_trees)
+        proba = np.zeros((len(X), self.value.shape[1]))
+        for t in range(n_trees):  # tree by tree, the order sklearn accumulates in
+            proba += self.value[nodes[:, t]]
+        proba /= n_trees
+        return proba
+
+    def predict_batch(self, features) -> List[str]:
+        return self._labels[self.predict_proba(features).argmax(axis=1)].tolist()
+
+    def predict_one(self, row) -> str:
+        """Label of one feature row, without NumPy."""
+        x = array('f', row)  # the float32 rounding sklearn applies to its input
+        tables, leaf = self._rows, self._leaf
+        total = [0.0] * len(self.classes)
+        for node in self._roots:
+            f, t, lo, hi = tables[node]
+            while lo != hi:
+                node = lo if x[f] <= t else hi
+                f, t, lo, hi = tables[node]
+            for k, p in enumerate(leaf[node]):
+                total[k] += p
+        total = [p / len(self._roots) for p in total]
+        best = max(range(len(total)), key=total.__getitem__)  # first maximum, as argmax
+        return self.classes[best]
+
+    def predict(self, features) -> str:
+        """Same contract as NumpyRiskModel.predict: label of the first row."""
+        return self.predict_one(features[0])
+
+def load_risk_model(config_path="config.yaml"):
+    """
+    Loads the configured risk model once per process: the exported risk
+    network (backend 'dnn', NumpyRiskModel) or the registered RandomForest
+    (backend 'forest', FlatForest). On the very first run (no artifact yet)
+    seeded weights are generated with NumPy and saved; TensorFlow is only
+    needed to retrain them (python -m src.dl_risk_model).
+    """
+    with open(config_path, 'r') as f:
+        cfg = yaml.safe_load(f).get('risk_model', {})
+    if cfg.get('backend', 'dnn') == 'forest':
+        from src.risk_model import RiskModel
+        model = RiskModel(config_path)
+        key = ('forest', model.registry.path, model.artifact, model.pinned_version)
+        if key not in _LOADED:
+            _LOADED[key] = model.ensure_ready()
+        return _LOADED[key]
+    path = cfg.get('weights_path', 'models/risk_dnn.npz')
+    if path not in _LOADED:
+        if not os.path.exists(path):
+            NumpyRiskModel.seeded().save(path)
+        _LOADED[path] = NumpyRiskModel.load(path)
+    return _LOADED[path]
@@ -1,26 +1,43 @@
-import pandas as pd
+import yaml
 from sklearn.ensemble import RandomForestClassifier
 import joblib
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+from src.model_registry import ModelRegistry
+from src.risk_inference import RISK_FEATURES, FlatForest
 
 class RiskModel:
     """
     ML-based Risk Assessment for COBOL modernization.
     Uses a Random Forest Classifier to predict if a program 
     is LOW, MEDIUM, or HIGH risk to refactor.
+
+    The fitted forest is a versioned artifact in the ModelRegistry: it is
+    loaded (once per process) instead of retrained, and served through a
+    FlatForest, the flattened-tree scorer, for single rows and batches.
+    It takes the same RISK_FEATURES row as the NumPy network, so the API,
+    pipeline and Spark jobs can serve either backend; artifacts record
+    their features and one trained on another row is refused.
     """
     
-    def __init__(self):
+    def __init__(self, config_path="config.yaml", registry: Optional[ModelRegistry] = None):
+        with open(config_path, 'r') as f:
+            cfg = yaml.safe_load(f).get('risk_model', {})
+        self.artifact = cfg.get('forest_name', 'risk_forest')
+        self.pinned_version = cfg.get('forest_version')  # None serves the registry's current version
+        self.registry = registry or ModelRegistry(config_path)
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
         self.is_trained = False
+        self.compiled: Optional[FlatForest] = None
+        self.version: Optional[str] = None
 
     def train_mock_model(self):
         """
         Creates a synthetic dataset to demonstrate ML capabilities in the POC.
-        Features: [code_lines, variables_count, sql_count, calls_count, complexity_score]
+        Features: [code_lines, variables_count, sql_count, calls_count, logic_points]
         """
         # Feature sets: 
-        # [Lines, Vars, SQL, Calls, Complexity]
+        # [Lines, Vars, SQL, Calls, LogicPoints]
         X_train = [
             [20, 2, 0, 0, 5.0],      # Example: Small, simple program (Low)
             [1500, 80, 25, 12, 95.0], # Example: Massive legacy monster (High)
@@ -34,30 +51,69 @@ class RiskModel:
         
         self.model.fit(X_train, y_train)
         self.is_trained = True
+        self.compiled = FlatForest.from_sklearn(self.model)
         print("Model trained successfully with 5-feature set.")
 
-    def predict_risk(self, program_data: Dict[str, Any]) -> str:
-        """
-        Predicts the risk level of a given COBOL program.
-        """
+    def load(self, version: Optional[str] = None) -> "RiskModel":
+        """Serves a registered forest (default: the pinned, else current, version)."""
+        version = version or self.pinned_version
+        entry = self.registry.entry(self.artifact, version)
+        trained_on = tuple((entry or {}).get("metadata", {}).get("features", ("complexity_score",)))
+        if entry is not None and trained_on != RISK_FEATURES:
+            raise ValueError(f"{self.artifact} {entry['version']} was trained on {list(trained_on)}, "
+                             f"but risk models are served {list(RISK_FEATURES)}; retrain and publish a new version")
+        self.model = self.registry.load(self.artifact, version)
+        self.version = version or self.registry.current(self.artifact)
+        self.compiled = FlatForest.from_sklearn(self.model)
+        self.is_trained = True
+        return self
+
+    def publish(self, version: Optional[str] = None) -> str:
+        """Registers the trained forest as a new artifact version and makes it current."""
         if not self.is_trained:
-            self.train_mock_model()
-        
-        # We must provide exactly 5 features in the same order as training:
-        features = [[
+            raise RuntimeError("Train or load the model before publishing it")
+        self.version = self.registry.publish(self.artifact, self.model, version,
+                                             metadata={"flat_version": self.compiled.version,
+                                                       "features": list(RISK_FEATURES)})
+        return self.version
+
+    def ensure_ready(self) -> FlatForest:
+        """The compiled forest; loads the registered artifact, training and publishing one only if none exists."""
+        if not self.is_trained:
+            if self.pinned_version or self.registry.current(self.artifact):
+                self.load()
+            else:
+                with self.registry.lock():
+                    if self.registry.current(self.artifact):  # another process published first
+                        self.load()
+                    else:
+                        self.train_mock_model()
+                        self.publish()
+        return self.compiled
+
+    @staticmethod
+    def features(program_data: Dict[str, Any]) -> List[float]:
+        # We must provide exactly 5 features in the same order as training (RISK_FEATURES):
+        return [
             program_data.get('code_lines', 0),
             len(program_data.get('variables', [])),
             program_data.get('sql_count', 0),
             len(program_data.get('calls', [])),
-            program_data.get('complexity_score', 0.0)
-        ]]
-        
-        # Perform prediction
-        prediction_id = self.model.predict(features)[0]
-        
-        # Map ID back to human-readable string
-        risk_mapping = {0: "LOW", 1: "MEDIUM", 2: "HIGH"}
-        return risk_mapping.get(prediction_id, "UNKNOWN")
+            program_data.get('logic_points', 0)
+        ]
+
+    def predict_risk(self, program_data: Dict[str, Any]) -> str:
+        """
+        Predicts the risk level of a given COBOL program.
+        """
+        return self.ensure_ready().predict_one(self.features(program_data))
+
+    def predict_risk_many(self, features) -> List[str]:
+        """
+        Risk levels for a feature matrix (one row of the 5 training features
+        per program), scored as one vectorized batch.
+        """
+        return self.ensure_ready().predict_batch(features)
 
     def save_model(self, path: str = "models/risk_model.pkl"):
         """Saves the trained model to the models directory."""
@@ -1,39 +1,115 @@
 from pyspark.sql import SparkSession
-from src.cobol_parser import COBOLParser
-import os
-from typing import List
+from pyspark.sql.types import ArrayType, DoubleType, LongType, StringType, StructField, StructType
+from src.batch_engine import analyze_source, clean_source, close_worker, init_worker
+from src.cobol_parser import PARSER_VERSION, COBOLParser
+from src.copybooks import CopybookLibrary
+from src.data_cleaner import DataCleaner
+from src.risk_inference import load_risk_model
+from src.change_manifest import ChangeManifest, settings_fingerprint
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Full COBOLProgram record plus its source path and risk tier
+PROGRAM_SCHEMA = StructType([
+    StructField("path", StringType()),
+    StructField("name", StringType()),
+    StructField("code_lines", LongType()),
+    StructField("variables", ArrayType(StringType())),
+    StructField("calls", ArrayType(StringType())),
+    StructField("sql_statements", ArrayType(StringType())),
+    StructField("logic_points", LongType()),
+    StructField("complexity_score", DoubleType()),
+    StructField("copybooks", ArrayType(StringType())),
+    StructField("paragraphs", ArrayType(StringType())),
+    StructField("risk_level", StringType()),
+])
+
+def _score(model, batch) -> Iterator[tuple]:
+    if not batch:
+        return
+    features = [[p.code_lines, len(p.variables), len(p.sql_statements), len(p.calls), p.logic_points]
+                for _, p in batch]
+    for (path, p), risk in zip(batch, model.predict_batch(features)):
+        yield (path, p.name, p.code_lines, p.variables, p.calls, p.sql_statements,
+               p.logic_points, p.complexity_score, p.copybooks, p.paragraphs, risk)
+
+def modernize_partition(records: Iterable[Tuple[str, bytes]], settings: dict,
+                        batch_size: int = 1024) -> Iterator[tuple]:
+    """
+    mapPartitions body for (path, bytes) records from binaryFiles: the
+    batch_engine worker state (cleaner, parser, copybooks, risk model) per
+    partition, built from the broadcast settings, with risk scored a slice
+    of programs at a time.
+    """
+    init_worker(risk_model=settings["risk_model"], settings=settings)
+    model, batch = settings["risk_model"], []
+    try:
+        for path, data in records:
+            program = analyze_source(clean_source(data.decode("utf-8", errors="replace")))
+            batch.append((path, program))
+            if len(batch) >= batch_size:
+                yield from _score(model, batch)
+                batch = []
+        yield from _score(model, batch)
+    finally:
+        close_worker()
 
 class COBOLSparkProcessor:
-    def __init__(self):
+    def __init__(self, master: str = "local[*]"):
         # Initializing Spark for distributed processing
         self.spark = SparkSession.builder \
             .appName("IBM-Modernization-Scaler") \
-            .master("local[*]") \
+            .master(master) \
             .getOrCreate()
         self.parser = COBOLParser()
 
-    def process_batch(self, input_folder: str):
-        # 1. Get list of files
-        files = [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.endswith('.cbl')]
-        
+    def process_batch(self, input_folder: str, incremental: bool = False,
+                      manifest_path: str = ".cache/spark_manifest.json"):
+        # 1. Get list of files (only added/changed ones in incremental mode)
+        # Rows parsed under other weights or parser/cleaner versions are redone
+        manifest = ChangeManifest(manifest_path, fingerprint=settings_fingerprint(
+            weights=self.parser.cfg['weights'], parser=PARSER_VERSION, cleaner=DataCleaner.version))
+        if not incremental:
+            manifest.entries.clear()
+        changes = manifest.scan(input_folder)
+        states = {state.path: state for state in changes.to_process}
+        files = list(states)
+
         # 2. Parallelize across the cluster (RDD)
         file_rdd = self.spark.sparkContext.parallelize(files)
 
-        # 3. Distributed Map operation
-        def analyze(path):
-            with open(path, 'r') as f:
-                content = f.read()
+        # 3. Distributed Map operation: one parser and cache per partition
+        def analyze(paths):
             # Note: Import inside function for Spark serialization
-            from src.cobol_parser import COBOLParser
-            p = COBOLParser()
-            res = p.parse(content)
-            return (res.name, res.complexity_score)
-
-        results = file_rdd.map(analyze).collect()
-        
-        print(f"✓ PySpark: Distributed processing complete for {len(results)} files.")
+            from src.batch_engine import analyze_partition
+            return analyze_partition(paths, use_cache=True)
+
+        for row in file_rdd.mapPartitions(analyze).collect():
+            manifest.record(states[row.path], {"name": row.name, "complexity_score": row.complexity_score})
+        manifest.save()
+
+        # Merge fresh results with the ones carried over from earlier runs
+        results = [(r["name"], r["complexity_score"]) for r in manifest.results()]
+        print(f"✓ PySpark: Distributed processing complete for {len(files)} files "
+              f"({len(changes.unchanged)} unchanged, {len(changes.deleted)} deleted).")
         return results
 
+    def run_pipeline(self, input_path: str, output_path: str,
+                     min_partitions: Optional[int] = None) -> str:
+        """
+        Clean, parse and risk-score every file matched by input_path (a local,
+        HDFS or S3 path or glob) and write the records to Parquet. Sources are
+        read by the executors; nothing is collected on the driver.
+        """
+        sc = self.spark.sparkContext
+        settings = sc.broadcast({"parser": self.parser.cfg, "copybooks": CopybookLibrary().cfg,
+                                 "risk_model": load_risk_model()})
+        files = sc.binaryFiles(input_path, minPartitions=min_partitions or sc.defaultParallelism)
+        rows = files.mapPartitions(lambda part: modernize_partition(part, settings.value))
+        self.spark.createDataFrame(rows, PROGRAM_SCHEMA).write.mode("overwrite").parquet(output_path)
+        print(f"✓ PySpark: Portfolio records written to {output_path}")
+        return output_path
+
 if __name__ == "__main__":
     processor = COBOLSparkProcessor()
-    processor.process_batch("data/sample_cobol")
\ No newline at end of file
+    processor.process_batch("data/sample_cobol")
+    processor.run_pipeline("data/sample_cobol/*.cbl", "data/portfolio.parquet")
\ No newline at end of file
@@ -1,5 +1,4 @@
 from pyspark.sql import SparkSession
-from src.cobol_parser import COBOLParser
 import os
 
 def run_distributed_analysis(input_folder="data/sample_cobol"):
@@ -19,15 +18,14 @@ def run_distributed_analysis(input_folder="data/sample_cobol"):
     # Parallelize the file list across the 'cluster'
     dist_files = spark.sparkContext.parallelize(file_list)
 
-    def process_file(path):
-        parser = COBOLParser()
-        with open(path, 'r') as f:
-            content = f.read()
-        analysis = parser.parse(content)
-        return (analysis.name, analysis.complexity_score)
+    def process_partition(paths):
+        # One parser and cache per partition instead of per file
+        from src.batch_engine import analyze_partition
+        for row in analyze_partition(paths, use_cache=True):
+            yield (row.name, row.complexity_score)
 
     # 3. Distributed Mapping (The 'Magic' step)
-    results = dist_files.map(process_file).collect()
+    results = dist_files.mapPartitions(process_partition).collect()
 
     print(f"\n[SPARK] Successfully processed {len(results)} files in parallel.")
     for name, score in results:
@@ -1,27 +1,118 @@
 import re
-from typing import Dict, List
+from typing import Dict, Iterable, List, Set, Tuple
+
+JAVA_IDENT_RE = re.compile(r"[A-Za-z_$][\w$]*")
+# Lowercase->Uppercase humps, acronym ends (SQLCode -> SQL|Code), digits and underscores
+CAMEL_PART_RE = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+JAVA_METHOD_RE = re.compile(r"\b([A-Za-z_$][\w$]*)\s*\([^;{}()]*\)\s*(?:throws\s+[\w.,\s]+)?\{")
+# Declared or invoked methods and annotations: what SQL can have been mapped to
+JAVA_OPERATION_RE = re.compile(r"(@?[A-Za-z_$][\w$]*)\s*\(|(@[A-Za-z_$][\w$]*)")
+JAVA_KEYWORDS = {"if", "for", "while", "switch", "catch", "synchronized", "try", "return", "new"}
+
+# EXEC SQL verb -> Java constructs that implement it (Spring Data / JDBC)
+SQL_MAPPINGS = {
+    "SELECT": ("find", "get", "query", "select", "read", "load", "fetch", "exists", "count", "@query"),
+    "INSERT": ("save", "insert", "create", "persist", "add", "update"),
+    "UPDATE": ("save", "update", "modify", "merge", "@modifying"),
+    "DELETE": ("delete", "remove", "@modifying"),
+}
+
+def _simple_name(cobol_name: str) -> str:
+    # Convert WS-CUST-ID to custid: compared against lowercased Java text
+    return cobol_name.replace('WS-', '').replace('-', '').lower()
 
 class ModernizationValidator:
     """
-    Checks if the generated Java code actually contains the 
+    Checks if the generated Java code actually contains the
     business logic from the original COBOL.
+
+    The Java output is tokenized once into a set of normalized identifiers
+    (every identifier plus every contiguous run of its camelCase parts), so
+    each COBOL name is a set lookup instead of a scan of the whole output.
     """
+    def __init__(self):
+        self._names: Dict[str, str] = {}  # COBOL name -> normalized form, shared across a batch
+
+    def _normalized(self, cobol_name: str) -> str:
+        simple = self._names.get(cobol_name)
+        if simple is None:
+            simple = self._names[cobol_name] = _simple_name(cobol_name)
+        return simple
+
+    @staticmethod
+    def identifier_index(java_code: str) -> Set[str]:
+        index = set()
+        for token in set(JAVA_IDENT_RE.findall(java_code)):
+            index.add(token.lower())
+            # Only runs of adjacent parts, so every entry is a substring of the code
+            for segment in re.split(r"[_$]", token):
+                parts = [p.lower() for p in CAMEL_PART_RE.findall(segment)]
+                for i in range(len(parts)):
+                    for j in range(i + 1, len(parts) + 1):
+                        index.add("".join(parts[i:j]))
+        return index
+
+    def _missing(self, names: Iterable[str], index: Set[str], java_lower: str) -> List[str]:
+        # The index answers almost every name; the rest get the original
+        # substring rule, all of them in one scan of the Java text
+        unresolved = [(name, simple) for name, simple in ((n, self._normalized(n)) for n in names)
+                      if simple and simple not in index]
+        if not unresolved:
+            return []
+        found = self._substrings({simple for _, simple in unresolved}, java_lower)
+        return [name for name, simple in unresolved if simple not in found]
+
+    @staticmethod
+    def _substrings(needles: Iterable[str], text: str) -> Set[str]:
+        """
+        The needles occurring in text, from one regex pass. Longest alternatives
+        come first, so at each position the match is the longest needle there
+        and every shorter needle found at that position is one of its prefixes.
+        """
+        pattern = re.compile("(?=(" + "|".join(map(re.escape, sorted(needles, key=len, reverse=True))) + "))")
+        hits = {m.group(1) for m in pattern.finditer(text)}
+        prefixes = {hit[:i] for hit in hits for i in range(1, len(hit) + 1)}
+        return {needle for needle in needles if needle in prefixes}
+
+    @staticmethod
+    def _sql_verb(statement: str) -> str:
+        words = statement.split(None, 1)
+        return words[0].upper() if words else ""
+
     def validate(self, java_code: str, original_meta: Dict) -> Dict:
-        missing_vars = []
+        java_lower = java_code.lower()
+        index = self.identifier_index(java_code)
+
         # Check if the COBOL variables exist in the Java code (ignoring case/hyphens)
-        for var in original_meta['variables']:
-            # Convert WS-CUST-ID to custId or similar
-            simple_name = var.replace('WS-', '').replace('-', '').lower()
-            if simple_name not in java_code.lower():
-                missing_vars.append(var)
+        missing_vars = self._missing(original_meta['variables'], index, java_lower)
+
+        # Each paragraph or section should have become a method
+        methods = {m.lower().replace('_', '') for m in JAVA_METHOD_RE.findall(java_code)} - JAVA_KEYWORDS
+        missing_methods = [p for p in original_meta.get('paragraphs', [])
+                           if p.replace('-', '').lower() not in methods]
 
         # Check if SQL Repository was created if SQL existed
         has_repo = "Repository" in java_code or "@Query" in java_code
         sql_needed = len(original_meta['sql_statements']) > 0
+        unmapped_sql = []
+        if sql_needed:
+            operations = {a or b for a, b in JAVA_OPERATION_RE.findall(java_code)}
+            operations = " ".join(operations).lower()
+            mapped = {verb: any(h in operations for h in hints) for verb, hints in SQL_MAPPINGS.items()}
+            for statement in original_meta['sql_statements']:
+                verb = self._sql_verb(statement)
+                if not mapped.get(verb, True):
+                    unmapped_sql.append(verb)
 
         return {
             "validation_score": 100 - (len(missing_vars) * 10),
             "missing_elements": missing_vars,
+            "missing_methods": missing_methods,
+            "unmapped_sql": unmapped_sql,
             "sql_integrity": True if (not sql_needed or has_repo) else False,
             "passed": len(missing_vars) == 0
-        }
\ No newline at end of file
+        }
+
+    def validate_many(self, pairs: Iterable[Tuple[str, Dict]]) -> List[Dict]:
+        """Batch mode over (java_code, meta) pairs; normalized COBOL names are shared across programs."""
+        return [self.validate(java_code, meta) for java_code, meta in pairs]
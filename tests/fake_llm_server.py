@@ -0,0 +1,116 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Returns canned Java classes after a configurable latency and can answer the
+first N requests with 429/503 (optionally with a Retry-After header) to
+exercise retry logic. Requests with stream=true get the answer word by
+word as server-sent chunks. Point GenAIConverter at it with
+base_url=server.url.
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeLLMServer:
+    def __init__(self, latency=0.05, fail_first=0, fail_status=429, retry_after=None):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=()):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, attempt, request, content):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                for piece in re.findall(r"\S+\s*", content):
+                    chunk = {
+                        "id": f"chatcmpl-{attempt}",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model", "fake"),
+                        "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake._lock:
+                    fake.requests += 1
+                    attempt = fake.requests
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight, fake.in_flight)
+                try:
+                    time.sleep(fake.latency)
+                    if attempt <= fake.fail_first:
+                        headers = [("Retry-After", str(fake.retry_after))] if fake.retry_after is not None else []
+                        self._send(fake.fail_status, {"error": {"message": "slow down", "type": "rate_limit"}},
+                                   headers)
+                        return
+                    prompt = request["messages"][-1]["content"]
+                    match = re.search(r"Program Name: ([\w-]+)", prompt)
+                    name = match.group(1) if match else "Unknown"
+                    part = re.search(r"part (\d+) of \d+", prompt)
+                    # Chunk prompts get class members back, whole programs a class
+                    content = f"public void part{part.group(1)}() {{}}" if part else f"public class {name} {{}}"
+                    if request.get("stream"):
+                        self._stream(attempt, request, content)
+                        return
+                    self._send(200, {
+                        "id": f"chatcmpl-{attempt}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model", "fake"),
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": content},
+                        }],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+                    })
+                finally:
+                    with fake._lock:
+                        fake.in_flight -= 1
+
+        return Handler
@@ -19,4 +19,899 @@ def test_complexity_calculation():
     # A program with an IF statement should have logic points
     sample = "       IF X = Y PERFORM Z."
     result = parser.parse(sample)
-    assert result.logic_points > 0
\ No newline at end of file
+    assert result.logic_points > 0
+
+def test_parser_multiline_statements():
+    parser = COBOLParser()
+    sample = (
+        "       PROGRAM-ID.\n"
+        "           MULTI-PROG.\n"
+        "       01 WS-LONG-NAME\n"
+        "              PIC X(10).\n"
+        "           CALL\n"
+        "              'SUB-PGM' USING WS-LONG-NAME.\n"
+        "           EXEC SQL\n"
+        "              SELECT 1 FROM T\n"
+        "           END-EXEC.\n"
+        "           IF X PERFORM Y END-IF.\n"
+    )
+    result = parser.parse(sample)
+    assert result.name == "MULTI-PROG"
+    assert result.variables == ["WS-LONG-NAME"]
+    assert result.calls == ["SUB-PGM"]
+    assert result.sql_statements == ["\n              SELECT 1 FROM T\n           "]
+    assert result.logic_points == 3
+    assert result.code_lines == 10
+
+
+def test_parser_matches_legacy_sweeps():
+    from benchmarks.bench_parser import legacy_parse, synthetic_source
+    parser = COBOLParser()
+    code = synthetic_source(2000, seed=7)
+    result = parser.parse(code)
+    assert legacy_parse(code, parser.cfg['weights']) == (
+        result.name, result.code_lines, result.variables, result.calls,
+        result.sql_statements, result.logic_points, result.complexity_score
+    )
+
+
+def test_analysis_cache_hits_and_eviction(tmp_path):
+    from src.analysis_cache import AnalysisCache
+    cache = AnalysisCache(path=str(tmp_path / "cache.db"), enabled=True)
+    parser = COBOLParser()
+    sample = "       PROGRAM-ID. TEST-PROG.\n       01 WS-VAR PIC X(10)."
+
+    first = cache.parse(parser, sample)
+    second = cache.parse(parser, sample)
+    assert first == second
+    assert cache.stats()["stages"]["parse"] == {"hits": 1, "misses": 1}
+
+    # Entries survive a reopen of the same store
+    cache.close()
+    cache = AnalysisCache(path=str(tmp_path / "cache.db"), enabled=True)
+    assert cache.parse(parser, sample).name == "TEST-PROG"
+    assert cache.hits["parse"] == 1
+
+    # Least recently used entries are evicted once the size bound is hit
+    cache.max_bytes = 200
+    for i in range(10):
+        cache.put("blob", f"k{i}", "x" * 50)
+    assert cache.stats()["size_bytes"] <= 200
+    assert cache.get("blob", "k9") is not None
+    assert cache.get("blob", "k0") is None
+
+    # A second process writing to the same file counts toward the same bound
+    cache.clear()
+    other = AnalysisCache(path=str(tmp_path / "cache.db"), enabled=True)
+    other.max_bytes = 200
+    for i in range(8):
+        (other if i < 4 else cache).put("blob", f"j{i}", "x" * 50)
+    import sqlite3
+    with sqlite3.connect(tmp_path / "cache.db") as db:
+        stored = db.execute("SELECT SUM(size) FROM entries").fetchone()[0]
+    assert cache.stats()["size_bytes"] == other.stats()["size_bytes"] == stored <= 200
+
+    # A hit is a read: it succeeds at once while another process holds the write lock
+    import time
+    key = next(k for k in ("j4", "j5", "j6", "j7") if cache.get("blob", k) is not None)
+    with sqlite3.connect(tmp_path / "cache.db", isolation_level=None) as db:
+        db.execute("BEGIN IMMEDIATE")
+        start = time.perf_counter()
+        assert cache.get("blob", key) is not None
+        assert time.perf_counter() - start < 1
+        db.execute("ROLLBACK")
+    other.close()
+    cache.close()
+
+
+def test_change_manifest_detects_changes(tmp_path):
+    import os
+    from src.change_manifest import ChangeManifest
+    src_dir = tmp_path / "cobol"
+    src_dir.mkdir()
+    (src_dir / "a.cbl").write_text("PROGRAM-ID. A.")
+    (src_dir / "b.cbl").write_text("PROGRAM-ID. B.")
+    (src_dir / "notes.txt").write_text("ignored")
+    manifest_path = str(tmp_path / "manifest.json")
+
+    manifest = ChangeManifest(manifest_path)
+    changes = manifest.scan(str(src_dir))
+    assert len(changes.added) == 2
+    for state in changes.to_process:
+        manifest.record(state, {"name": os.path.basename(state.path)})
+    manifest.save()
+
+    # Touched but identical content is not reprocessed
+    os.utime(src_dir / "a.cbl", (1, 1))
+    (src_dir / "b.cbl").write_text("PROGRAM-ID. B2.")
+    (src_dir / "c.cbl").write_text("PROGRAM-ID. C.")
+    manifest = ChangeManifest(manifest_path)
+    changes = manifest.scan(str(src_dir))
+    assert [os.path.basename(s.path) for s in changes.added] == ["c.cbl"]
+    assert [os.path.basename(s.path) for s in changes.changed] == ["b.cbl"]
+    assert [os.path.basename(p) for p in changes.unchanged] == ["a.cbl"]
+
+    (src_dir / "a.cbl").unlink()
+    manifest = ChangeManifest(manifest_path)
+    changes = manifest.scan(str(src_dir))
+    assert [os.path.basename(p) for p in changes.deleted] == ["a.cbl"]
+    assert manifest.results() == []
+
+    # Results recorded under other settings are all redone
+    for state in changes.to_process:
+        manifest.record(state, {"name": os.path.basename(state.path)})
+    manifest.save()
+    manifest = ChangeManifest(manifest_path, fingerprint="weights-v2")
+    changes = manifest.scan(str(src_dir))
+    assert sorted(os.path.basename(s.path) for s in changes.changed) == ["b.cbl", "c.cbl"]
+    assert changes.unchanged == [] and manifest.results() == []
+
+    # A program is redone when a copybook it expanded changes, even if its own source did not
+    from src.change_manifest import dependency_stamps
+    member = tmp_path / "REC.cpy"
+    member.write_text("       01 REC PIC X.")
+    stamp = (os.stat(member).st_mtime, os.stat(member).st_size)
+    for state in changes.to_process:
+        manifest.record(state, {}, dependency_stamps({str(member): stamp}) if state.path.endswith("b.cbl") else None)
+    manifest.save()
+    assert ChangeManifest(manifest_path, fingerprint="weights-v2").scan(str(src_dir)).changed == []
+    member.write_text("       01 REC PIC X(2).")
+    changes = ChangeManifest(manifest_path, fingerprint="weights-v2").scan(str(src_dir))
+    assert [os.path.basename(s.path) for s in changes.changed] == ["b.cbl"]
+
+
+def test_token_bucket_paces_requests():
+    import asyncio
+    from src.rate_limiter import TokenBucket
+    now = [0.0]
+    bucket = TokenBucket(60, capacity=2, clock=lambda: now[0])  # 1 token per second
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == 0.0
+    assert bucket.try_acquire() == pytest.approx(1.0)
+    now[0] += 1.0
+    assert bucket.try_acquire() == 0.0
+    # A rate of None disables limiting
+    asyncio.run(TokenBucket(None).acquire(10 ** 9))
+
+
+def test_convert_many_against_fake_server():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    import time
+    from fake_llm_server import FakeLLMServer
+    from src.genai_converter import GenAIConverter
+
+    with FakeLLMServer(latency=0.2, fail_first=2) as server:
+        converter = GenAIConverter(api_key="test-key", base_url=server.url)
+        converter.cfg.update(max_concurrency=4, backoff_base=0.01, backoff_max=0.05)
+        jobs = [("       STOP RUN.", {"name": f"PROG-{i}"}) for i in range(8)]
+        start = time.perf_counter()
+        results = converter.convert_many(jobs)
+        elapsed = time.perf_counter() - start
+
+    # Input order is kept, the two 429s were retried and calls overlapped
+    assert results == [f"public class PROG-{i} {{}}" for i in range(8)]
+    assert server.requests == 10
+    assert server.max_in_flight <= 4
+    assert elapsed < 8 * 0.2
+
+
+def test_rate_limits_span_consecutive_batches():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    import time
+    from fake_llm_server import FakeLLMServer
+    from src.genai_converter import GenAIConverter
+    from src.rate_limiter import TokenBucket
+
+    with FakeLLMServer(latency=0) as server:
+        converter = GenAIConverter(api_key="test-key", base_url=server.url)
+        converter.rpm = TokenBucket(240, capacity=2)  # 4 requests per second after a burst of 2
+        start = time.perf_counter()
+        for batch in range(2):
+            jobs = [("       STOP RUN.", {"name": f"P{batch}{i}"}) for i in range(2)]
+            assert len(converter.convert_many(jobs)) == 2
+        elapsed = time.perf_counter() - start
+
+    # The second batch found the bucket empty instead of a fresh burst
+    assert server.requests == 4
+    assert elapsed >= 0.4
+
+
+def test_retry_after_is_capped_and_empty_content_is_a_failure():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    import time
+    from types import SimpleNamespace
+    from fake_llm_server import FakeLLMServer
+    from src.genai_converter import GenAIConverter
+
+    with FakeLLMServer(latency=0, fail_first=1, retry_after=3600) as server:
+        converter = GenAIConverter(api_key="test-key", base_url=server.url)
+        converter.cfg.update(backoff_max=0.05)
+        start = time.perf_counter()
+        assert converter.convert_many([("       STOP RUN.", {"name": "WAIT"})]) == ["public class WAIT {}"]
+        assert time.perf_counter() - start < 5 and server.requests == 2
+
+    filtered = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=None),
+                                                        finish_reason="content_filter")])
+    assert GenAIConverter.is_failure(GenAIConverter._content(filtered))
+
+
+def test_convert_stages_are_per_program():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    from fake_llm_server import FakeLLMServer
+    from src.genai_converter import GenAIConverter
+    from src.profiler import Profiler
+
+    big = "       PROGRAM-ID. BIG.\n       PROCEDURE DIVISION.\n" + "".join(
+        f"       PARA-{i}.\n           DISPLAY 'STEP {i} OF THE LARGE PROGRAM'.\n" for i in range(40))
+    with FakeLLMServer(latency=0.05) as server:
+        profiler = Profiler(keep_records=True)
+        converter = GenAIConverter(api_key="test-key", base_url=server.url, profiler=profiler)
+        converter.cfg.update(chunk_max_chars=800)
+        converter.convert_many([(big, {"name": "BIG"}), ("       STOP RUN.", {"name": "SMALL"})])
+        chunks = server.requests - 1
+
+    # Each program's stage holds its own tokens, not an even share of the batch
+    programs = profiler.report()["programs"]
+    assert chunks > 1 and profiler.totals["convert"]["runs"] == 2
+    assert programs["SMALL"]["convert"]["llm_tokens"] == 110
+    assert programs["BIG"]["convert"]["llm_tokens"] == 110 * chunks
+
+
+def test_split_program_and_stitch():
+    from benchmarks.bench_parser import synthetic_source
+    from src.chunker import split_program, stitch_java
+    code = synthetic_source(600, seed=3)
+    chunks = split_program(code, max_chars=4000)
+    assert len(chunks) > 1
+    assert "".join(c.text for c in chunks) == code
+    assert all(len(c.text) <= 4000 for c in chunks)
+    # Data and procedure code never share a chunk
+    assert not any(c.procedural and "PIC" in c.text for c in chunks)
+    assert len(split_program("       STOP RUN.", max_chars=4000)) == 1
+
+    java = stitch_java("BATCH-PROCESSOR", [
+        "```java\nimport java.util.List;\nprivate int count;\n```",
+        "import java.util.List;\npublic void run() {}",
+    ])
+    assert java.count("import java.util.List;") == 1
+    assert "public class BatchProcessor {" in java
+
+
+def test_chunked_conversion_retries_failed_chunk():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    from benchmarks.bench_parser import synthetic_source
+    from fake_llm_server import FakeLLMServer
+    from src.chunker import split_program
+    from src.genai_converter import GenAIConverter
+
+    code = synthetic_source(400, seed=3)
+    with FakeLLMServer(latency=0.01, fail_first=1, fail_status=503) as server:
+        converter = GenAIConverter(api_key="test-key", base_url=server.url)
+        converter.cfg.update(chunk_max_chars=3000, max_retries=0, chunk_retries=1)
+        n_chunks = len(split_program(code, 3000))
+        java = converter.convert_to_java(code, {"name": "SYNTH-PROG"})
+
+    assert java.startswith("public class SynthProg {")
+    assert java.count("public void part") == n_chunks
+    # Only the failed chunk was sent again
+    assert server.requests == n_chunks + 1
+
+    # Each chunk prompt lists only the variables and SQL statements in that chunk
+    import re
+    from src.cobol_parser import COBOLParser
+    meta = vars(COBOLParser().parse(code))
+    prompts = converter.plan(code, meta)
+    used = [[int(n) for n in re.findall(r"\((\d+) of \d+ in the program\)", p)] for p in prompts]
+    assert len(prompts) == n_chunks and max(v for v, _ in used) < len(meta["variables"]) / 2
+    assert sum(s for _, s in used) == len(meta["sql_statements"]) > 0
+
+
+def test_numpy_risk_model_batch_and_roundtrip(tmp_path):
+    np = pytest.importorskip("numpy")
+    from benchmarks.bench_risk import portfolio, random_model
+    from src.risk_inference import RISK_LABELS, NumpyRiskModel
+    model = random_model()
+    X = portfolio(500)
+
+    # Reference: plain dense layers, ReLU hidden, softmax output
+    h = X
+    for i, (W, b) in enumerate(model.layers):
+        h = h @ W + b
+        if i < len(model.layers) - 1:
+            h = np.maximum(h, 0)
+    expected = [RISK_LABELS[i] for i in h.argmax(axis=1)]
+
+    assert model.predict_batch(X) == expected
+    assert model.predict([X[0]]) == expected[0]
+    assert np.allclose(model.predict_proba(X).sum(axis=1), 1.0)
+
+    path = str(tmp_path / "risk.npz")
+    model.save(path)
+    loaded = NumpyRiskModel.load(path)
+    assert loaded.version == model.version
+    assert loaded.predict_batch(X) == expected
+
+
+def test_numpy_forward_matches_keras():
+    pytest.importorskip("tensorflow")
+    from benchmarks.bench_risk import portfolio
+    from src.dl_risk_model import DeepRiskModel
+    dl_model = DeepRiskModel()
+    dl_model.train_mock_model()
+    X = portfolio(200) / 1000.0
+    assert dl_model.to_numpy().predict_batch(X) == dl_model.predict_batch(X)
+    assert dl_model.to_numpy().predict([X[0]]) == dl_model.predict([X[0]])
+
+
+def test_api_import_is_lazy():
+    pytest.importorskip("fastapi")
+    import subprocess
+    import sys
+    probe = "import sys, src.api; print([m for m in ('numpy', 'openai', 'tensorflow') if m in sys.modules])"
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def _api_config(tmp_path, **sections):
+    """config.yaml copy with a temp cache and a random risk model; sections override keys."""
+    import yaml
+    from benchmarks.bench_risk import random_model
+    tmp_path.mkdir(exist_ok=True)
+    with open("config.yaml") as f:
+        cfg = yaml.safe_load(f)
+    cfg["risk_model"]["weights_path"] = str(tmp_path / "risk.npz")
+    cfg["cache"]["path"] = str(tmp_path / "cache.db")
+    for name, values in sections.items():
+        cfg.setdefault(name, {}).update(values)
+    config_path = tmp_path / "config.yaml"
+    config_path.write_text(yaml.safe_dump(cfg))
+    random_model().save(cfg["risk_model"]["weights_path"])
+    return str(config_path)
+
+
+def test_api_liveness_and_readiness(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("numpy")
+    import time
+    from fastapi.testclient import TestClient
+    import src.api as api
+
+    monkeypatch.setattr(api, "engines", api.Engines(_api_config(tmp_path)))
+
+    with TestClient(api.app) as client:
+        assert client.get("/health/live").json() == {"status": "alive"}
+        deadline = time.time() + 10
+        while client.get("/health/ready").status_code != 200 and time.time() < deadline:
+            time.sleep(0.01)
+        assert client.get("/health").json()["ready"] is True
+        resp = client.post("/modernize", files={"file": ("t.cbl", b"       PROGRAM-ID. LAZY-PROG.\n")})
+        assert resp.json()["program_name"] == "LAZY-PROG"
+        metrics = client.get("/metrics").text
+        assert 'cobol_pipeline_stage_wall_seconds_count{stage="parse"} 1' in metrics
+        assert 'cobol_pipeline_programs_total{stage="convert"} 1' in metrics
+
+        # Only the live COPY is expanded; the one in a comment line is cleaned away first
+        source = b"       PROGRAM-ID. COPY-PROG.\n      *    COPY NOTHERE.\n       COPY CUSTOMER-DATA.\n"
+        client.post("/modernize", files={"file": ("c.cbl", source)})
+        assert api.engines.copybooks.includes == {"CUSTOMER-DATA": {"COPY-PROG"}}
+
+    # A failed load keeps the process alive but not ready
+    monkeypatch.setattr(api, "engines", api.Engines(str(tmp_path / "missing.yaml")))
+    with TestClient(api.app) as client:
+        assert client.get("/health/live").status_code == 200
+        deadline = time.time() + 10
+        while api.engines.error is None and time.time() < deadline:
+            time.sleep(0.01)
+        assert client.get("/health/ready").status_code == 503
+
+
+def test_api_jobs_run_off_the_event_loop(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("numpy")
+    pytest.importorskip("openai")
+    import time
+    from fastapi.testclient import TestClient
+    from tests.fake_llm_server import FakeLLMServer
+    import src.api as api
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    with FakeLLMServer(latency=0.5) as server:
+        config = _api_config(tmp_path, llm={"base_url": server.url}, api={"max_queue_depth": 1})
+        monkeypatch.setattr(api, "engines", api.Engines(config))
+        files = [("files", (f"p{i}.cbl", f"       PROGRAM-ID. JOB-{i}.\n".encode())) for i in range(3)]
+        with TestClient(api.app) as client:
+            api.engines.load()
+            start = time.perf_counter()
+            resp = client.post("/jobs", files=files)
+            # Accepted before the (slow) conversions finish
+            assert resp.status_code == 202 and time.perf_counter() - start < 0.5
+            assert client.post("/jobs", files=files).status_code == 429
+            assert client.get("/health/live").status_code == 200
+
+            job_id = resp.json()["id"]
+            deadline = time.time() + 10
+            while client.get(f"/jobs/{job_id}").json()["status"] not in ("done", "failed") \
+                    and time.time() < deadline:
+                time.sleep(0.02)
+            job = client.get(f"/jobs/{job_id}").json()
+            assert client.get("/jobs/unknown").status_code == 404
+    assert job["status"] == "done"
+    assert [r["program_name"] for r in job["results"]] == ["JOB-0", "JOB-1", "JOB-2"]
+    assert job["results"][2]["java_output"] == "public class JOB-2 {}"
+    # Usage reported by the LLM reaches the convert stage across the async batch
+    assert api.engines.profiler.totals["convert"]["llm_tokens"] == 3 * 110
+
+
+def test_scanner_feed_text_matches_parse():
+    import random
+    from benchmarks.bench_parser import synthetic_source
+    from src.cobol_parser import ProgramScanner
+    parser = COBOLParser()
+    source = synthetic_source(500).replace("\n", "\r\n")
+    rng = random.Random(3)
+    cuts = sorted(rng.sample(range(len(source)), 40))
+    scan = ProgramScanner()
+    for start, end in zip([0] + cuts, cuts + [len(source)]):
+        scan.feed_text(source[start:end])
+    assert parser.build(scan.finish()) == parser.parse(source)
+
+
+def test_api_modernize_stream(tmp_path, monkeypatch):
+    pytest.importorskip("fastapi")
+    pytest.importorskip("numpy")
+    pytest.importorskip("openai")
+    import json
+    from fastapi.testclient import TestClient
+    from tests.fake_llm_server import FakeLLMServer
+    import src.api as api
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    source = b"       PROGRAM-ID. STREAM-PROG.\n       01 WS-A PIC X.\n"
+    with FakeLLMServer(latency=0) as server:
+        config = _api_config(tmp_path, llm={"base_url": server.url}, api={"max_upload_bytes": 1000})
+        monkeypatch.setattr(api, "engines", api.Engines(config))
+        with TestClient(api.app) as client:
+            # Sent in small pieces, as a chunked upload
+            body = (source[i:i + 7] for i in range(0, len(source), 7))
+            resp = client.post("/modernize/stream", content=body)
+            assert client.post("/modernize/stream", content=b" " * 1001).status_code == 413
+            metrics = client.get("/metrics").text
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [(block.split("\n")[0][7:], json.loads(block.split("\n")[1][6:]))
+              for block in resp.text.strip().split("\n\n")]
+    assert events[0][0] == "analysis" and events[0][1]["program_name"] == "STREAM-PROG"
+    java = [data for kind, data in events if kind == "java"]
+    assert len(java) > 1 and "".join(java) == "public class STREAM-PROG {}"
+    assert "error" not in [kind for kind, _ in events]
+    assert events[-1] == ("done", {})
+    assert 'cobol_pipeline_programs_total{stage="convert"} 1' in metrics
+
+
+def test_batch_engine_backends_agree(tmp_path):
+    pytest.importorskip("pandas")
+    from benchmarks.bench_batch import write_portfolio
+    from src.batch_engine import BatchEngine
+    paths = write_portfolio(str(tmp_path), 40, 30)
+    calls = []
+    serial = BatchEngine(backend="serial").run(paths, progress=lambda done, total: calls.append(done))
+    pooled = BatchEngine(backend="process", workers=2, chunksize=7).run(str(tmp_path))
+    assert serial.equals(pooled)
+    assert len(serial) == 40 and calls[-1] == 40
+    assert serial.loc[0, "complexity_score"] == COBOLParser().parse(open(paths[0]).read()).complexity_score
+    with pytest.raises(ValueError):
+        BatchEngine(backend="threads")
+
+
+def test_spark_partition_runs_full_stage_chain(tmp_path):
+    pytest.importorskip("pyspark")
+    from benchmarks.bench_risk import random_model
+    from src.spark_processor import PROGRAM_SCHEMA, modernize_partition
+    model = random_model()
+    settings = {"parser": COBOLParser().cfg, "risk_model": model}
+    source = "      * COMMENT\n       PROGRAM-ID. SPARK-PROG.\n       01 WS-A PIC X.\n       CALL 'SUB1'.\n"
+    records = [(f"file:/p{i}.cbl", source.encode()) for i in range(5)]
+    rows = list(modernize_partition(iter(records), settings, batch_size=2))
+    assert len(rows) == 5 and len(rows[0]) == len(PROGRAM_SCHEMA.fields)
+    path, name, _, variables, calls, *_, risk = rows[4]
+    assert (path, name, variables, calls) == ("file:/p4.cbl", "SPARK-PROG", ["WS-A"], ["SUB1"])
+    assert risk in ("LOW", "MEDIUM", "HIGH")
+
+    # COPY members are expanded the same way by Spark, BatchEngine and the pipeline workers
+    from src.batch_engine import BatchEngine, close_worker, init_worker
+    from src.pipeline import prepare_file
+    copy_source = "       PROGRAM-ID. COPY-PROG.\n       COPY CUSTOMER-DATA.\n"
+    spark_vars = next(modernize_partition(iter([("p.cbl", copy_source.encode())]), settings))[3]
+    path = tmp_path / "copy.cbl"
+    path.write_text(copy_source)
+    assert "WS-CUSTOMER-NAME" in spark_vars
+    assert BatchEngine(backend="serial").run([str(path)]).loc[0, "variables"] == len(spark_vars)
+    init_worker(risk_model=model)
+    try:
+        assert prepare_file(str(path)).meta["variables"] == spark_vars
+    finally:
+        close_worker()
+
+
+def test_spark_pipeline_writes_parquet(tmp_path):
+    pytest.importorskip("pyspark")
+    import os
+    import shutil
+    if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+        pytest.skip("Spark needs a Java runtime")
+    from src.spark_processor import COBOLSparkProcessor
+    processor = COBOLSparkProcessor("local[*]")
+    out = processor.run_pipeline("data/sample_cobol/*.cbl", str(tmp_path / "portfolio.parquet"))
+    df = processor.spark.read.parquet(out)
+    assert df.count() == len([f for f in os.listdir("data/sample_cobol") if f.endswith(".cbl")])
+    assert {"variables", "sql_statements", "risk_level"} <= set(df.columns)
+
+
+def test_call_graph_queries_and_waves(tmp_path):
+    from src.call_graph import CallGraph, convert_in_waves, saved_interfaces
+    graph = CallGraph({"MAIN": ["ORDERS", "BILLING"], "ORDERS": ["DB-IO", "BILLING"],
+                       "BILLING": ["ORDERS", "EXTLIB"], "DB-IO": [], "REPORT": [], "BATCH": ["MAIN"]})
+    assert graph.callers("ORDERS") == ["BILLING", "MAIN"]
+    assert graph.impact("DB-IO") == ["BATCH", "BILLING", "MAIN", "ORDERS"]
+    assert graph.orphans() == ["REPORT"] and graph.external() == ["EXTLIB"]
+    assert ["BILLING", "ORDERS"] in graph.sccs()
+    assert graph.waves() == [["DB-IO", "REPORT"], ["BILLING", "ORDERS"], ["MAIN"], ["BATCH"]]
+
+    jobs = [("", {"name": n, "calls": graph.callees(n)}) for n in ("MAIN", "DB-IO", "ORDERS")]
+    batches = []
+
+    def convert_many(batch):
+        batches.append({meta["name"]: meta.get("callee_interfaces") for _, meta in batch})
+        return [f"public class {meta['name'].replace('-', '')} {{\n    public void run(int x) {{}}\n}}"
+                for _, meta in batch]
+
+    results = convert_in_waves(graph, jobs, convert_many)
+    assert [list(b) for b in batches] == [["DB-IO"], ["ORDERS"], ["MAIN"]]
+    assert batches[1]["ORDERS"] == {"DB-IO": "public class DBIO { void run(int x); }"}
+    assert results[0].startswith("public class MAIN")
+
+    # Incremental run: only MAIN changed, so ORDERS' interface comes from its saved Java
+    (tmp_path / "ORDERS.java").write_text("public class ORDERS {\n    public int total(String id) {}\n}")
+    batches.clear()
+    convert_in_waves(graph, jobs[:1], convert_many, saved_interfaces(["ORDERS", "BILLING"], str(tmp_path)))
+    assert batches == [{"MAIN": {"ORDERS": "public class ORDERS { int total(String id); }"}}]
+
+
+def test_copybook_expansion_replacing_and_index(tmp_path):
+    from src.copybooks import CopybookLibrary
+    (tmp_path / "ADDR.cpy").write_text("       05 :P:-STREET PIC X(30).\n       05 :P:-CITY PIC X(20).\n")
+    (tmp_path / "CUST.cpy").write_text("       01 CUST-REC.\n          05 CUST-ID PIC 9(8).\n       COPY ADDR.\n")
+    library = CopybookLibrary(paths=[str(tmp_path)])
+    parser = COBOLParser()
+    programs = [
+        "       PROGRAM-ID. P1.\n       COPY CUST.\n       COPY ADDR REPLACING ==:P:== BY ==BILL==.\n",
+        "       PROGRAM-ID. P2.\n       COPY 'CUST' REPLACING CUST-ID BY ACCOUNT-ID.\n       COPY NOPE.\n",
+    ]
+    p1, p2 = (library.analyze(code, parser.parse) for code in programs)
+    assert p1.variables == ["CUST-ID", "BILL-STREET", "BILL-CITY"]
+    assert p1.copybooks == ["CUST", "ADDR"]
+    assert p2.variables[0] == "ACCOUNT-ID" and p2.copybooks == ["CUST", "ADDR", "NOPE"]
+    # Each member was read once for the whole batch
+    assert library.loads == 2
+    assert library.programs_using("ADDR") == ["P1", "P2"]
+
+    # Operands replace whole words only, except with LEADING / TRAILING
+    (tmp_path / "AMT.cpy").write_text("       05 AMOUNT PIC 9. 05 DATA-A PIC X. 05 A PIC X. 05 KEY-A PIC X.\n")
+    text = library.expand("       COPY AMT REPLACING ==A== BY ==B== ==KEY== BY ==ID==.\n").text
+    assert "AMOUNT" in text and "DATA-A" in text and "05 B PIC" in text and "KEY-A" in text
+    text = library.expand("       COPY AMT REPLACING LEADING ==AMO== BY ==QTY== TRAILING ==Y-A== BY ==Y-Z==.\n").text
+    assert "QTYUNT" in text and "KEY-Z" in text and "DATA-A" in text
+
+    # An edited member is re-read, nested includes too
+    (tmp_path / "ADDR.cpy").write_text("       05 :P:-ZIP PIC X(5).\n")
+    assert library.analyze(programs[0], parser.parse).variables == ["CUST-ID", "BILL-ZIP"]
+
+    # An incremental save keeps unchanged programs' saved entries and replaces the rest
+    import json
+    index_path = str(tmp_path / "index.json")
+    library.save_index(index_path)
+    rerun = CopybookLibrary(paths=[str(tmp_path)])
+    rerun.analyze(programs[0].replace("COPY CUST.\n", ""), parser.parse)
+    rerun.save_index(index_path, keep=["P2"])
+    assert json.loads(open(index_path).read()) == {"ADDR": ["P1", "P2"], "CUST": ["P2"], "NOPE": ["P2"]}
+
+
+@pytest.mark.parametrize("suffix", ["parquet", "arrow"])
+def test_result_store_chunks_and_aggregates(tmp_path, suffix):
+    pytest.importorskip("pyarrow")
+    from src.result_store import ResultStore
+    store = ResultStore(path=str(tmp_path / f"results.{suffix}"), chunk_rows=4)
+    levels = ["LOW", "HIGH", "MEDIUM"]
+    store.extend({"name": f"P{i}", "complexity_score": float(i), "risk_level": levels[i % 3],
+                  "validation_score": 80.0 + i % 2 * 10, "calls": ["IGNORED"]} for i in range(10))
+    # Full chunks were flushed; only the remainder is buffered
+    assert store.rows == 10 and store._buffered == 2
+    assert store.mean("complexity_score") == 4.5
+    assert store.mean("validation_score") == 85.0
+    assert store.value_counts("risk_level") == {"LOW": 4, "HIGH": 3, "MEDIUM": 3}
+    assert store.top("complexity_score", 2, ["name", "complexity_score"])["name"].tolist() == ["P9", "P8"]
+    frame = store.to_frame()
+    assert len(frame) == 10 and frame["sql_count"].sum() == 0
+    with pytest.raises(ValueError):
+        store.append({"name": "late"})
+
+def test_validator_index_methods_and_sql():
+    from src.validator import ModernizationValidator
+    code = """       IDENTIFICATION DIVISION.
+       PROGRAM-ID. PAYROLL.
+       DATA DIVISION.
+       WORKING-STORAGE SECTION.
+       01 WS-CUST-ID PIC 9(5).
+       01 WS-TOTAL-AMT PIC 9(7).
+       PROCEDURE DIVISION.
+       MAIN-LOGIC.
+           EXEC SQL SELECT NAME INTO :WS-CUST-ID FROM CUST END-EXEC.
+           PERFORM CALC-TOTAL.
+           STOP RUN.
+       CALC-TOTAL.
+           EXEC SQL DELETE FROM CUST END-EXEC.
+"""
+    meta = vars(COBOLParser().parse(code))
+    assert meta['paragraphs'] == ["MAIN-LOGIC", "CALC-TOTAL"]
+    java = """public class Payroll {
+    private int custId;
+    public void mainLogic() { repository.findByCustId(custId); calcTotal(); }
+    public void calcTotal() { }
+}"""
+    validator = ModernizationValidator()
+    audit = validator.validate(java, meta)
+    # Same rule as the original substring check: totalamt is nowhere in the output
+    assert audit['missing_elements'] == ["WS-TOTAL-AMT"]
+    assert audit['validation_score'] == 90
+    assert "custid" in validator.identifier_index(java)
+    # Names the index misses fall back to one substring scan, overlapping needles included
+    assert validator._missing(["WS-ACCT", "WS-NOPE", "WS-ACCTVAL", "WS-CTVA"], set(), "int myacctvalue;") == ["WS-NOPE"]
+    assert audit['missing_methods'] == []
+    assert audit['unmapped_sql'] == ["DELETE"]
+    assert validator.validate_many([(java, meta)]) == [audit]
+
+
+def test_profiler_stages_counters_and_report(tmp_path):
+    import json
+    from src.analysis_cache import AnalysisCache
+    from src.profiler import Profiler
+    profiler = Profiler(cprofile_stages=["parse"])
+    profiler.cprofile_dir = str(tmp_path / "profiles")
+    cache = AnalysisCache(path=str(tmp_path / "cache.db"))
+    parser = COBOLParser()
+    for name in ("PROG-A", "PROG-B", "PROG-A"):
+        code = f"       PROGRAM-ID. {name}.\n"
+        with profiler.stage("parse", name, len(code)):
+            cache.parse(parser, code)
+    with profiler.stage("risk", ["PROG-A", "PROG-B"]) as record:
+        record.llm_tokens += 10
+
+    @profiler.profiled("clean")
+    def clean(code):
+        return code.strip()
+    clean("  x  ")
+    cache.close()
+
+    assert profiler.totals["parse"]["cache_hits"] == 1 and profiler.totals["parse"]["cache_misses"] == 2
+    assert profiler.totals["clean"]["bytes"] == 5
+    metrics = profiler.render_prometheus()
+    assert 'cobol_pipeline_stage_wall_seconds_bucket{stage="parse",le="+Inf"} 3' in metrics
+    assert 'cobol_pipeline_llm_tokens_total{stage="risk"} 10' in metrics
+
+    report = json.load(open(profiler.write_report(str(tmp_path / "report.json"))))
+    assert list(report["stages"]) == ["clean", "parse", "risk"]
+    # A batched stage is shared among its programs
+    assert report["programs"]["PROG-B"]["risk"]["llm_tokens"] == 5
+    assert report["programs"]["PROG-A"]["parse"]["cache_hits"] == 1
+    assert (tmp_path / "profiles" / "parse.prof").exists()
+
+
+def test_synthetic_corpus_is_seeded_and_tunable(tmp_path):
+    from benchmarks.corpus import CorpusSpec, generate_program, write_corpus
+    from src.copybooks import CopybookLibrary
+    spec = CorpusSpec(lines=300, sql_density=0.2, call_density=0.1, copy_statements=3)
+    assert generate_program(1, spec, seed=7, portfolio_size=5) == generate_program(1, spec, seed=7, portfolio_size=5)
+    assert generate_program(1, spec, seed=7) != generate_program(1, spec, seed=8)
+
+    paths = write_corpus(str(tmp_path), 5, spec, seed=7)
+    library = CopybookLibrary(paths=[str(tmp_path / "copybooks")])
+    with open(paths[1]) as f:
+        program = library.analyze(DataCleaner().clean(f.read()), COBOLParser().parse)
+    assert program.name == "PROG00001" and len(program.copybooks) == 3
+    assert program.sql_statements and set(program.calls) <= {f"PROG{i:05d}" for i in range(5)}
+    assert program.paragraphs[0] == "PARA-0001"
+    sparse = COBOLParser().parse(generate_program(1, CorpusSpec(lines=300, sql_density=0, if_density=0), seed=7))
+    assert not sparse.sql_statements and sparse.logic_points < program.logic_points
+
+
+def test_cleaner_fixed_format_columns_continuations_and_stream(tmp_path):
+    from benchmarks.corpus import CorpusSpec, generate_program
+    from src.data_cleaner import DataCleaner
+    source = (
+        "000100 IDENTIFICATION DIVISION.                                         PAYROLL1\n"
+        "000200 PROGRAM-ID. PAYROLL.                                              PAYROLL1\n"
+        "000300* COMMENT\n"
+        "000400/ PAGE EJECT\n"
+        "000500D    DISPLAY 'DEBUG'.\n"
+        "000600 01 WS-MESSAGE PIC X(40) VALUE 'HELLO THIS LITERAL                  \n"
+        "000700-    'CONTINUES'.                                                  PAYROLL1\n"
+        "000800 01 WS-TOTAL-AMO\n"
+        "000900-    UNT PIC 9(5).\n"
+    )
+    cleaner = DataCleaner()
+    text, line_map = cleaner.clean_with_map(source)
+    assert text.splitlines() == [
+        "IDENTIFICATION DIVISION.",
+        "PROGRAM-ID. PAYROLL.",
+        # Literal continued from column 72 on, trailing spaces of the first line included
+        "01 WS-MESSAGE PIC X(40) VALUE 'HELLO THIS LITERAL" + " " * (65 - 49) + "CONTINUES'.",
+        "01 WS-TOTAL-AMOUNT PIC 9(5).",
+    ]
+    # Diagnostics on cleaned lines map back to the original members' lines
+    assert [line_map.original(n) for n in range(1, 5)] == [1, 2, 6, 8]
+
+    # Free-format sources keep the original behaviour
+    assert cleaner.clean("IDENTIFICATION DIVISION.\n  PROGRAM-ID. FREE.\n") == \
+        "IDENTIFICATION DIVISION.\nPROGRAM-ID. FREE."
+
+    numbered = generate_program(2, CorpusSpec(sequence_numbers=True), seed=3)
+    path = tmp_path / "numbered.cbl"
+    path.write_text(numbered)
+    parser = COBOLParser()
+    streamed = parser.parse_lines(f"{line.text}\n" for line in cleaner.stream(str(path)))
+    assert streamed == parser.parse(cleaner.clean(numbered))
+    assert streamed == parser.parse(cleaner.clean(generate_program(2, CorpusSpec(), seed=3)))
+
+
+def test_llm_cache_normalizes_deduplicates_and_patches_clones():
+    pytest.importorskip("openai")
+    pytest.importorskip("dotenv")
+    from fake_llm_server import FakeLLMServer
+    from src.genai_converter import GenAIConverter
+    from src.llm_cache import LLMResponseCache, normalize_prompt, patch_identifiers
+
+    assert normalize_prompt("000100 MOVE A  TO B.\n000200* NOTE\n   ADD 1 TO C. *> why") == "MOVE A TO B. ADD 1 TO C."
+    # Cleaned code starts in column 1: '*' / '/' continuations are code; literals are kept verbatim
+    assert normalize_prompt("COMPUTE X = Y\n* 1.05") != normalize_prompt("COMPUTE X = Y\n/ 1.05")
+    assert normalize_prompt("MOVE 'A  B' TO C") != normalize_prompt("MOVE 'A B' TO C")
+    assert normalize_prompt("MOVE '*> DONE'  TO C *> note") == "MOVE '*> DONE' TO C"
+    assert patch_identifiers("private int custId; getCustId(); CUST_ID", {"WS-CUST-ID": "WS-ACCT-ID"}) == \
+        "private int acctId; getAcctId(); ACCT_ID"
+
+    template = "      {}\n       01 {}-TOTAL PIC 9(5).\n           MOVE 0 TO {}-TOTAL."
+    clone_a = template.format("* GENERATED 2001", "PAY-A", "PAY-A")
+    clone_a_relaid = "\n".join(f"{n * 100:06d}{line[6:]}".replace(" PIC", "    PIC") for n, line in
+                               enumerate(template.format("* GENERATED 2009", "PAY-A", "PAY-A").split("\n"), 1))
+    clone_b = template.format("", "PAY-B", "PAY-B")
+    with FakeLLMServer(latency=0.3) as server:
+        converter = GenAIConverter(api_key="test-key", base_url=server.url,
+                                   response_cache=LLMResponseCache(near_duplicates=True))
+        # Concurrent identical prompts (after normalization) share one call
+        out = converter.convert_many([(clone_a, {"name": "PAY-A"}), (clone_a_relaid, {"name": "PAY-A"})])
+        assert out == ["public class PAY-A {}"] * 2 and server.requests == 1
+        # A renamed clone reuses the completion with identifiers patched
+        assert converter.convert_to_java(clone_b, {"name": "PAY-B"}) == "public class PAY-B {}"
+        assert server.requests == 1
+    stats = converter.response_cache.stats()
+    assert (stats["misses"], stats["deduplicated"], stats["near_hits"]) == (2, 1, 1)
+    assert stats["hit_rate"] == round(2 / 3, 4)
+
+
+def test_risk_forest_registry_and_flat_scoring(tmp_path):
+    pytest.importorskip("sklearn")
+    import yaml
+    from benchmarks.bench_risk import portfolio
+    from src.model_registry import ChecksumError, ModelRegistry
+    from src.risk_inference import load_risk_model
+    from src.risk_model import RiskModel
+    with open("config.yaml") as f:
+        cfg = yaml.safe_load(f)
+    cfg["model_registry"]["path"] = str(tmp_path / "registry")
+    cfg["risk_model"]["backend"] = "forest"
+    config_path = str(tmp_path / "config.yaml")
+    with open(config_path, "w") as f:
+        yaml.safe_dump(cfg, f)
+
+    # First use trains and publishes v1; later engines load the artifact instead of retraining
+    model = RiskModel(config_path)
+    program = {"code_lines": 400, "variables": ["WS-A"] * 20, "sql_count": 5, "calls": ["X", "Y"],
+               "logic_points": 45}
+    label = model.predict_risk(program)
+    assert model.version == "v1" and label in ("LOW", "MEDIUM", "HIGH")
+    reloaded = RiskModel(config_path)
+    reloaded.ensure_ready()
+    assert reloaded.version == "v1" and reloaded.compiled.version == model.compiled.version
+    assert load_risk_model(config_path).version == model.compiled.version
+
+    # Flattened trees give sklearn's predictions, row by row and batched
+    X = portfolio(2000) / [10, 20, 1, 1, 30]
+    expected = [("LOW", "MEDIUM", "HIGH")[c] for c in model.model.predict(X.astype("float32"))]
+    assert model.predict_risk_many(X) == expected  # large batch: the estimator's compiled walk
+    assert model.predict_risk_many(X[:200]) == expected[:200]  # small batch: the NumPy walk
+    assert [model.compiled.predict_one(x) for x in X[:300]] == expected[:300]
+
+    # Versions are immutable and checksummed
+    registry = ModelRegistry(config_path)
+    registry.publish("risk_forest", model.model, "v2")
+    assert registry.versions("risk_forest") == ["v1", "v2"] and registry.current("risk_forest") == "v2"
+    with pytest.raises(ValueError, match="logic_points"):  # no recorded features: not the served row
+        RiskModel(config_path).load()
+    with pytest.raises(ValueError):
+        registry.publish("risk_forest", model.model, "v2")
+    with open(tmp_path / "registry" / registry.entry("risk_forest", "v1")["file"], "ab") as f:
+        f.write(b"tampered")
+    from src import model_registry
+    model_registry._LOADED.clear()
+    with pytest.raises(ChecksumError):
+        registry.load("risk_forest", "v1")
+    assert registry.load("risk_forest").n_estimators == 100
+
+    # Processes racing on an empty registry publish one forest; plain publishes all get distinct versions
+    import subprocess
+    import sys
+    cfg["model_registry"]["path"] = str(tmp_path / "raced")
+    with open(config_path, "w") as f:
+        yaml.safe_dump(cfg, f)
+    probe = ("from src.model_registry import ModelRegistry; from src.risk_model import RiskModel; "
+             f"RiskModel({config_path!r}).ensure_ready(); ModelRegistry({config_path!r}).publish('notes', [1])")
+    procs = [subprocess.Popen([sys.executable, "-c", probe]) for _ in range(3)]
+    assert [p.wait() for p in procs] == [0, 0, 0]
+    raced = ModelRegistry(config_path)
+    assert raced.versions("risk_forest") == ["v1"] and raced.versions("notes") == ["v1", "v2", "v3"]
+    assert not list((tmp_path / "raced").glob("*.tmp"))
+
+
+def test_pipeline_cli_checkpoints_and_resumes(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    pytest.importorskip("openai")
+    pytest.importorskip("pyarrow")
+    import json
+    from benchmarks.corpus import CorpusSpec, write_corpus
+    from tests.fake_llm_server import FakeLLMServer
+    from src.pipeline import CHECKPOINT_NAME, main
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    paths = write_corpus(str(tmp_path / "src"), 12, CorpusSpec(lines=120), seed=3)
+    out = tmp_path / "out"
+    args = [str(tmp_path / "src"), str(tmp_path / "missing.cbl"), "-o", str(out), "--workers", "2",
+            "--llm-concurrency", "3", "--queue-size", "2", "--write-batch", "4"]
+    with FakeLLMServer(latency=0.02) as server:
+        config = _api_config(tmp_path / "cfg", llm={"base_url": server.url},
+                             copybooks={"paths": [str(tmp_path / "src" / "copybooks")]},
+                             profiling={"report_path": str(tmp_path / "profile.json")})
+        # The unreadable file fails on its own; every other program is converted and checkpointed
+        assert main(args + ["--config", config]) == 1
+        assert server.max_in_flight <= 3
+        checkpoint = (out / CHECKPOINT_NAME).read_text().splitlines()
+        assert len(checkpoint) == 12 and len(list(out.glob("*.java"))) == 12
+        assert json.loads(checkpoint[0])["result"]["risk_level"] in ("LOW", "MEDIUM", "HIGH")
+
+        # Crash mid-batch (torn last line) and an edited source: --resume redoes only those
+        (out / CHECKPOINT_NAME).write_text("\n".join(checkpoint[:9]) + "\n" + checkpoint[9][:20])
+        done = {json.loads(line)["path"] for line in checkpoint[:9]}
+        edited = sorted(done)[0]
+        with open(edited, "a") as f:
+            f.write("      * EDITED\n")
+        assert main(args[:1] + args[2:] + ["--resume", "--config", config]) == 0
+    report = json.loads((tmp_path / "profile.json").read_text())
+    assert set(report["stages"]) == {"clean", "parse", "risk", "convert", "validate", "write"}
+    assert report["stages"]["convert"]["runs"] == 4
+    lines = (out / CHECKPOINT_NAME).read_text().splitlines()
+    # Append-only: the edited program has a second, newer entry
+    assert len(lines) == 13 and {json.loads(line)["path"] for line in lines} == set(paths)
+
+
+def test_load_risk_model_without_artifact_needs_no_tensorflow(tmp_path):
+    pytest.importorskip("numpy")
+    import subprocess
+    import sys
+    config = _api_config(tmp_path)
+    (tmp_path / "risk.npz").unlink()
+    probe = ("import sys; from src.risk_inference import load_risk_model; "
+             f"m = load_risk_model({config!r}); print(m.predict([[400, 20, 5, 2, 45]]), 'tensorflow' in sys.modules)")
+    out = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True)
+    assert out.stdout.split()[1] == "False" and (tmp_path / "risk.npz").exists()